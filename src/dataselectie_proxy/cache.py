@@ -0,0 +1,198 @@
+"""Caching of proxy data, with a small in-process cache in front of the shared cache.
+
+The shared cache (configured with the ``CACHE_URL``) is used by all workers of a pod,
+or all pods when Redis or memcached is used. The in-process LRU avoids the network
+round trip and deserialization for the most frequently used entries.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+
+import orjson
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+_MISSING = object()
+
+# Serialization markers, raw bytes are stored as-is.
+_BYTES = b"b"
+_JSON = b"j"
+
+
+class TwoTierCache:
+    """A size-bounded in-process LRU cache, in front of a shared Django cache backend.
+
+    Values are serialized with orjson for the shared backend. A ``None`` value is stored too,
+    which allows negative caching. Writes of unchanged values are skipped, and concurrent
+    misses for the same key in :meth:`get_or_set` only compute the value once.
+    """
+
+    def __init__(self, alias: str | None = None):
+        self.alias = alias
+        self._local: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        # The values that are being computed, with the thread that computes them.
+        self._inflight: dict[str, tuple[Future, int]] = {}
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias or settings.PROXY_CACHE_ALIAS]
+
+    def get(self, key: str, default=None):
+        """Get a value from the local cache, or from the shared backend."""
+        value = self._get_local(key)
+        if value is not _MISSING:
+            return value
+
+        data = self.backend.get(key)
+        if data is None:
+            return default
+
+        value = self._loads(data)
+        self._set_local(key, value, hash(data), settings.PROXY_CACHE_LOCAL_TIMEOUT)
+        return value
+
+    def set(self, key: str, value, timeout: int) -> None:
+        """Store a value in both caches. Unchanged values are not written again."""
+        if not timeout:
+            return
+
+        data = self._dumps(value)
+        digest = hash(data)
+        if self._get_local(key, digest=digest) is _MISSING:
+            self.backend.set(key, data, timeout=timeout)
+
+        self._set_local(key, value, digest, min(timeout, settings.PROXY_CACHE_LOCAL_TIMEOUT))
+
+    def get_or_set(
+        self, key: str, func: Callable[[], Any], timeout: int, negative_timeout: int | None = None
+    ):
+        """Get the value, or compute it once when it's missing.
+
+        When the function returns ``None``, this is cached for the `negative_timeout`,
+        so repeated lookups for missing data don't hit the backend each time.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        # No lock is held while the value is computed, so other keys are never blocked,
+        # and the function may use the cache itself. Only concurrent misses for
+        # the same key wait for the thread that computes it.
+        thread_id = threading.get_ident()
+        with self._inflight_lock:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                future = Future()
+                self._inflight[key] = (future, thread_id)
+
+        if inflight is not None:
+            other_future, owner = inflight
+            if owner == thread_id:
+                # A recursive lookup of the same key would wait for itself.
+                return func()
+            return other_future.result()
+
+        try:
+            # Another thread may have computed it just before.
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = func()
+                if value is None:
+                    timeout = (
+                        settings.PROXY_CACHE_NEGATIVE_TIMEOUT
+                        if negative_timeout is None
+                        else negative_timeout
+                    )
+                self.set(key, value, timeout=timeout)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+        return value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._local.pop(key, None)
+        self.backend.delete(key)
+
+    def _reset(self) -> None:
+        """Forget the computations of the parent process, their threads are gone after a fork."""
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, key: str, digest: int | None = None):
+        with self._lock:
+            try:
+                expires, local_digest, value = self._local[key]
+            except KeyError:
+                return _MISSING
+
+            if expires < time.monotonic() or (digest is not None and digest != local_digest):
+                return _MISSING
+
+            self._local.move_to_end(key)
+            return value
+
+    def _set_local(self, key: str, value, digest: int, timeout: int) -> None:
+        maxsize = settings.PROXY_CACHE_LOCAL_MAXSIZE
+        if not maxsize or not timeout:
+            return
+
+        with self._lock:
+            self._local[key] = (time.monotonic() + timeout, digest, value)
+            self._local.move_to_end(key)
+            while len(self._local) > maxsize:
+                self._local.popitem(last=False)
+
+    def _dumps(self, value) -> bytes:
+        if isinstance(value, bytes):
+            return _BYTES + value
+        return _JSON + orjson.dumps(value)
+
+    def _loads(self, data: bytes):
+        if data[:1] == _BYTES:
+            return data[1:]
+        return orjson.loads(data[1:])
+
+
+class SharedFileBasedCache(FileBasedCache):
+    """A file based cache, which is shared by all workers of a pod without a cache server.
+
+    Django's file based cache lists the whole directory on every write, to see whether it's full.
+    This only does so once every ``CULL_INTERVAL`` seconds (an option, the default is 10)
+    per process, so a write is just a single file. The cache can grow a bit beyond
+    ``MAX_ENTRIES`` in the meantime.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_interval = float(params.get("OPTIONS", {}).get("CULL_INTERVAL", 10))
+        self._cull_at = 0.0
+
+    def _cull(self):
+        now = time.monotonic()
+        if now < self._cull_at:
+            return
+        self._cull_at = now + self._cull_interval
+        super()._cull()
+
+
+proxy_cache = TwoTierCache()
+os.register_at_fork(after_in_child=proxy_cache._reset)
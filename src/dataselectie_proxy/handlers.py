@@ -0,0 +1,39 @@
+from collections.abc import Callable
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+
+class LeanWSGIHandler(WSGIHandler):
+    """A WSGI handler that runs the middleware stack without ``LEAN_MIDDLEWARE_SKIP``.
+
+    The search endpoints are token-authenticated JSON APIs, so they don't need
+    the static file lookup, CSRF protection or the X-Frame-Options header.
+    """
+
+    def load_middleware(self, is_async=False):
+        # Django only builds the chain from the MIDDLEWARE setting, this is done once at startup.
+        middleware = settings.MIDDLEWARE
+        settings.MIDDLEWARE = [name for name in middleware if name not in self.get_skipped()]
+        try:
+            super().load_middleware(is_async)
+        finally:
+            settings.MIDDLEWARE = middleware
+
+    def get_skipped(self) -> set[str]:
+        return set(settings.LEAN_MIDDLEWARE_SKIP)
+
+
+def with_lean_paths(application: Callable, lean_handler: WSGIHandler | None = None) -> Callable:
+    """Route the requests for ``LEAN_MIDDLEWARE_PATHS`` to the lean handler,
+    and all other requests to the full application.
+    """
+    lean_handler = lean_handler or LeanWSGIHandler()
+    prefixes = tuple(settings.LEAN_MIDDLEWARE_PATHS)
+
+    def _application(environ, start_response):
+        if environ.get("PATH_INFO", "").startswith(prefixes):
+            return lean_handler(environ, start_response)
+        return application(environ, start_response)
+
+    return _application
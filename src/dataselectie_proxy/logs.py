@@ -0,0 +1,146 @@
+import atexit
+import copy
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+# The attributes every LogRecord has, anything else was passed as 'extra'.
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+# Some 'extra' fields should not be included, e.g. Django passes the request.
+_SKIP_FIELDS = _RECORD_ATTRS | {"request"}
+
+
+class OrjsonFormatter(logging.Formatter):
+    """Format the log record as a single line of JSON.
+
+    The fields are written as: time, level, name, message, the static fields,
+    the exception and finally the 'extra' fields. The time/level appear first,
+    which makes scrolling through docker logs easier.
+    """
+
+    def __init__(self, *args, static_fields: dict | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.static_fields = static_fields or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        message_dict = {}
+        if isinstance(record.msg, dict):
+            message_dict = record.msg
+            record.message = ""
+        else:
+            record.message = record.getMessage()
+
+        log_record = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "name": record.name,
+            "message": record.message,
+            **self.static_fields,
+            **message_dict,
+        }
+
+        if record.exc_info and not log_record.get("exc_info"):
+            log_record["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text and not log_record.get("exc_info"):
+            log_record["exc_info"] = record.exc_text
+        if record.stack_info and not log_record.get("stack_info"):
+            log_record["stack_info"] = self.formatStack(record.stack_info)
+
+        for key, value in record.__dict__.items():
+            if key not in _SKIP_FIELDS and not key.startswith("_"):
+                log_record[key] = value
+
+        return orjson.dumps(log_record, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+class BackgroundQueueListener(QueueListener):
+    """The listener of :class:`BackgroundQueueHandler`."""
+
+    def enqueue_sentinel(self) -> None:
+        # The base class raises queue.Full when stopping with a full queue, this waits instead.
+        self.queue.put(self._sentinel)
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """Hand the log records to a background thread, which writes them to the actual handlers.
+
+    This keeps writing to stdout (or exporting to Azure) out of the request thread.
+    The listener is configured by ``dictConfig()`` from the ``handlers`` setting.
+    It's started on the first record, so each (forked) worker process runs its own thread.
+    When the queue is full, records are dropped instead of blocking the request.
+    """
+
+    listener: BackgroundQueueListener | None = None
+    block = False
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.block:
+            self.queue.put(record)
+            return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge the message arguments, as these may change before the record is written.
+
+        Unlike the base class, this doesn't format the record;
+        the formatter of the target handler still receives all fields.
+        """
+        record = copy.copy(record)
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def start(self) -> None:
+        """Start the listener thread in this process."""
+        with self._lock:
+            pid = os.getpid()
+            if self._pid == pid or self.listener is None:
+                return
+            if self._pid is not None:
+                # The thread of the parent process doesn't exist after a fork,
+                # and its queue might have been locked at that moment.
+                self.queue = queue.Queue(self.queue.maxsize)
+                self.listener.queue = self.queue
+                self.listener._thread = None
+            self.listener.start()
+            self._pid = pid
+            atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Write the pending records and stop the listener thread."""
+        with self._lock:
+            if self._pid == os.getpid() and self.listener is not None:
+                self.listener.stop()
+            self._pid = None
+
+
+class BlockingQueueHandler(BackgroundQueueHandler):
+    """A :class:`BackgroundQueueHandler` that waits for the writer when the queue is full.
+
+    This is used for audit records, which may never be lost.
+    It's a separate class, as ``dictConfig()`` doesn't pass extra arguments to
+    queue handlers on all Python versions.
+    """
+
+    block = True
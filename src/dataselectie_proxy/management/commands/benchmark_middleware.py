@@ -0,0 +1,74 @@
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from dataselectie_proxy.handlers import LeanWSGIHandler
+
+
+class _NoViewMixin:
+    """Answer every request directly, so only the middleware stack is measured."""
+
+    def _get_response(self, request):
+        return HttpResponse(b"{}", content_type="application/json")
+
+
+class FullHandler(_NoViewMixin, WSGIHandler):
+    pass
+
+
+class LeanHandler(_NoViewMixin, LeanWSGIHandler):
+    pass
+
+
+class Command(BaseCommand):
+    """Measure the fixed overhead of the middleware for a search request.
+
+    The view is replaced by a fixed response, so the difference between
+    the full and the lean handler is the time saved per request.
+    """
+
+    help = "Compare the per-request overhead of the full and the lean middleware stack."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/dataselectie/v2/bag/search")
+        parser.add_argument("--requests", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        environ = (
+            RequestFactory()
+            .get(
+                options["path"],
+                HTTP_ORIGIN="https://data.amsterdam.nl",
+                HTTP_ACCEPT_ENCODING="gzip",
+            )
+            .environ
+        )
+
+        results = {}
+        for name, handler in (("full", FullHandler()), ("lean", LeanHandler())):
+            results[name] = self.measure(handler, environ, options["requests"], options["repeat"])
+            self.stdout.write(f"{name}: {results[name] * 1e6:.1f} µs/request")
+
+        saved = results["full"] - results["lean"]
+        self.stdout.write(
+            f"Saved: {saved * 1e6:.1f} µs/request ({saved / results['full']:.0%} of the overhead)"
+        )
+
+    def measure(self, handler: WSGIHandler, environ: dict, requests: int, repeat: int) -> float:
+        """Give the fastest time per request of the repeats, to reduce the noise."""
+
+        def start_response(status, headers, exc_info=None):
+            pass
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(requests):
+                response = handler(dict(environ), start_response)
+                response.close()
+            best = min(best, (time.perf_counter() - start) / requests)
+        return best
@@ -0,0 +1,152 @@
+import csv
+import io
+import os
+import re
+import sqlite3
+from contextlib import closing
+from itertools import islice
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from dataselectie_proxy.search.clients import TRUE_VALUES, USER_AGENT
+from dataselectie_proxy.search.indexes import INDEX_MAPPING, SearchIndex
+from dataselectie_proxy.search.local import get_local_index_path
+
+FIELD_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class Command(BaseCommand):
+    """Build the local copy of a public dataset, from the CSV export of the DSO API.
+
+    The database is written next to the current one, and then moved in place.
+    The running workers pick up the new file on their next search.
+    """
+
+    help = "Build the local search index of public datasets from the DSO API."
+
+    batch_size = 10000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "datasets", nargs="*", help="Datasets to build (default: LOCAL_SEARCH_INDEXES)"
+        )
+        parser.add_argument("--source", help="Read this CSV file instead of the DSO API")
+
+    def handle(self, *args, **options):
+        datasets = options["datasets"] or settings.LOCAL_SEARCH_INDEXES
+        if not datasets:
+            raise CommandError("No datasets given, and LOCAL_SEARCH_INDEXES is empty.")
+        unknown = set(datasets) - set(INDEX_MAPPING)
+        if unknown:
+            raise CommandError(f"Unknown datasets: {', '.join(sorted(unknown))}")
+        if non_public := [dataset for dataset in datasets if not INDEX_MAPPING[dataset].public]:
+            raise CommandError(f"Datasets are not public: {', '.join(non_public)}")
+        if options["source"] and len(datasets) > 1:
+            raise CommandError("A source file can only be used for a single dataset.")
+
+        for dataset in datasets:
+            index = INDEX_MAPPING[dataset]
+            path = get_local_index_path(index)
+            if options["source"]:
+                with open(options["source"], encoding="utf-8", newline="") as source:
+                    count = self.build(index, csv.reader(source), path)
+            else:
+                with self.open_export(index) as response:
+                    stream = io.TextIOWrapper(response.raw, encoding="utf-8", newline="")
+                    count = self.build(index, csv.reader(stream), path)
+            self.stdout.write(f"Stored {count} documents of {index.index_name} in {path}")
+
+    def open_export(self, index: SearchIndex) -> requests.Response:
+        """Start downloading the CSV export of the dataset."""
+        response = requests.get(
+            f"{settings.DSO_API_BASE_URL}/v1/{index.api_path}",
+            params={"_format": "csv"},
+            headers={"User-Agent": USER_AGENT},
+            stream=True,
+            timeout=(10, 300),
+        )
+        if response.status_code != 200:
+            raise CommandError(f"DSO API returned HTTP {response.status_code}")
+        response.raw.decode_content = True
+        return response
+
+    def build(self, index: SearchIndex, rows, path: Path) -> int:
+        """Write the rows to a new database, and replace the current one."""
+        header = next(rows)
+        kept = [(i, name) for i, name in enumerate(header) if FIELD_NAME_RE.match(name)]
+        kinds = {name: self.get_kind(index, name) for _, name in kept}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.unlink(missing_ok=True)
+        try:
+            with closing(sqlite3.connect(tmp_path)) as connection:
+                with connection:
+                    self.create_tables(connection, kinds)
+                    count = self.insert_rows(connection, rows, kept, kinds)
+                    self.create_indexes(connection, index, kinds)
+                connection.execute("ANALYZE")
+
+            # The rename is atomic, readers either see the old or the new file.
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return count
+
+    def get_kind(self, index: SearchIndex, name: str) -> str:
+        if name in index.boolean_fields:
+            return "boolean"
+        elif name in index.numeric_fields:
+            return "number"
+        elif name in index.date_fields:
+            return "date"
+        return "text"
+
+    def create_tables(self, connection: sqlite3.Connection, kinds: dict[str, str]) -> None:
+        affinity = {"boolean": "INTEGER", "number": "NUMERIC"}
+        columns = ", ".join(
+            f'"{name}" {affinity.get(kind, "TEXT")}' for name, kind in kinds.items()
+        )
+        connection.execute(f"CREATE TABLE docs ({columns})")
+        connection.execute("CREATE TABLE columns (name TEXT PRIMARY KEY, kind TEXT)")
+        connection.executemany("INSERT INTO columns VALUES (?, ?)", kinds.items())
+
+    def insert_rows(
+        self, connection: sqlite3.Connection, rows, kept: list[tuple[int, str]], kinds: dict
+    ) -> int:
+        sql = f"INSERT INTO docs VALUES ({', '.join('?' * len(kept))})"  # noqa: S608
+        converters = [self.get_converter(kinds[name]) for _, name in kept]
+        count = 0
+        while batch := list(islice(rows, self.batch_size)):
+            connection.executemany(
+                sql,
+                (
+                    [
+                        convert(row[i]) if i < len(row) and row[i] != "" else None
+                        for (i, _), convert in zip(kept, converters, strict=True)
+                    ]
+                    for row in batch
+                ),
+            )
+            count += len(batch)
+        return count
+
+    def get_converter(self, kind: str):
+        if kind == "boolean":
+            return lambda value: int(value.lower() in TRUE_VALUES)
+        return str
+
+    def create_indexes(
+        self, connection: sqlite3.Connection, index: SearchIndex, kinds: dict[str, str]
+    ) -> None:
+        # Filters and facets are mostly on the facet fields, maps use the coordinates.
+        for name in sorted((index.facets | index.numeric_fields) & kinds.keys()):
+            connection.execute(f'CREATE INDEX "docs_{name}" ON docs ("{name}")')
+        if index.coordinate_fields and set(index.coordinate_fields) <= kinds.keys():
+            lat_field, lon_field = index.coordinate_fields
+            connection.execute(
+                f'CREATE INDEX docs_coordinates ON docs ("{lat_field}", "{lon_field}")'
+            )
@@ -0,0 +1,209 @@
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+from azure.core.credentials import AccessToken
+from django.core.cache import caches
+from django.core.management import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.utils.http import urlencode
+
+from dataselectie_proxy.cache import proxy_cache
+from dataselectie_proxy.search.clients import get_export_client, get_search_client
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    """Answer the requests of the proxy, like Azure and the DSO API would.
+
+    The responses only have the structure of the real responses, as the replay
+    is about the behavior of the proxy itself (caching, pools, translation).
+    """
+
+    latency = 0.0
+
+    def do_POST(self):
+        body = orjson.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        documents = [{"id": i} for i in range(body.get("top", 0))]
+        self._respond(
+            "application/json",
+            orjson.dumps(
+                {
+                    "@odata.context": f"http://{self.headers['Host']}{self.path}",
+                    "@odata.count": 10000,
+                    "@search.facets": {},
+                    "value": documents,
+                }
+            ),
+        )
+
+    def do_GET(self):
+        if self.path.startswith("/v1/"):
+            self._respond("text/csv", b"id\n" + b"".join(b"%d\n" % i for i in range(1000)))
+        elif "/stats?" in self.path:
+            self._respond("application/json", b'{"documentCount": 10000, "storageSize": 1}')
+        else:
+            self.send_error(404)
+
+    def do_HEAD(self):
+        self._respond("text/plain", b"")
+
+    def _respond(self, content_type: str, content: bytes):
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    """Replay a traffic capture against a local stub of the upstream services.
+
+    This drives the whole proxy (middleware, translation, caching and connection pools)
+    with the real mix of requests, while the upstream responds with a fixed latency.
+    """
+
+    help = "Replay a traffic capture, and report the latency and cache hit rate."
+
+    def add_arguments(self, parser):
+        parser.add_argument("capture_file", help="NDJSON file of TRAFFIC_CAPTURE_FILE")
+        parser.add_argument(
+            "--speedup",
+            type=float,
+            default=1.0,
+            help="Replay faster than captured, 0 sends the requests as fast as possible",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=4, help="Number of concurrent requests"
+        )
+        parser.add_argument(
+            "--upstream-latency",
+            type=float,
+            default=50,
+            help="Response time of the stub upstream in milliseconds",
+        )
+        parser.add_argument(
+            "--authorization", default="", help="Authorization header for protected datasets"
+        )
+        parser.add_argument(
+            "--clear-cache", action="store_true", help="Start with an empty response cache"
+        )
+
+    def handle(self, *args, **options):
+        records = self.read_capture(options["capture_file"])
+        if not records:
+            raise CommandError("The capture file has no requests.")
+
+        StubUpstreamHandler.latency = options["upstream_latency"] / 1000
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubUpstreamHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        upstream_url = f"http://127.0.0.1:{server.server_port}"
+
+        try:
+            with override_settings(
+                AZURE_SEARCH_BASE_URL=upstream_url,
+                DSO_API_BASE_URL=upstream_url,
+                CLOUD_ENV="local",
+                ACCESS_TOKEN=AccessToken("replay", expires_on=int(time.time()) + 86400),
+                ALLOWED_HOSTS=["*"],
+                TRAFFIC_CAPTURE_FILE="",
+            ):
+                self.reset_clients(clear_cache=options["clear_cache"])
+                start = time.monotonic()
+                results = self.replay(records, options)
+                duration = time.monotonic() - start
+        finally:
+            server.shutdown()
+            self.reset_clients(clear_cache=False)
+
+        self.report(results, duration)
+
+    def read_capture(self, capture_file: str) -> list[dict]:
+        try:
+            with open(capture_file, "rb") as file:
+                records = [orjson.loads(line) for line in file if line.strip()]
+        except (OSError, orjson.JSONDecodeError) as e:
+            raise CommandError(f"Unable to read {capture_file}: {e}") from None
+        return sorted(records, key=lambda record: record["time"])
+
+    def reset_clients(self, clear_cache: bool):
+        # The shared clients are created with the base URL, recreate them for the stub.
+        get_search_client.cache_clear()
+        get_export_client.cache_clear()
+        if clear_cache:
+            caches["default"].clear()
+            proxy_cache.clear_local()
+
+    def replay(self, records: list[dict], options: dict) -> list[tuple]:
+        """Send the requests at the captured pace, divided by the speedup."""
+        headers = {"Authorization": options["authorization"]} if options["authorization"] else {}
+        local = threading.local()
+        first_time = records[0]["time"]
+        speedup = options["speedup"]
+        start = time.monotonic()
+
+        def _send(record: dict) -> tuple:
+            # The test client is not thread-safe, each thread has its own.
+            if not hasattr(local, "client"):
+                local.client = Client(headers=headers, raise_request_exception=False)
+
+            query = urlencode(record["params"], doseq=True)
+            response = local.client.generic(record["method"], f"{record['path']}?{query}")
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            return response.status_code, response.get("X-Cache")
+
+        def _replay(record: dict) -> tuple:
+            if speedup:
+                delay = (record["time"] - first_time) / speedup - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            request_start = time.perf_counter()
+            status, cache_status = _send(record)
+            return record["path"], status, cache_status, time.perf_counter() - request_start
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            return list(executor.map(_replay, records))
+
+    def report(self, results: list[tuple], duration: float):
+        latencies = sorted(result[3] * 1000 for result in results)
+        statuses = Counter(result[1] for result in results)
+        cache_statuses = Counter(result[2] for result in results if result[2])
+
+        self.stdout.write(
+            f"Replayed {len(results)} requests in {duration:.1f}s"
+            f" ({len(results) / duration:.1f} req/s)"
+        )
+        self.stdout.write(
+            "Status: "
+            + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items()))
+        )
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+            self.stdout.write(
+                f"Latency: p50={percentiles[49]:.1f}ms p90={percentiles[89]:.1f}ms"
+                f" p99={percentiles[98]:.1f}ms max={latencies[-1]:.1f}ms"
+            )
+        else:
+            self.stdout.write(f"Latency: {latencies[0]:.1f}ms")
+
+        hits, misses = cache_statuses["HIT"], cache_statuses["MISS"]
+        if hits + misses:
+            self.stdout.write(
+                f"Cache: {hits} hits, {misses} misses ({hits / (hits + misses):.1%} hit rate)"
+            )
+
+        for path, count in Counter(result[0] for result in results).most_common(10):
+            path_latencies = [result[3] * 1000 for result in results if result[0] == path]
+            self.stdout.write(
+                f"  {path}: {count} requests, mean {statistics.fmean(path_latencies):.1f}ms"
+            )
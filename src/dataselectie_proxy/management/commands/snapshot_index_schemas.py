@@ -0,0 +1,44 @@
+import orjson
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from dataselectie_proxy.search.clients import AzureSearchServiceClient
+from dataselectie_proxy.search.indexes import INDEX_MAPPING
+from dataselectie_proxy.search.schemas import get_snapshot_path
+
+
+class Command(BaseCommand):
+    """Store the Azure index schemas locally.
+
+    The snapshots are used to validate requests when the schema
+    can't be retrieved from Azure during startup.
+    """
+
+    help = "Store a local snapshot of the Azure index schemas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "datasets", nargs="*", help="Datasets to store (default: all)", metavar="dataset"
+        )
+
+    def handle(self, *args, **options):
+        datasets = options["datasets"] or list(INDEX_MAPPING)
+        unknown = set(datasets) - set(INDEX_MAPPING)
+        if unknown:
+            raise CommandError(f"Unknown datasets: {', '.join(sorted(unknown))}")
+
+        client = AzureSearchServiceClient(base_url=settings.AZURE_SEARCH_BASE_URL)
+        for dataset in datasets:
+            index = INDEX_MAPPING[dataset]
+            definition = client.get_index_definition(index)
+
+            # Only the field definitions are needed for validation
+            path = get_snapshot_path(index)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(
+                orjson.dumps(
+                    {"name": definition["name"], "fields": definition["fields"]},
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE,
+                )
+            )
+            self.stdout.write(f"Stored schema of {index.index_name} in {path}")
@@ -0,0 +1,102 @@
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Sample the call stack of a thread at a fixed interval.
+
+    The stacks are collected in the "folded" format (``module:function;...  count``),
+    which can be turned into a flame graph with e.g. ``flamegraph.pl`` or speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._fold(frame)] += 1
+
+    def _fold(self, frame) -> str:
+        names = []
+        while frame is not None:
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+class ProfilingMiddleware:
+    """Profile a single request, for admins that send the ``PROFILING_HEADER``.
+
+    With the header value ``response``, the folded stacks are returned instead of the response.
+    Otherwise, they're written to ``PROFILING_DIR`` and the file name is given in a header.
+    This needs to be placed after the authorization middleware, which provides the scopes.
+    Without the header, this only costs a header lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        mode = request.headers.get(settings.PROFILING_HEADER)
+        if not mode or settings.ADMIN_SCOPE not in request.get_token_scopes:
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+
+        if mode == "response":
+            return HttpResponse(
+                sampler.folded(),
+                content_type="text/plain",
+                headers={"X-Profile-Status": response.status_code},
+            )
+
+        try:
+            response["X-Profile-File"] = self.write_profile(sampler.folded())
+        except OSError as e:
+            logger.warning("Unable to write profile: %s", e)
+        return response
+
+    def write_profile(self, folded: str) -> str:
+        """Store the profile, removing the oldest profiles to keep the directory bounded."""
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}.folded"
+        (directory / name).write_text(folded)
+
+        profiles = sorted(directory.glob("*.folded"), key=lambda path: path.stat().st_mtime)
+        for path in profiles[: -settings.PROFILING_MAX_FILES]:
+            path.unlink(missing_ok=True)
+        return name
@@ -0,0 +1,160 @@
+import hashlib
+import hmac
+import logging
+import os
+import random
+import re
+import time
+from datetime import date, timedelta
+
+import orjson
+from django.conf import settings
+from django.http import QueryDict
+from rest_framework.request import Request
+
+from dataselectie_proxy.search.indexes import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# String literals in an OData filter, quotes are escaped by doubling them.
+ODATA_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+# The literals in an OData filter: strings, and the numbers and dates a field is compared with.
+ODATA_LITERAL_RE = re.compile(
+    rf"{ODATA_STRING_RE.pattern}"
+    r"|\b(?P<field>\w+) (?P<operator>eq|ne|gt|ge|lt|le) (?P<value>-?[0-9][0-9.:+TZ-]*)"
+)
+
+# The locations of users are rounded to 2 decimals of a degree (roughly a kilometer).
+COORDINATE_PARAMS = {"bbox", "point"}
+COORDINATE_DIGITS = 2
+
+# Hashed numbers keep their number of digits, hashed dates fall within this range.
+NUMBER_RE = re.compile(r"-?[0-9]+(\.[0-9]+)?")
+HASHED_DATE_START = date(1900, 1, 1)
+HASHED_DATE_DAYS = 200 * 365
+
+
+class TrafficCapture:
+    """Write a sample of the translated requests to a local NDJSON file.
+
+    The file is used by the ``replay_traffic`` command, to test the proxy with the real mix
+    of datasets, filters, sorting and page depths. Headers are never written, so tokens
+    are not part of the capture. With ``TRAFFIC_CAPTURE_HASH_VALUES``, the values of filters
+    are replaced with a keyed hash, which keeps the distribution of values for cache sizing.
+    Only the fields in ``SearchIndex.capture_plain_fields`` are kept as they are.
+    Numbers and dates are hashed into another number or date, and the coordinates of geo filters
+    are rounded, so the replayed requests are still valid.
+    """
+
+    def capture(
+        self, request: Request, index: SearchIndex, backend_args: dict, plain_params: set[str]
+    ) -> None:
+        """Write the request when it's part of the sample.
+
+        :param backend_args: The translated arguments for the backend, without headers.
+        :param plain_params: Parameters that never contain personal data, e.g. for paging.
+        """
+        if not settings.TRAFFIC_CAPTURE_FILE or random.random() >= settings.TRAFFIC_CAPTURE_RATE:
+            return
+
+        record = {
+            "time": time.time(),
+            "method": request.method,
+            "path": request.path,
+            "params": self._sanitize_params(request.GET, index, plain_params),
+            "backend": self._sanitize_backend_args(backend_args, index, plain_params),
+        }
+        try:
+            self._write(orjson.dumps(record) + b"\n")
+        except OSError as e:
+            logger.warning("Unable to write traffic capture: %s", e)
+
+    def _write(self, line: bytes) -> None:
+        # Every line is a single append, so workers can write to the same file.
+        fd = os.open(settings.TRAFFIC_CAPTURE_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < settings.TRAFFIC_CAPTURE_MAX_BYTES:
+                os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _sanitize_params(
+        self, params: QueryDict, index: SearchIndex, plain_params: set[str]
+    ) -> dict[str, list[str]]:
+        if not settings.TRAFFIC_CAPTURE_HASH_VALUES:
+            return dict(params.lists())
+
+        return {
+            name: self._sanitize_values(name, values, index, plain_params)
+            for name, values in params.lists()
+        }
+
+    def _sanitize_values(
+        self, name: str, values: list[str], index: SearchIndex, plain_params: set[str]
+    ) -> list[str]:
+        # Parameters of the DSO API start with an underscore, e.g. "_format".
+        field_name = name.partition("__")[0]
+        if name in COORDINATE_PARAMS:
+            return [self._round_coordinates(value) for value in values]
+        if (
+            name in plain_params
+            or name.startswith("_")
+            or field_name in index.capture_plain_fields
+        ):
+            return values
+        return [self._hash_value(field_name, value, index) for value in values]
+
+    def _sanitize_backend_args(
+        self, backend_args: dict, index: SearchIndex, plain_params: set[str]
+    ) -> dict:
+        backend_args = {
+            name: (
+                self._sanitize_params(value, index, plain_params)
+                if isinstance(value, QueryDict)
+                else value
+            )
+            for name, value in backend_args.items()
+        }
+        if settings.TRAFFIC_CAPTURE_HASH_VALUES and backend_args.get("filter"):
+            backend_args["filter"] = ODATA_LITERAL_RE.sub(
+                lambda match: self._sanitize_filter_value(match, index), backend_args["filter"]
+            )
+        return backend_args
+
+    def _sanitize_filter_value(self, match: re.Match, index: SearchIndex) -> str:
+        if match.group("field") is None:
+            return f"'{self._hash(match.group(0)[1:-1])}'"
+
+        field_name, value = match.group("field"), match.group("value")
+        if field_name in (index.coordinate_fields or ()):
+            value = self._round_coordinate(value)
+        elif field_name not in index.capture_plain_fields:
+            value = self._hash_value(field_name, value, index)
+        return f"{field_name} {match.group('operator')} {value}"
+
+    def _hash_value(self, field_name: str, value: str, index: SearchIndex) -> str:
+        """Hash the value, numbers and dates are hashed into another number or date."""
+        if field_name in index.numeric_fields and NUMBER_RE.fullmatch(value):
+            digits = len(value.lstrip("-").partition(".")[0])
+            return str(int(self._hash(value), 16) % 10**digits)
+        if field_name in index.date_fields:
+            days = int(self._hash(value), 16) % HASHED_DATE_DAYS
+            return (HASHED_DATE_START + timedelta(days=days)).isoformat()
+        return self._hash(value)
+
+    def _round_coordinates(self, value: str) -> str:
+        try:
+            return ",".join(self._round_coordinate(number) for number in value.split(","))
+        except ValueError:
+            return self._hash(value)
+
+    def _round_coordinate(self, value: str) -> str:
+        return repr(round(float(value), COORDINATE_DIGITS))
+
+    def _hash(self, value: str) -> str:
+        digest = hmac.new(settings.SECRET_KEY.encode(), value.encode(), hashlib.sha256)
+        return digest.hexdigest()[:16]
+
+
+traffic_capture = TrafficCapture()
@@ -1,5 +1,13 @@
+import hashlib
 import json
 import logging
+import math
+import os
+import re
+from datetime import datetime, time
+from functools import cache
+from itertools import chain
+from time import monotonic
 from urllib.parse import urlparse
 
 import orjson
@@ -7,21 +15,36 @@ import requests
 from azure.core.credentials import AccessToken
 from azure.identity import DefaultAzureCredential
 from django.conf import settings
+from django.http import QueryDict
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import get_current_timezone, is_naive
 from more_ds.network import URL
 from requests import JSONDecodeError
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, NotFound, PermissionDenied, ValidationError
 from rest_framework.request import Request
 
+from dataselectie_proxy.cache import proxy_cache
+from dataselectie_proxy.search.capture import traffic_capture
+from dataselectie_proxy.search.concurrency import map_concurrently
 from dataselectie_proxy.search.exceptions import BadGateway
+from dataselectie_proxy.search.facets import FacetValues, facet_values
+from dataselectie_proxy.search.freshness import index_freshness
+from dataselectie_proxy.search.geo import BoundingBox, Grid, parse_coordinates
 from dataselectie_proxy.search.indexes import SearchIndex
+from dataselectie_proxy.search.local import local_search
+from dataselectie_proxy.search.schemas import index_schemas
+from dataselectie_proxy.search.slowlog import slow_queries
 
 logger = logging.getLogger(__name__)
 
 USER_AGENT = "Amsterdam-Dataselectie-Proxy/1.0"
+TRUE_VALUES = ("true", "t", "on", "1")
 
 
 class BaseClient:
     endpoint_url: URL
+    # Parameters that never hold personal data, these are not hashed in the traffic capture.
+    capture_plain_params: set[str] = set()
 
     def __init__(self, base_url: URL) -> None:
         """Initialize the client configuration.
@@ -34,16 +57,48 @@ class BaseClient:
         self._host = urlparse(base_url).netloc
         self._session = requests.Session()
 
+    def preconnect(self, timeout: float) -> None:
+        """Open a pooled connection to the backend, so the DNS lookup
+        and TLS handshake are done before the first request needs it.
+        """
+        # The response itself is not relevant, only the connection that stays in the pool.
+        self._session.head(self.base_url, timeout=timeout).close()
+
     def call(
         self, request: Request, index: SearchIndex, stream: bool = False
     ) -> requests.Response:
-        request_args = self._extract_request_args(request, stream=stream)
+        request_args = self.get_request_args(request, index, stream=stream)
+        return self.send(request, request_args, index, stream=stream)
 
+    def get_request_args(self, request: Request, index: SearchIndex, stream: bool = False) -> dict:
+        """Translate the incoming request into the arguments for the backend request."""
+        request_args = self._extract_request_args(request, stream=stream)
         request_args = self._transform_request_args(request_args, index)
+        request_args = self._restrict_request_args(request, request_args, index)
+        self._capture(request, index, request_args)
+        return request_args
+
+    def _capture(self, request: Request, index: SearchIndex, request_args: dict) -> None:
+        """Add the translated request to the traffic capture, without the headers."""
+        backend_args = request_args.get("json") or {"params": request_args.get("params")}
+        traffic_capture.capture(request, index, backend_args, self.capture_plain_params)
+
+    def send(
+        self,
+        request: Request,
+        request_args: dict,
+        index: SearchIndex,
+        stream: bool = False,
+        location: str | None = None,
+    ) -> requests.Response:
+        """Perform the backend request with the translated arguments.
+
+        :param location: The URL that gives these results, when it's not the current request.
+        """
         response = self._call(request_args, index)
 
         if not stream:
-            self._change_odata_context(request, response)
+            self._change_odata_context(request, response, location)
         return self._handle_response(response, stream)
 
     def _handle_response(
@@ -93,11 +148,11 @@ class BaseClient:
         # Unexpected response, call it a "Bad Gateway"
         logger.error(
             "Proxy call failed, unexpected status code from endpoint: %s %s",
-            response.status,
+            response.status_code,
             detail_message,
         )
         return BadGateway(
-            detail_message or f"Unexpected HTTP {response.status} from internal endpoint"
+            detail_message or f"Unexpected HTTP {response.status_code} from internal endpoint"
         )
 
     def _call(self, request_args: dict, index: SearchIndex) -> requests.Response:
@@ -139,7 +194,9 @@ class BaseClient:
 
         return response
 
-    def _change_odata_context(self, request: Request, response: requests.Response) -> None:
+    def _change_odata_context(
+        self, request: Request, response: requests.Response, location: str | None = None
+    ) -> None:
         """Change the odata.context value to our domain instead of Azure search"""
         try:
             json_body = response.json()
@@ -147,12 +204,18 @@ class BaseClient:
             pass
         else:
             if "@odata.context" in json_body:
-                json_body["@odata.context"] = request.build_absolute_uri()
+                json_body["@odata.context"] = request.build_absolute_uri(location)
                 response._content = json.dumps(json_body).encode()
 
     def _transform_request_args(self, request_args: dict, index: SearchIndex) -> dict:
         return request_args
 
+    def _restrict_request_args(
+        self, request: Request, request_args: dict, index: SearchIndex
+    ) -> dict:
+        """Limit the backend request to what the user may see."""
+        return request_args
+
 
 class AzureSearchServiceClient(BaseClient):
     """
@@ -160,7 +223,22 @@ class AzureSearchServiceClient(BaseClient):
     """
 
     api_version: str = "2025-08-01-preview"
-    page_size: int = 100
+    non_filter_params: set[str] = {
+        "sort",
+        "page",
+        "page_size",
+        "fields",
+        "facets",
+        "facet_count",
+        "count_only",
+        "disjunctive_facets",
+    }
+    geo_params: set[str] = {"bbox", "point", "radius"}
+    # The coordinates of "bbox" and "point" are rounded by the traffic capture.
+    capture_plain_params = non_filter_params | {"radius"}
+    range_operators: dict[str, str] = {"gte": "ge", "lte": "le"}
+    field_name_re = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+    response_time_weight: float = 0.2
 
     def __init__(self, base_url: URL) -> None:
         """Initialize the client configuration.
@@ -171,6 +249,8 @@ class AzureSearchServiceClient(BaseClient):
         super().__init__(base_url)
 
         self._credential = DefaultAzureCredential()
+        # Moving average of the search response time, tells how busy the service is.
+        self.response_time = 0.0
 
     def _fetch_token(self) -> AccessToken:
         if settings.CLOUD_ENV == "local":
@@ -178,14 +258,313 @@ class AzureSearchServiceClient(BaseClient):
         else:
             return self._credential.get_token("https://search.azure.com/.default")
 
+    def fetch_token(self) -> None:
+        """Fetch the access token, so it's cached by the credential before it's needed."""
+        self._fetch_token()
+
+    def search(
+        self, request: Request, index: SearchIndex, params: QueryDict, location: str | None = None
+    ) -> requests.Response:
+        """Perform a search with the given parameters, instead of the request query string.
+
+        :param location: The URL that would give the same results, used for the odata.context.
+        """
+        request_args = self.get_search_request_args(params, index)
+        response = self._call(request_args, index)
+
+        self._change_odata_context(request, response, location)
+        return self._handle_response(response)
+
+    def get_search_request_args(self, params: QueryDict, index: SearchIndex) -> dict:
+        """Translate the given search parameters, instead of the request query string."""
+        request_args = {"headers": {}, "params": params, "data": {}}
+        return self._transform_request_args(request_args, index)
+
+    def count(self, request: Request, index: SearchIndex, params: QueryDict | None = None) -> int:
+        """Only count the number of results for the search.
+
+        This skips retrieving documents and facets, and the result is cached
+        separately as it's only a single number.
+        """
+        request_args = self.get_search_request_args(
+            request.GET if params is None else params, index
+        )
+        if params is None:
+            self._capture(request, index, request_args)
+
+        # Facets are not counted, so their disjunctive queries are not needed either.
+        request_args.pop("facet_queries", None)
+        search_args = request_args["json"]
+        for arg in ("orderby", "select"):
+            search_args.pop(arg, None)
+        search_args.update({"count": True, "facets": [], "skip": 0, "top": 0})
+
+        def _fetch_count():
+            response = self._handle_response(self._call(request_args, index))
+            return response.json()["@odata.count"]
+
+        return proxy_cache.get_or_set(
+            self._get_count_cache_key(search_args, index),
+            _fetch_count,
+            timeout=settings.COUNT_CACHE_TIMEOUT,
+        )
+
+    def get_clusters(self, index: SearchIndex, params: QueryDict) -> dict:
+        """Count the results per cell of a grid, to show them as clusters on a map.
+
+        Each row of the grid is counted with a range facet on the longitude,
+        so no documents have to be retrieved. The result is cached as a whole.
+        """
+        if not index.coordinate_fields:
+            raise NotFound("Clustering is not supported for this dataset.")
+        for name in ("bbox", "zoom"):
+            if not params.get(name):
+                raise ValidationError({name: "This field is required."})
+
+        bbox = BoundingBox.from_param("bbox", params["bbox"])
+        zoom = self._get_int_param(params, "zoom", default=0, min_value=0, max_value=22)
+        grid = Grid.for_viewport(bbox, zoom, settings.CLUSTER_CELL_PIXELS)
+        if grid.rows > settings.CLUSTER_MAX_ROWS or grid.columns > settings.CLUSTER_MAX_COLUMNS:
+            raise ValidationError({"zoom": "The map area is too large for this zoom level."})
+
+        # Filter on the whole grid, so the cells at the edges are complete.
+        lat_edges, lon_edges = grid.lat_edges(), grid.lon_edges()
+        params = params.copy()
+        params["bbox"] = f"{lon_edges[0]},{lat_edges[0]},{lon_edges[-1]},{lat_edges[-1]}"
+        params.pop("zoom")
+        search_filter = self.get_search_request_args(params, index)["json"]["filter"]
+
+        def _fetch_clusters():
+            rows = map_concurrently(
+                lambda row: self._get_cluster_row(index, grid, search_filter, row),
+                range(grid.rows),
+                max_workers=settings.CLUSTER_MAX_WORKERS,
+            )
+            cells = [cell for row in rows for cell in row]
+            return {
+                "zoom": zoom,
+                "count": sum(cell["count"] for cell in cells),
+                "cells": cells,
+            }
+
+        digest = hashlib.sha256(orjson.dumps([search_filter, lat_edges, lon_edges]))
+        generation = index_freshness.get_generation(index)
+        return proxy_cache.get_or_set(
+            f"dataselectie-clusters:{index.index_name}:{generation}:{digest.hexdigest()}",
+            _fetch_clusters,
+            timeout=settings.SEARCH_CACHE_TIMEOUT,
+        )
+
+    def _get_cluster_row(
+        self, index: SearchIndex, grid: Grid, search_filter: str, row: int
+    ) -> list[dict]:
+        lat_field, lon_field = index.coordinate_fields
+        lat_edges, lon_edges = grid.lat_edges(), grid.lon_edges()
+        # The last row includes its upper edge, as the bbox filter does.
+        upper_operator = "le" if row == grid.rows - 1 else "lt"
+        row_filter = (
+            f"{lat_field} ge {lat_edges[row]!r}"
+            f" and {lat_field} {upper_operator} {lat_edges[row + 1]!r}"
+        )
+
+        request_args = {
+            "headers": self._get_headers(),
+            "json": {
+                "top": 0,
+                "filter": f"{search_filter} and {row_filter}",
+                "facets": [f"{lon_field},values:{'|'.join(map(repr, lon_edges))}"],
+            },
+        }
+        response = self._handle_response(self._call(request_args, index))
+
+        latitude = round(lat_edges[row] + grid.lat_step / 2, 7)
+        cells = []
+        for entry in response.json()["@search.facets"][lon_field]:
+            # The range facets are [from, to), the values on the last edge are in the last cell.
+            if entry.get("count") and "from" in entry:
+                column = min(grid.column_of(entry["from"]), grid.columns - 1)
+                longitude = round(lon_edges[column] + grid.lon_step / 2, 7)
+                cells.append(
+                    {"latitude": latitude, "longitude": longitude, "count": entry["count"]}
+                )
+        return cells
+
+    def complete_facet(self, index: SearchIndex, facet: str, params: QueryDict) -> list[dict]:
+        """Give the most frequent values of a facet that start with ``?prefix=...``.
+
+        The values are retrieved once for each filter context, and completed from memory.
+        Without filters, the values are kept in memory by each process.
+        """
+        if facet not in index.facets:
+            raise NotFound("Facet not found.")
+        self._validate_field("facet", facet, index, "facetable")
+        prefix = params.get("prefix", "")
+        limit = self._get_int_param(params, "limit", default=10, min_value=1, max_value=100)
+
+        params = params.copy()
+        for name in ("prefix", "limit"):
+            params.pop(name, None)
+        search_filter = self.get_search_request_args(params, index)["json"]["filter"]
+
+        max_count = settings.FACET_VALUES_MAX
+
+        def _load():
+            entries = self._fetch_facet_values(index, facet, search_filter, max_count)
+            return FacetValues.from_azure(entries, max_count)
+
+        values = _load() if search_filter else facet_values.get(index, facet, _load)
+        matches = values.match(prefix, limit)
+
+        if (
+            not values.complete
+            and prefix
+            and facet not in index.numeric_fields | index.date_fields
+        ):
+            # Only the most frequent values are known, ask Azure for the values with this prefix.
+            # Unlike the completion in memory, this range filter is case-sensitive.
+            upper = prefix + "\uffff"
+            prefix_filter = f"{facet} ge {self._quote(prefix)} and {facet} lt {self._quote(upper)}"
+            entries = self._fetch_facet_values(
+                index, facet, " and ".join(filter(None, [search_filter, prefix_filter])), limit
+            )
+            known = {match["value"] for match in matches}
+            entries = matches + [entry for entry in entries if entry["value"] not in known]
+            matches = FacetValues.from_azure(entries, max_count).match(prefix, limit)
+
+        return matches
+
+    def _fetch_facet_values(
+        self, index: SearchIndex, facet: str, search_filter: str, count: int
+    ) -> list[dict]:
+        """Retrieve the most frequent values of a single facet."""
+
+        def _fetch():
+            request_args = {
+                "headers": self._get_headers(),
+                "json": {"top": 0, "filter": search_filter, "facets": [f"{facet},count:{count}"]},
+            }
+            response = self._handle_response(self._call(request_args, index))
+            return response.json()["@search.facets"][facet]
+
+        digest = hashlib.sha256(orjson.dumps([facet, search_filter, count]))
+        generation = index_freshness.get_generation(index)
+        return proxy_cache.get_or_set(
+            f"dataselectie-facet-values:{index.index_name}:{generation}:{digest.hexdigest()}",
+            _fetch,
+            timeout=settings.SEARCH_CACHE_TIMEOUT,
+        )
+
+    def get_crosstab(self, index: SearchIndex, params: QueryDict) -> dict:
+        """Count the results for each combination of the values of two facets.
+
+        The most frequent values of the ``?rows=...`` facet are retrieved first, then the
+        ``?columns=...`` facet is counted for each of these values, in parallel.
+        The counts are returned as matrix, and the result is cached as a whole.
+        """
+        fields = {}
+        for name in ("rows", "columns"):
+            facet = params.get(name)
+            if not facet:
+                raise ValidationError({name: "This field is required."})
+            if facet not in index.facets:
+                raise ValidationError({name: f"Invalid facet: '{facet}'."})
+            self._validate_field(name, facet, index, "facetable")
+            fields[name] = facet
+        if fields["rows"] == fields["columns"]:
+            raise ValidationError({"columns": "Should be another facet than the rows."})
+
+        row_count = self._get_int_param(
+            params,
+            "row_count",
+            default=settings.CROSSTAB_MAX_ROWS,
+            min_value=1,
+            max_value=settings.CROSSTAB_MAX_ROWS,
+        )
+        column_count = self._get_int_param(
+            params,
+            "column_count",
+            default=index.facet_count,
+            min_value=1,
+            max_value=index.facet_count,
+        )
+
+        params = params.copy()
+        for name in ("rows", "columns", "row_count", "column_count"):
+            params.pop(name, None)
+        search_filter = self.get_search_request_args(params, index)["json"]["filter"]
+
+        def _fetch_crosstab():
+            row_entries = [
+                entry
+                for entry in self._fetch_facet_values(
+                    index, fields["rows"], search_filter, row_count
+                )
+                if entry.get("value") is not None
+            ]
+            rows = map_concurrently(
+                lambda entry: self._get_crosstab_row(
+                    index, fields, search_filter, entry["value"], column_count
+                ),
+                row_entries,
+                max_workers=settings.FACET_MAX_WORKERS,
+            )
+
+            columns = sorted({value for row in rows for value in row})
+            return {
+                "rows": {
+                    "field": fields["rows"],
+                    "values": [entry["value"] for entry in row_entries],
+                    "totals": [entry["count"] for entry in row_entries],
+                },
+                "columns": {"field": fields["columns"], "values": columns},
+                "counts": [[row.get(value, 0) for value in columns] for row in rows],
+            }
+
+        digest = hashlib.sha256(
+            orjson.dumps(
+                [fields["rows"], fields["columns"], search_filter, row_count, column_count]
+            )
+        )
+        generation = index_freshness.get_generation(index)
+        return proxy_cache.get_or_set(
+            f"dataselectie-crosstab:{index.index_name}:{generation}:{digest.hexdigest()}",
+            _fetch_crosstab,
+            timeout=settings.SEARCH_CACHE_TIMEOUT,
+        )
+
+    def _get_crosstab_row(
+        self, index: SearchIndex, fields: dict, search_filter: str, value, column_count: int
+    ) -> dict:
+        """Count the values of the column facet, for a single value of the row facet."""
+        row_field = fields["rows"]
+        if isinstance(value, bool):
+            row_filter = f"{row_field} eq {'true' if value else 'false'}"
+        else:
+            row_filter = (
+                f"{row_field} eq {self._format_value('rows', row_field, str(value), index)}"
+            )
+
+        entries = self._fetch_facet_values(
+            index,
+            fields["columns"],
+            " and ".join(filter(None, [search_filter, row_filter])),
+            column_count,
+        )
+        return {
+            entry["value"]: entry["count"] for entry in entries if entry.get("value") is not None
+        }
+
+    def _get_count_cache_key(self, search_args: dict, index: SearchIndex) -> str:
+        digest = hashlib.sha256(orjson.dumps(search_args, option=orjson.OPT_SORT_KEYS))
+        generation = index_freshness.get_generation(index)
+        return f"dataselectie-count:{index.index_name}:{generation}:{digest.hexdigest()}"
+
     def search_address(self, request: Request, index: SearchIndex) -> requests.Response:
         """Extra endpoint to provide address search functionality"""
 
         # Append star for wildcard search in Azure search
         search_query = f"{request.GET.get('q', '')}*"
 
-        page_number = int(request.GET.get("page", 1))
-
         # Set only the required headers and build the request body
         request_args = {
             "headers": self._get_headers(),
@@ -211,34 +590,92 @@ class AzureSearchServiceClient(BaseClient):
                 "searchMode": "all",
                 "scoringProfile": "search_address",
                 "scoringStatistics": "global",
-                "skip": (page_number - 1) * self.page_size,
-                "top": self.page_size,
+                **self._get_paging(request.GET, index),
             },
         }
 
         response = self._call(request_args, index)
         return self._handle_response(response)
 
+    def get_index_definition(self, index: SearchIndex) -> dict:
+        """Retrieve the index schema, which contains the field definitions."""
+        response = self._session.request(
+            "GET",
+            f"{self.base_url}/{index.index_name}?api-version={self.api_version}",
+            headers=self._get_headers(),
+            timeout=settings.INDEX_METADATA_TIMEOUT,
+        )
+        return self._handle_response(response).json()
+
+    def get_index_statistics(self, index: SearchIndex) -> dict:
+        """Retrieve the document count and storage size of the index."""
+        response = self._session.request(
+            "GET",
+            f"{self.base_url}/{index.index_name}/stats?api-version={self.api_version}",
+            headers=self._get_headers(),
+            timeout=settings.INDEX_METADATA_TIMEOUT,
+        )
+        return self._handle_response(response).json()
+
     def _call(self, request_args: dict, index: SearchIndex) -> requests.Response:
+        if request_args.get("facet_queries"):
+            return self._call_with_facet_queries(request_args, index)
+
+        # Public datasets can be answered from a local copy, without a roundtrip to Azure.
+        if (response := local_search.search(index, request_args.get("json", {}))) is not None:
+            return response
+
         endpoint_url = (
             f"{self.base_url}/{index.index_name}/docs/search?api-version={self.api_version}"
         )
 
-        return self._session.request(
-            "POST",
-            endpoint_url,
-            **request_args,
+        start = monotonic()
+        response = None
+        try:
+            response = self._session.request(
+                "POST",
+                endpoint_url,
+                **request_args,
+            )
+            return response
+        finally:
+            elapsed = monotonic() - start
+            self.response_time += (elapsed - self.response_time) * self.response_time_weight
+            slow_queries.record(index, request_args.get("json", {}), elapsed, response)
+
+    def _call_with_facet_queries(
+        self, request_args: dict, index: SearchIndex
+    ) -> requests.Response:
+        """Perform the search and the queries of the disjunctive facets concurrently,
+        and add the facets of these queries to the search results.
+        """
+        search_args = {key: value for key, value in request_args.items() if key != "facet_queries"}
+        responses = map_concurrently(
+            lambda query: self._call({**search_args, "json": query}, index),
+            [search_args["json"], *request_args["facet_queries"]],
+            max_workers=settings.FACET_MAX_WORKERS,
         )
+        for response in responses:
+            if not 200 <= response.status_code < 300:
+                return response
+
+        response, *facet_responses = responses
+        json_body = response.json()
+        search_facets = json_body.setdefault("@search.facets", {})
+        for facet_response in facet_responses:
+            search_facets.update(facet_response.json().get("@search.facets", {}))
+        response._content = orjson.dumps(json_body)
+        return response
 
     def _transform_request_args(self, request_args: dict, index: SearchIndex) -> dict:
-        page_number = int(request_args["params"].get("page", 1))
-        request_args["data"]["skip"] = (page_number - 1) * self.page_size
-        request_args["data"]["top"] = self.page_size
+        index_schemas.ensure_loaded()
+        request_args["data"].update(self._get_paging(request_args["params"], index))
 
         # Add count to result
         request_args["data"]["count"] = True
 
-        request_args["data"].update(self._extract_sort_parameters(request_args))
+        request_args["data"].update(self._extract_sort_parameters(request_args, index))
+        request_args["data"].update(self._extract_select(request_args, index))
         request_args["data"].update(self._extract_facets_and_filters(request_args, index))
 
         request_args["json"] = request_args["data"]
@@ -252,41 +689,322 @@ class AzureSearchServiceClient(BaseClient):
 
         return request_args
 
-    def _extract_sort_parameters(self, request_args: dict) -> dict:
+    def _get_paging(self, params: QueryDict, index: SearchIndex) -> dict:
+        """Translate the page and page size into the skip/top parameters."""
+        page_number = self._get_int_param(params, "page", default=1, min_value=1)
+        page_size = self._get_int_param(
+            params,
+            "page_size",
+            default=index.page_size,
+            min_value=index.min_page_size,
+            max_value=index.max_page_size,
+        )
+        return {
+            "skip": (page_number - 1) * page_size,
+            "top": page_size,
+        }
+
+    def _get_int_param(
+        self,
+        params: QueryDict,
+        name: str,
+        default: int,
+        min_value: int | None = None,
+        max_value: int | None = None,
+    ) -> int:
+        try:
+            value = int(params.get(name, default))
+        except ValueError:
+            raise ValidationError({name: "A valid integer is required."}) from None
+
+        if min_value is not None and value < min_value:
+            raise ValidationError({name: f"Ensure this value is at least {min_value}."})
+        if max_value is not None and value > max_value:
+            raise ValidationError({name: f"Ensure this value is at most {max_value}."})
+        return value
+
+    def _extract_sort_parameters(self, request_args: dict, index: SearchIndex) -> dict:
         # Get the current sort parameters from the query parameters
         sort_fields = request_args["params"].get("sort", "").split(",")
+        for field in sort_fields:
+            if field:
+                self._validate_field("sort", field.removeprefix("-"), index, "sortable")
+
         sort_parameters = [
             f"{field[1:]} desc" if field.startswith("-") else field for field in sort_fields
         ]
 
         return {"orderby": ",".join(sort_parameters)}
 
+    def _extract_select(self, request_args: dict, index: SearchIndex) -> dict:
+        """Translate the ``?fields=...`` parameter into the fields Azure should return."""
+        if "fields" not in request_args["params"]:
+            return {"select": ",".join(index.default_fields)} if index.default_fields else {}
+
+        fields = [
+            field
+            for raw in request_args["params"].getlist("fields")
+            for field in raw.split(",")
+            if field
+        ]
+        if not fields:
+            raise ValidationError({"fields": "No fields given."})
+        selectable_fields = self._get_selectable_fields(index)
+        if fields == ["*"]:
+            # All fields, but only those that the index allows.
+            if selectable_fields is None:
+                return {}
+            fields = sorted(selectable_fields)
+
+        invalid = [
+            field
+            for field in fields
+            if selectable_fields is not None and field not in selectable_fields
+        ]
+        if invalid:
+            raise ValidationError({"fields": f"Invalid fields: {', '.join(invalid)}."})
+        for field in fields:
+            self._validate_field("fields", field, index, "retrievable")
+
+        return {"select": ",".join(fields)}
+
+    def _get_selectable_fields(self, index: SearchIndex) -> set[str] | None:
+        """Tell which fields can be selected: the allowlist of the index,
+        or else the retrievable fields of its schema (None when neither is known).
+        """
+        if index.selectable_fields is not None:
+            return index.selectable_fields
+        if index.schema is not None:
+            return index.schema.retrievable_fields()
+        return None
+
     def _extract_facets_and_filters(self, request_args: dict, index: SearchIndex) -> dict:
-        filter_list = []
-        facets = index.facets.copy()
+        params = request_args["params"]
+        filters = self._extract_filters(params, index)
+        facets = {
+            facet: f"{facet},count:{count},sort:value"
+            for facet, count in self._get_facet_counts(params, index).items()
+        }
+
+        # Facets of fields that are filtered on are not needed, unless all their values
+        # are requested with ?disjunctive_facets=true. Each of these facets is then counted
+        # by a separate query, which leaves out the filter on that field.
+        if params.get("disjunctive_facets", "").lower() in TRUE_VALUES:
+            facet_queries = [
+                {
+                    "top": 0,
+                    "filter": " and ".join(
+                        chain.from_iterable(
+                            expressions
+                            for field_name, expressions in filters.items()
+                            if field_name != facet
+                        )
+                    ),
+                    "facets": [facet_spec],
+                }
+                for facet, facet_spec in facets.items()
+                if facet in filters
+            ]
+            # Without filtered facets, the search itself returns all values.
+            if facet_queries:
+                request_args["facet_queries"] = facet_queries
+
+        return {
+            "facets": [facet_spec for facet, facet_spec in facets.items() if facet not in filters],
+            "filter": " and ".join(chain.from_iterable(filters.values())),
+        }
 
-        non_filter_params = ["sort", "page"]
+    def _get_facet_counts(self, params: QueryDict, index: SearchIndex) -> dict[str, int]:
+        """Determine which facets are requested, and the number of values for each facet.
 
-        for param in request_args["params"]:
-            if param in non_filter_params:
+        Facets are selected using ``?facets=name1,name2``, which can be empty to return
+        no facets at all. The number of values can be set for all facets with
+        ``?facet_count=...``, or per facet using ``?facets=name:count``.
+        """
+        facet_count = self._get_int_param(
+            params,
+            "facet_count",
+            default=index.facet_count,
+            min_value=1,
+            max_value=index.facet_count,
+        )
+        if "facets" not in params:
+            default_facets = index.facets if index.default_facets is None else index.default_facets
+            return dict.fromkeys(sorted(default_facets), facet_count)
+
+        facets = {}
+        for value in (value for raw in params.getlist("facets") for value in raw.split(",")):
+            if not value:
                 continue
 
-            value = request_args["params"][param]
-            if param in index.boolean_fields:
-                bool_value = value.lower() in ["true", "t", "on", "1"]
-                filter_list.append(f"{param} eq {'true' if bool_value else 'false'}")
+            facet, _, count = value.partition(":")
+            if facet not in index.facets:
+                raise ValidationError({"facets": f"Invalid facet: '{facet}'."})
+            self._validate_field("facets", facet, index, "facetable")
+            if not count:
+                facets[facet] = facet_count
+            elif count.isdigit() and 1 <= int(count) <= index.facet_count:
+                facets[facet] = int(count)
             else:
-                # Escape single quotes by doubling them for odata filters
-                filter_list.append(f"{param} eq '{value.replace("'", "''")}'")
-            if param in facets:
-                facets.remove(param)
+                raise ValidationError(
+                    {"facets": f"Facet count should be between 1 and {index.facet_count}."}
+                )
 
-        facet_list = [f"{facet},count:1400,sort:value" for facet in facets]
+        return facets
 
-        return {
-            "facets": facet_list,
-            "filter": " and ".join(filter_list),
-        }
+    def _extract_filters(self, params: QueryDict, index: SearchIndex) -> dict[str, list[str]]:
+        """Translate the query parameters into OData filter expressions, grouped by field.
+
+        Repeated parameters are combined into a single ``search.in()`` expression.
+        Values are not split on commas, as names of streets or persons can contain them.
+        Fields can be suffixed with ``__gte`` or ``__lte``
+        to filter on a range of numeric or date values.
+        """
+        filters = {}
+
+        for param in params:
+            if param in self.non_filter_params or param in self.geo_params:
+                continue
+
+            field_name, _, operator = param.partition("__")
+            self._validate_field(param, field_name, index, "filterable")
+            values = params.getlist(param)
+
+            if operator:
+                expression = self._get_range_filter(param, field_name, operator, values, index)
+            elif field_name in index.boolean_fields:
+                bool_value = values[-1].lower() in TRUE_VALUES
+                expression = f"{field_name} eq {'true' if bool_value else 'false'}"
+            elif len(values) > 1:
+                expression = self._get_multi_value_filter(param, field_name, values, index)
+            else:
+                value = self._format_value(param, field_name, values[0], index)
+                expression = f"{field_name} eq {value}"
+
+            filters.setdefault(field_name, []).append(expression)
+
+        filters.update(self._get_geo_filters(params, index))
+        return filters
+
+    def _get_geo_filters(self, params: QueryDict, index: SearchIndex) -> dict[str, list[str]]:
+        """Translate ``?bbox=...`` and ``?point=...&radius=...`` into spatial filters.
+
+        Coordinates are given in the GeoJSON order: longitude first, then latitude.
+        Without a geography field, the bounding box is applied to the numeric coordinate fields.
+        """
+        filters = {}
+        if bbox_value := params.get("bbox"):
+            bbox = BoundingBox.from_param("bbox", bbox_value)
+            if index.geo_field:
+                filters["bbox"] = [
+                    f"geo.intersects({index.geo_field}, geography'{bbox.to_wkt()}')"
+                ]
+            elif index.coordinate_fields:
+                lat_field, lon_field = index.coordinate_fields
+                filters["bbox"] = [
+                    f"{lat_field} ge {bbox.min_lat!r} and {lat_field} le {bbox.max_lat!r}",
+                    f"{lon_field} ge {bbox.min_lon!r} and {lon_field} le {bbox.max_lon!r}",
+                ]
+            else:
+                raise ValidationError({"bbox": "Geo filters are not supported for this dataset."})
+
+        if "point" in params or "radius" in params:
+            if not index.geo_field:
+                raise ValidationError(
+                    {"radius": "Radius filters are not supported for this dataset."}
+                )
+            lon, lat = parse_coordinates("point", params.get("point", ""), count=2)
+            try:
+                radius = float(params.get("radius", ""))
+            except ValueError:
+                radius = math.nan
+            if not (math.isfinite(radius) and radius > 0):
+                raise ValidationError({"radius": "A positive number of meters is required."})
+
+            # geo.distance() is given in kilometers.
+            point = f"geography'POINT({lon!r} {lat!r})'"
+            filters["radius"] = [f"geo.distance({index.geo_field}, {point}) le {radius / 1000!r}"]
+
+        return filters
+
+    def _validate_field(
+        self, param: str, field_name: str, index: SearchIndex, capability: str
+    ) -> None:
+        """Check whether the field can be used, before sending the query to Azure.
+
+        :param capability: The attribute of the field definition that should be enabled,
+            e.g. "filterable" or "sortable".
+        """
+        if not self.field_name_re.match(field_name):
+            raise ValidationError({param: f"Invalid field name: '{field_name}'."})
+
+        if index.schema is not None:
+            definition = index.schema.fields.get(field_name)
+            if definition is None:
+                raise ValidationError({param: f"Unknown field: '{field_name}'."})
+            if not getattr(definition, capability):
+                raise ValidationError({param: f"Field '{field_name}' is not {capability}."})
+
+    def _get_range_filter(
+        self, param: str, field_name: str, operator: str, values: list[str], index: SearchIndex
+    ) -> str:
+        if operator not in self.range_operators:
+            raise ValidationError({param: f"Unsupported filter operator '{operator}'."})
+        if field_name not in index.numeric_fields | index.date_fields:
+            raise ValidationError({param: "Range filters are only allowed on numeric or dates."})
+        if len(values) > 1:
+            raise ValidationError({param: "Range filters only accept a single value."})
+
+        value = self._format_value(param, field_name, values[0], index)
+        return f"{field_name} {self.range_operators[operator]} {value}"
+
+    def _get_multi_value_filter(
+        self, param: str, field_name: str, values: list[str], index: SearchIndex
+    ) -> str:
+        if field_name in index.numeric_fields | index.date_fields:
+            # search.in() only works for string fields
+            clauses = [
+                f"{field_name} eq {self._format_value(param, field_name, value, index)}"
+                for value in values
+            ]
+            return f"({' or '.join(clauses)})"
+
+        # The search.in() function is evaluated much faster than a chain of 'or' clauses.
+        # As the values are separated by a pipe, that character can't be part of the value.
+        if any("|" in value for value in values):
+            raise ValidationError({param: "Values may not contain the '|' character."})
+        return f"search.in({field_name}, {self._quote('|'.join(values))}, '|')"
+
+    def _format_value(self, param: str, field_name: str, value: str, index: SearchIndex) -> str:
+        """Format a value as OData literal, validating it for typed fields."""
+        if field_name in index.numeric_fields:
+            try:
+                number = float(value)
+            except ValueError:
+                number = None
+            if number is None or not math.isfinite(number):
+                raise ValidationError({param: f"Invalid number: '{value}'."})
+            return str(int(number)) if number.is_integer() else repr(number)
+        elif field_name in index.date_fields:
+            date_value = parse_datetime(value) or self._parse_date(value)
+            if date_value is None:
+                raise ValidationError({param: f"Invalid date: '{value}'."})
+            if is_naive(date_value):
+                date_value = date_value.replace(tzinfo=get_current_timezone())
+            return date_value.isoformat()
+        else:
+            return self._quote(value)
+
+    def _parse_date(self, value: str) -> datetime | None:
+        try:
+            date_value = parse_date(value)
+        except ValueError:
+            return None
+        return datetime.combine(date_value, time.min) if date_value else None
+
+    def _quote(self, value: str) -> str:
+        # Escape single quotes by doubling them for odata filters
+        return f"'{value.replace("'", "''")}'"
 
     def _get_headers(self) -> dict:
         # Get a token from the managed identity to use in the request
@@ -299,6 +1017,28 @@ class AzureSearchServiceClient(BaseClient):
 
 
 class DSOExportClient(BaseClient):
+    capture_plain_params = {"export", "export_format", "fields"}
+
+    def get_offload_headers(self, request: Request, index: SearchIndex, location: str) -> dict:
+        """Build the headers that let the front server perform the export request.
+
+        The front server (e.g. nginx) handles the ``X-Accel-Redirect`` by proxying
+        the internal location to the DSO API, passing the ``X-Export-Authorization``
+        as authorization header. This way the Python worker doesn't have to relay
+        the whole export.
+
+        As that header contains the user's token, these headers are only meant for the
+        front server, and should never be part of a response that reaches the client.
+        """
+        request_args = self.get_request_args(request, index, stream=True)
+
+        headers = {
+            "X-Accel-Redirect": f"{location}{index.api_path}?{request_args['params'].urlencode()}",
+            "X-Accel-Buffering": "no",
+        }
+        if authorization := request_args["headers"].get("Authorization"):
+            headers["X-Export-Authorization"] = authorization
+        return headers
 
     def _call(self, request_args: dict, index: SearchIndex) -> requests.Response:
         endpoint_url = f"{self.base_url}/v1/{index.api_path}"
@@ -314,7 +1054,14 @@ class DSOExportClient(BaseClient):
         params = request_args["params"].copy()
 
         params.pop("export", None)
+        # Other formats are converted from the CSV stream by the proxy.
+        params.pop("export_format", None)
         params["_format"] = "csv"
+        if "fields" in params:
+            # Only export the selected columns, which is smaller and faster.
+            fields = self._get_export_fields(params.pop("fields"), index)
+            if fields:
+                params["_fields"] = ",".join(fields)
 
         request_args["params"] = params
 
@@ -324,3 +1071,72 @@ class DSOExportClient(BaseClient):
         }
 
         return request_args
+
+    def _get_export_fields(self, values: list[str], index: SearchIndex) -> list[str]:
+        """Translate the ``?fields=...`` parameter into the columns to export.
+
+        With ``fields=*``, this gives no columns, so all allowed columns are exported.
+        """
+        fields = [field for raw in values for field in raw.split(",") if field]
+        if not fields:
+            raise ValidationError({"fields": "No fields given."})
+        if fields == ["*"]:
+            return []
+
+        invalid = [
+            field
+            for field in fields
+            if index.export_fields is not None and field not in index.export_fields
+        ]
+        if invalid:
+            raise ValidationError({"fields": f"Invalid fields: {', '.join(invalid)}."})
+        return fields
+
+    def _restrict_request_args(
+        self, request: Request, request_args: dict, index: SearchIndex
+    ) -> dict:
+        """Limit the export to the allowed columns, and leave out the columns
+        that need a scope the user doesn't have.
+        """
+        user_scopes = set(request.get_token_scopes)
+        denied = set().union(
+            *(
+                fields
+                for scope, fields in index.export_scope_fields.items()
+                if scope not in user_scopes
+            )
+        )
+
+        params = request_args["params"]
+        if "_fields" in params:
+            if denied_fields := [f for f in params["_fields"].split(",") if f in denied]:
+                raise PermissionDenied(
+                    f"Required scopes not given for fields: {', '.join(denied_fields)}."
+                )
+        elif index.export_fields is not None:
+            # Without selected columns, the DSO API would export all columns of the dataset.
+            params = params.copy()
+            params["_fields"] = ",".join(f for f in index.export_fields if f not in denied)
+            request_args["params"] = params
+        elif denied:
+            raise PermissionDenied("Required scopes not given for all fields, select the fields.")
+        return request_args
+
+
+@cache
+def get_search_client() -> AzureSearchServiceClient:
+    """Provide the search client that is shared within this process.
+    This allows reusing the pooled connections and the credential between requests.
+    """
+    return AzureSearchServiceClient(base_url=settings.AZURE_SEARCH_BASE_URL)
+
+
+@cache
+def get_export_client() -> DSOExportClient:
+    """Provide the export client that is shared within this process."""
+    return DSOExportClient(base_url=settings.DSO_API_BASE_URL)
+
+
+# Connections can't be shared with the parent process.
+os.register_at_fork(after_in_child=get_search_client.cache_clear)
+os.register_at_fork(after_in_child=get_export_client.cache_clear)
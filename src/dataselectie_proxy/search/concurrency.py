@@ -0,0 +1,23 @@
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_concurrently(func: Callable[[T], R], items: Iterable[T], max_workers: int) -> list[R]:
+    """Run the function for each item in a bounded thread pool, returning results in order.
+
+    A pool is created per call, so nested calls can't deadlock on a shared pool.
+    Exceptions are raised when collecting the results, so the function
+    should handle the errors that need to be reported per item.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(items)), thread_name_prefix="dataselectie-search"
+    ) as executor:
+        return list(executor.map(func, items))
@@ -0,0 +1,205 @@
+import codecs
+import csv
+import importlib
+import io
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from itertools import batched
+
+import orjson
+from django.conf import settings
+from django.http import QueryDict
+from rest_framework.exceptions import ValidationError
+
+from dataselectie_proxy.search.clients import TRUE_VALUES
+from dataselectie_proxy.search.indexes import SearchIndex
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    name: str
+    content_type: str
+    extension: str
+    # The optional package that is needed to write this format.
+    requires: str | None = None
+
+
+EXPORT_FORMATS = {
+    export_format.name: export_format
+    for export_format in (
+        ExportFormat("csv", "text/csv", "csv"),
+        ExportFormat("ndjson", "application/x-ndjson", "ndjson"),
+        ExportFormat("parquet", "application/vnd.apache.parquet", "parquet", "pyarrow"),
+        ExportFormat("arrow", "application/vnd.apache.arrow.stream", "arrows", "pyarrow"),
+    )
+}
+
+
+def get_export_format(params: QueryDict) -> ExportFormat:
+    """Tell which format is requested with ``?export_format=...``."""
+    name = params.get("export_format", "csv").lower()
+    try:
+        export_format = EXPORT_FORMATS[name]
+    except KeyError:
+        raise ValidationError(
+            {"export_format": f"Should be one of: {', '.join(EXPORT_FORMATS)}."}
+        ) from None
+
+    if export_format.requires:
+        try:
+            importlib.import_module(export_format.requires)
+        except ImportError:
+            raise ValidationError(
+                {"export_format": f"The {name} format is not available."}
+            ) from None
+    return export_format
+
+
+def iter_csv_rows(chunks: Iterable[bytes]) -> Iterator[list[str]]:
+    """Parse the CSV rows while the chunks are received."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+
+    def _lines():
+        pending = ""
+        for chunk in chunks:
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            # The line endings are kept, so values with newlines are parsed correctly.
+            for line in lines:
+                yield line + "\n"
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
+
+    return csv.reader(_lines())
+
+
+class ExportConverter:
+    """Convert the CSV export of the DSO API into another format, while it's streamed.
+
+    The rows are converted in batches of ``EXPORT_BATCH_ROWS``, which become the record
+    batches of Arrow, or the row groups of Parquet. Only a single batch is kept in memory.
+    Numeric and boolean fields of the index are typed, other fields are kept as text.
+    """
+
+    def __init__(self, export_format: ExportFormat, index: SearchIndex):
+        self.export_format = export_format
+        self.index = index
+
+    def convert(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        if self.export_format.name == "csv":
+            yield from chunks
+            return
+
+        rows = iter_csv_rows(chunks)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        kinds = [self.get_kind(name) for name in header]
+        converters = [self.get_converter(kind) for kind in kinds]
+        batches = (
+            [self._convert_row(converters, row) for row in batch]
+            for batch in batched(rows, settings.EXPORT_BATCH_ROWS)
+        )
+
+        if self.export_format.name == "ndjson":
+            for batch in batches:
+                yield b"".join(
+                    orjson.dumps(dict(zip(header, row)), option=orjson.OPT_APPEND_NEWLINE)
+                    for row in batch
+                )
+        else:
+            yield from self._write_arrow(header, kinds, batches)
+
+    def _convert_row(self, converters: list[Callable], row: list[str]) -> list:
+        # Missing values at the end of a row are empty, like in a spreadsheet.
+        row = row[: len(converters)] + [""] * (len(converters) - len(row))
+        return [
+            convert(value) if value != "" else None
+            for convert, value in zip(converters, row, strict=True)
+        ]
+
+    def get_kind(self, name: str) -> str:
+        if name in self.index.boolean_fields:
+            return "boolean"
+        elif name in self.index.numeric_fields:
+            return "number"
+        return "text"
+
+    def get_converter(self, kind: str) -> Callable[[str], object]:
+        if kind == "boolean":
+            return lambda value: value.lower() in TRUE_VALUES
+        elif kind == "number":
+            return _to_number
+        return str
+
+    def _write_arrow(
+        self, header: list[str], kinds: list[str], batches: Iterable[list[list]]
+    ) -> Iterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"boolean": pa.bool_(), "number": pa.float64()}
+        schema = pa.schema(
+            [(name, types.get(kind, pa.string())) for name, kind in zip(header, kinds)]
+        )
+
+        sink = _ChunkSink()
+        if self.export_format.name == "parquet":
+            writer = pq.ParquetWriter(sink, schema)
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+
+        with writer:
+            for batch in batches:
+                columns = zip(*batch, strict=True)
+                writer.write_batch(
+                    pa.record_batch(
+                        [
+                            pa.array(column, type=field.type)
+                            for column, field in zip(columns, schema)
+                        ],
+                        schema=schema,
+                    )
+                )
+                yield sink.drain()
+        # The Parquet footer is written when the writer is closed.
+        yield sink.drain()
+
+
+def _to_number(value: str) -> int | float | None:
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class _ChunkSink(io.RawIOBase):
+    """A file for the Arrow writers, that hands out what has been written so far."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
@@ -0,0 +1,90 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from dataselectie_proxy.search.freshness import index_freshness
+from dataselectie_proxy.search.indexes import SearchIndex
+
+
+@dataclass
+class FacetValues:
+    """The values of a facet, sorted case-insensitive to find them by prefix."""
+
+    keys: list[str]
+    values: list
+    counts: list[int]
+    # Whether Azure returned all values, or only the most frequent ones.
+    complete: bool
+
+    @classmethod
+    def from_azure(cls, entries: list[dict], max_count: int) -> "FacetValues":
+        """Parse the facet entries, as returned in the ``@search.facets`` of Azure."""
+        entries = sorted(
+            (str(entry["value"]).lower(), entry["value"], entry["count"]) for entry in entries
+        )
+        return cls(
+            keys=[key for key, _, _ in entries],
+            values=[value for _, value, _ in entries],
+            counts=[count for _, _, count in entries],
+            complete=len(entries) < max_count,
+        )
+
+    def match(self, prefix: str, limit: int) -> list[dict]:
+        """Give the most frequent values that start with the prefix."""
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(prefix):
+            end += 1
+
+        top = heapq.nsmallest(
+            limit, range(start, end), key=lambda i: (-self.counts[i], self.keys[i])
+        )
+        return [{"value": self.values[i], "count": self.counts[i]} for i in top]
+
+
+class FacetValueStore:
+    """Keep the values of all facets in memory, so they can be completed without querying Azure.
+
+    The values are refreshed every ``FACET_VALUES_REFRESH`` seconds,
+    or directly when a new load of the index is detected.
+    """
+
+    def __init__(self):
+        self._entries: dict[tuple[str, str], tuple[str, float, FacetValues]] = {}
+        # Each facet is loaded under its own lock, so a slow load doesn't block the other facets.
+        self._locks: dict[tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, index: SearchIndex, facet: str, load: Callable[[], FacetValues]) -> FacetValues:
+        key = (index.index_name, facet)
+        generation = index_freshness.get_generation(index)
+        entry = self._entries.get(key)
+        if not self._is_current(entry, generation):
+            with self._get_lock(key):
+                # Another thread may have loaded the values while waiting for the lock.
+                entry = self._entries.get(key)
+                if not self._is_current(entry, generation):
+                    expires = time.monotonic() + settings.FACET_VALUES_REFRESH
+                    entry = (generation, expires, load())
+                    self._entries[key] = entry
+
+        return entry[2]
+
+    def _get_lock(self, key: tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _is_current(self, entry: tuple | None, generation: str) -> bool:
+        return entry is not None and entry[0] == generation and entry[1] > time.monotonic()
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+facet_values = FacetValueStore()
@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from rest_framework.exceptions import APIException
+
+from dataselectie_proxy.search.indexes import INDEX_MAPPING, SearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+class IndexFreshnessTracker:
+    """Track when an Azure index has been reloaded.
+
+    The indexes are rebuilt in batches, which changes their statistics.
+    A background thread polls those statistics, and derives a "generation" marker from them.
+    This marker is part of all cache keys and ETags, so cached data can be kept for a long time,
+    but is invalidated as soon as a new load of the index is detected.
+
+    The generation is derived from the statistics only, so all workers and pods
+    agree on the same generation without having to coordinate.
+    """
+
+    def __init__(self):
+        self._generations: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def get_generation(self, index: SearchIndex) -> str:
+        """Tell the current generation of the index, an empty string when it's not known yet."""
+        self._ensure_started()
+        return self._generations.get(index.index_name, "")
+
+    def refresh(self, indexes: list[SearchIndex] | None = None) -> None:
+        """Poll the statistics of all indexes, to update their generation."""
+        from dataselectie_proxy.search.clients import get_search_client
+
+        client = get_search_client()
+        for index in indexes or INDEX_MAPPING.values():
+            try:
+                statistics = client.get_index_statistics(index)
+            except (APIException, requests.RequestException) as e:
+                # Keep the last known generation, so caches remain valid.
+                logger.warning("Unable to retrieve statistics of %s: %s", index.index_name, e)
+                continue
+
+            generation = self._get_generation(statistics)
+            previous = self._generations.get(index.index_name)
+            if previous != generation:
+                self._generations[index.index_name] = generation
+                if previous is not None:
+                    logger.info(
+                        "Index %s has been reloaded, generation %s -> %s",
+                        index.index_name,
+                        previous,
+                        generation,
+                    )
+
+    def _get_generation(self, statistics: dict) -> str:
+        marker = f"{statistics.get('documentCount')}:{statistics.get('storageSize')}"
+        return hashlib.sha256(marker.encode()).hexdigest()[:12]
+
+    def _ensure_started(self) -> None:
+        """Start the polling thread, also in forked worker processes."""
+        if not settings.INDEX_FRESHNESS_INTERVAL or (
+            self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+        ):
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="index-freshness", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                # Never let the polling thread die.
+                logger.exception("Unable to refresh the index freshness")
+
+            time.sleep(settings.INDEX_FRESHNESS_INTERVAL)
+
+
+index_freshness = IndexFreshnessTracker()
@@ -0,0 +1,93 @@
+import math
+from dataclasses import dataclass
+
+from rest_framework.exceptions import ValidationError
+
+# Size of a map tile in pixels, used to translate the zoom level into degrees.
+TILE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class BoundingBox:
+    """A WGS84 bounding box, given in the GeoJSON order of longitude and latitude."""
+
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+
+    @classmethod
+    def from_param(cls, param: str, value: str) -> "BoundingBox":
+        """Parse ``?bbox=min_lon,min_lat,max_lon,max_lat``."""
+        min_lon, min_lat, max_lon, max_lat = parse_coordinates(param, value, count=4)
+        if min_lon >= max_lon or min_lat >= max_lat:
+            raise ValidationError({param: "The minimum should be lower than the maximum."})
+        return cls(min_lon, min_lat, max_lon, max_lat)
+
+    def to_wkt(self) -> str:
+        """Give the polygon for geo.intersects(), its points are in counterclockwise order."""
+        points = [
+            (self.min_lon, self.min_lat),
+            (self.max_lon, self.min_lat),
+            (self.max_lon, self.max_lat),
+            (self.min_lon, self.max_lat),
+            (self.min_lon, self.min_lat),
+        ]
+        return f"POLYGON(({', '.join(f'{lon!r} {lat!r}' for lon, lat in points)}))"
+
+
+def parse_coordinates(param: str, value: str, count: int) -> list[float]:
+    """Parse a comma separated list of longitude and latitude pairs."""
+    try:
+        numbers = [float(part) for part in value.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count or not all(math.isfinite(number) for number in numbers):
+        raise ValidationError({param: f"Expected {count} comma separated numbers."})
+
+    if any(abs(lon) > 180 for lon in numbers[0::2]) or any(abs(lat) > 90 for lat in numbers[1::2]):
+        raise ValidationError({param: "Coordinates should be given as longitude,latitude."})
+    return numbers
+
+
+@dataclass(frozen=True)
+class Grid:
+    """The cells that are used to cluster the results of a map viewport.
+
+    The cells are aligned to multiples of the cell size, so panning the map
+    gives the same cells (and the same cache keys) for the overlapping part.
+    """
+
+    lon_start: float
+    lat_start: float
+    lon_step: float
+    lat_step: float
+    columns: int
+    rows: int
+
+    @classmethod
+    def for_viewport(cls, bbox: BoundingBox, zoom: int, cell_pixels: int) -> "Grid":
+        lon_step = cell_pixels * 360 / (TILE_SIZE * 2**zoom)
+        # Cells are square on the map. The latitude is rounded, so the cell size doesn't
+        # change while panning; within a degree the difference is not visible.
+        lat_step = lon_step * math.cos(math.radians(round((bbox.min_lat + bbox.max_lat) / 2)))
+
+        lon_start = math.floor(bbox.min_lon / lon_step) * lon_step
+        lat_start = math.floor(bbox.min_lat / lat_step) * lat_step
+        return cls(
+            lon_start=lon_start,
+            lat_start=lat_start,
+            lon_step=lon_step,
+            lat_step=lat_step,
+            columns=math.ceil((bbox.max_lon - lon_start) / lon_step),
+            rows=math.ceil((bbox.max_lat - lat_start) / lat_step),
+        )
+
+    def lon_edges(self) -> list[float]:
+        return [round(self.lon_start + i * self.lon_step, 7) for i in range(self.columns + 1)]
+
+    def lat_edges(self) -> list[float]:
+        return [round(self.lat_start + i * self.lat_step, 7) for i in range(self.rows + 1)]
+
+    def column_of(self, lon: float) -> int:
+        return round((lon - self.lon_start) / self.lon_step)
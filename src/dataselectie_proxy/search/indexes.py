@@ -1,4 +1,10 @@
+from __future__ import annotations
+
 from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from dataselectie_proxy.search.schemas import IndexSchema
 
 
 @dataclass
@@ -7,7 +13,42 @@ class SearchIndex:
     api_path: str
     facets: set[str]
     boolean_fields: set[str] | None = field(default_factory=set)
+    numeric_fields: set[str] = field(default_factory=set)
+    date_fields: set[str] = field(default_factory=set)
     needed_scopes: set = field(default_factory=set)
+    # Who may cache the search responses (e.g. browsers and CDN's)
+    cache_control: str = "private, no-store"
+    # Facets that are returned when ?facets=... is not given, None returns all facets.
+    default_facets: set[str] | None = None
+    # Number of values per facet, can be lowered with ?facet_count=... or ?facets=name:count
+    facet_count: int = 1400
+    # Number of results per page, can be changed within the bounds with ?page_size=...
+    page_size: int = 100
+    min_page_size: int = 1
+    max_page_size: int = 1000
+    # Fields that can be requested with ?fields=..., None allows the retrievable fields
+    # of the schema (or any field when the schema isn't loaded).
+    selectable_fields: set[str] | None = None
+    # Fields that are returned when ?fields=... is not given, None returns all fields.
+    default_fields: list[str] | None = None
+    # Columns that can be exported with ?export=true&fields=..., None allows any column.
+    export_fields: list[str] | None = None
+    # Columns that are only exported for users with the scope, e.g. {"BRK/RSN": {"naam"}}.
+    # Others get the remaining export_fields when no ?fields=... is given.
+    export_scope_fields: dict[str, set[str]] = field(default_factory=dict)
+    # Edm.GeographyPoint field for the ?bbox=... and ?radius=... filters, found in the schema.
+    geo_field: str | None = None
+    # Numeric latitude and longitude fields, used for ?bbox=... and clustering.
+    coordinate_fields: tuple[str, str] | None = None
+    # Public data needs no scope, and can be served from a local copy (see LOCAL_SEARCH_INDEXES).
+    public: bool = False
+    # Fields without personal data, of which the values are kept in the traffic capture.
+    # The values of all other fields are hashed.
+    capture_plain_fields: set[str] = field(default_factory=set)
+    # Searches that take longer (in seconds) are logged as slow query.
+    slow_query_threshold: float = 1.0
+    # The field definitions of the Azure index, attached when the schemas are loaded.
+    schema: IndexSchema | None = field(default=None, repr=False)
 
 
 INDEX_MAPPING = {
@@ -23,6 +64,64 @@ INDEX_MAPPING = {
             "openbareruimteNaam",
             "postcode",
         },
+        # The streets and postcodes have thousands of values, these are only given on request.
+        default_facets={
+            "woonplaatsNaam",
+            "gebiedenStadsdeelNaam",
+            "gebiedenGgwgebiedNaam",
+            "gebiedenWijkNaam",
+            "gebiedenBuurtNaam",
+        },
+        cache_control="public, max-age=300",
+        numeric_fields={
+            "huisnummer",
+            "latitude",
+            "longitude",
+        },
+        selectable_fields={
+            "identificatie",
+            "openbareruimteNaam",
+            "huisnummer",
+            "huisnummerStr",
+            "huisletter",
+            "huisnummertoevoeging",
+            "postcode",
+            "woonplaatsNaam",
+            "gebiedenStadsdeelNaam",
+            "gebiedenGgwgebiedNaam",
+            "gebiedenWijkNaam",
+            "gebiedenBuurtNaam",
+            "latitude",
+            "longitude",
+        },
+        public=True,
+        coordinate_fields=("latitude", "longitude"),
+        capture_plain_fields={"huisnummer"},
+        export_fields=[
+            "identificatie",
+            "openbareruimteNaam",
+            "huisnummer",
+            "huisletter",
+            "huisnummertoevoeging",
+            "postcode",
+            "woonplaatsNaam",
+            "gebiedenStadsdeelNaam",
+            "gebiedenGgwgebiedNaam",
+            "gebiedenWijkNaam",
+            "gebiedenBuurtNaam",
+            "latitude",
+            "longitude",
+        ],
+        default_fields=[
+            "identificatie",
+            "openbareruimteNaam",
+            "huisnummer",
+            "huisletter",
+            "huisnummertoevoeging",
+            "postcode",
+            "woonplaatsNaam",
+            "gebiedenStadsdeelNaam",
+        ],
     ),
     "brk": SearchIndex(
         index_name="benkagg-brkbasisdataselectie",
@@ -42,7 +141,9 @@ INDEX_MAPPING = {
             "pandeigenaar",
             "appartementseigenaar",
         },
+        max_page_size=500,
         needed_scopes={"BRK/RSN"},
+        capture_plain_fields={"grondeigenaar", "pandeigenaar", "appartementseigenaar"},
     ),
     "hr": SearchIndex(
         index_name="benkagg-handelsregisterkvk",
@@ -57,6 +158,16 @@ INDEX_MAPPING = {
             "gebiedenWijkNaam",
             "gemeente",
         },
+        # The streets and postcodes have thousands of values, these are only given on request.
+        default_facets={
+            "bijzondereRechtstoestandPersoon",
+            "gebiedenBuurtNaam",
+            "gebiedenGgwgebiedNaam",
+            "gebiedenStadsdeelNaam",
+            "gebiedenWijkNaam",
+            "gemeente",
+        },
+        max_page_size=500,
         needed_scopes={"FP/MDW"},
     ),
 }
@@ -0,0 +1,384 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+import orjson
+import requests
+from django.conf import settings
+
+from dataselectie_proxy.search.indexes import INDEX_MAPPING, SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# The search arguments the local index understands, others are only handled by Azure.
+SUPPORTED_ARGS = {"count", "facets", "filter", "orderby", "search", "select", "skip", "top"}
+
+# The comparison operators of OData, translated to SQL.
+# Like in Azure, 'ne' also matches the documents without a value.
+OPERATORS = {"eq": "=", "ne": "IS NOT", "gt": ">", "ge": ">=", "lt": "<", "le": "<="}
+
+TOKEN_RE = re.compile(
+    r"\s*(?:(?P<string>'(?:[^']|'')*')|(?P<punct>[(),])"
+    r"|(?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w:-]))|(?P<word>[A-Za-z_][\w.]*))"
+)
+
+
+class UnsupportedQuery(Exception):
+    """The query can't be answered by the local index, so it's sent to Azure."""
+
+
+def get_local_index_path(index: SearchIndex) -> Path:
+    return Path(settings.LOCAL_SEARCH_DIR) / f"{index.index_name}.sqlite3"
+
+
+class FilterTranslator:
+    """Translate the subset of OData that the search client generates into SQL.
+
+    This supports comparisons, ``search.in()`` and combining those with and/or/not.
+    Anything else (e.g. geo functions or date values) raises :class:`UnsupportedQuery`.
+    """
+
+    def __init__(self, columns: dict[str, str]):
+        self.columns = columns
+
+    def translate(self, expression: str) -> tuple[str, list]:
+        """Give the SQL expression, and its parameters."""
+        self._tokens = self._tokenize(expression)
+        self._position = 0
+        self._params = []
+        sql = self._parse_or()
+        if self._position != len(self._tokens):
+            raise UnsupportedQuery(f"Unexpected {self._peek()[1]!r} in filter")
+        return sql, self._params
+
+    def _tokenize(self, expression: str) -> list[tuple[str, str]]:
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = TOKEN_RE.match(expression, position)
+            if match is None or match.end() == position:
+                raise UnsupportedQuery(f"Unable to parse filter at {expression[position:]!r}")
+            tokens.append((match.lastgroup, match[match.lastgroup]))
+            position = match.end()
+        return tokens
+
+    def _peek(self) -> tuple[str, str]:
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return ("end", "")
+
+    def _next(self, value: str | None = None) -> tuple[str, str]:
+        token = self._peek()
+        if token[0] == "end" or (value is not None and token[1] != value):
+            raise UnsupportedQuery(f"Expected {value or 'a value'} in filter")
+        self._position += 1
+        return token
+
+    def _parse_or(self) -> str:
+        clauses = [self._parse_and()]
+        while self._peek() == ("word", "or"):
+            self._next()
+            clauses.append(self._parse_and())
+        return clauses[0] if len(clauses) == 1 else f"({' OR '.join(clauses)})"
+
+    def _parse_and(self) -> str:
+        clauses = [self._parse_unary()]
+        while self._peek() == ("word", "and"):
+            self._next()
+            clauses.append(self._parse_unary())
+        return clauses[0] if len(clauses) == 1 else f"({' AND '.join(clauses)})"
+
+    def _parse_unary(self) -> str:
+        if self._peek() == ("word", "not"):
+            self._next()
+            return f"NOT {self._parse_unary()}"
+        if self._peek() == ("punct", "("):
+            self._next()
+            sql = self._parse_or()
+            self._next(")")
+            return f"({sql})"
+
+        kind, word = self._next()
+        if kind != "word":
+            raise UnsupportedQuery(f"Unexpected {word!r} in filter")
+        if word == "search.in":
+            return self._parse_search_in()
+
+        column = self._column(word)
+        _, operator = self._next()
+        if operator not in OPERATORS:
+            raise UnsupportedQuery(f"Unsupported operator {operator!r}")
+        value = self._parse_literal(column)
+        if value is None:
+            return f"{column} {'IS' if operator == 'eq' else 'IS NOT'} NULL"
+        self._params.append(value)
+        return f"{column} {OPERATORS[operator]} ?"
+
+    def _parse_search_in(self) -> str:
+        self._next("(")
+        column = self._column(self._next()[1])
+        self._next(",")
+        values = self._parse_string()
+        delimiters = " ,"
+        if self._peek() == ("punct", ","):
+            self._next()
+            delimiters = self._parse_string()
+        self._next(")")
+
+        items = [item for item in re.split(f"[{re.escape(delimiters)}]", values) if item]
+        if not items:
+            return "0"
+        self._params.extend(items)
+        return f"{column} IN ({','.join('?' * len(items))})"
+
+    def _parse_literal(self, column: str) -> str | int | float | None:
+        kind, value = self._next()
+        if kind == "string":
+            return value[1:-1].replace("''", "'")
+        if kind == "number":
+            return float(value) if any(c in value for c in ".eE") else int(value)
+        if value in ("true", "false"):
+            return int(value == "true")
+        if value == "null":
+            return None
+        raise UnsupportedQuery(f"Unsupported value {value!r} for {column}")
+
+    def _parse_string(self) -> str:
+        kind, value = self._next()
+        if kind != "string":
+            raise UnsupportedQuery("Expected a string in filter")
+        return value[1:-1].replace("''", "'")
+
+    def _column(self, name: str) -> str:
+        kind = self.columns.get(name)
+        if kind is None or kind == "date":
+            # Dates would need to be compared as timestamps, leave those to Azure.
+            raise UnsupportedQuery(f"Field {name!r} is not available locally")
+        return f'"{name}"'
+
+
+class LocalIndex:
+    """A read-only connection to the local copy of an index.
+
+    Each thread has its own connection. When the file is replaced by a new build,
+    the connection is reopened, so the swap doesn't need a restart.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+
+    def search(self, search_args: dict) -> dict:
+        """Answer the search arguments like Azure would, or raise :class:`UnsupportedQuery`."""
+        if unsupported := set(search_args) - SUPPORTED_ARGS:
+            raise UnsupportedQuery(f"Unsupported arguments: {', '.join(sorted(unsupported))}")
+        if search_args.get("search", "*") not in ("", "*"):
+            raise UnsupportedQuery("Full text search is not supported")
+
+        connection, columns = self._connect()
+        where, params = "1", []
+        if search_args.get("filter"):
+            where, params = FilterTranslator(columns).translate(search_args["filter"])
+        result = {"@odata.context": ""}
+
+        if search_args.get("count"):
+            count_sql = f"SELECT COUNT(*) FROM docs WHERE {where}"  # noqa: S608
+            result["@odata.count"] = connection.execute(count_sql, params).fetchone()[0]
+
+        if facets := search_args.get("facets"):
+            result["@search.facets"] = dict(
+                self._get_facet(connection, columns, spec, where, params) for spec in facets
+            )
+
+        result["value"] = self._get_documents(connection, columns, search_args, where, params)
+        return result
+
+    def _get_documents(
+        self, connection: sqlite3.Connection, columns: dict, search_args: dict, where, params
+    ) -> list[dict]:
+        top = search_args.get("top", 50)
+        if top == 0:
+            return []
+
+        # Without a selection, Azure returns the fields of its own index.
+        select = [name for name in search_args.get("select", "").split(",") if name]
+        if not select:
+            raise UnsupportedQuery("All fields are only available in Azure")
+        for name in select:
+            if name not in columns:
+                raise UnsupportedQuery(f"Field {name!r} is not available locally")
+
+        order_by = []
+        for clause in filter(None, search_args.get("orderby", "").split(",")):
+            name, _, direction = clause.strip().partition(" ")
+            if name not in columns or direction not in ("", "asc", "desc"):
+                raise UnsupportedQuery(f"Unsupported sorting {clause!r}")
+            order_by.append(f'"{name}" {direction.upper() or "ASC"}')
+        # A stable order for paging.
+        order_by.append("rowid")
+
+        select_sql = ",".join(f'"{name}"' for name in select)
+        sql = (
+            f"SELECT {select_sql} FROM docs"  # noqa: S608
+            f" WHERE {where} ORDER BY {','.join(order_by)} LIMIT ? OFFSET ?"
+        )
+        rows = connection.execute(sql, [*params, top, search_args.get("skip", 0)])
+        booleans = {name for name in select if columns[name] == "boolean"}
+        return [
+            {
+                "@search.score": 1.0,
+                **{
+                    name: bool(value) if name in booleans and value is not None else value
+                    for name, value in zip(select, row, strict=True)
+                },
+            }
+            for row in rows
+        ]
+
+    def _get_facet(
+        self, connection: sqlite3.Connection, columns: dict, spec: str, where, params
+    ) -> tuple[str, list[dict]]:
+        name, *options = spec.split(",")
+        options = dict(option.partition(":")[::2] for option in options)
+        if name not in columns or set(options) - {"count", "sort", "values"}:
+            raise UnsupportedQuery(f"Unsupported facet {spec!r}")
+        column = f'"{name}"'
+
+        if "values" in options:
+            return name, self._get_range_facet(
+                connection, column, options["values"], where, params
+            )
+
+        order = {
+            "count": "COUNT(*) DESC, value",
+            "-count": "COUNT(*), value",
+            "value": "value",
+            "-value": "value DESC",
+        }.get(options.get("sort", "count"))
+        if order is None:
+            raise UnsupportedQuery(f"Unsupported facet sorting {spec!r}")
+
+        sql = (
+            f"SELECT {column} AS value, COUNT(*) FROM docs"  # noqa: S608
+            f" WHERE {where} AND {column} IS NOT NULL GROUP BY value ORDER BY {order} LIMIT ?"
+        )
+        rows = connection.execute(sql, [*params, int(options.get("count", 10))])
+        is_boolean = columns[name] == "boolean"
+        return name, [
+            {"value": bool(value) if is_boolean else value, "count": count}
+            for value, count in rows
+        ]
+
+    def _get_range_facet(
+        self, connection: sqlite3.Connection, column: str, values: str, where, params
+    ) -> list[dict]:
+        try:
+            edges = [float(value) for value in values.split("|")]
+        except ValueError:
+            raise UnsupportedQuery(f"Unsupported facet values {values!r}") from None
+
+        # Azure gives the buckets (-inf, e1), [e1, e2), ..., [en, inf).
+        buckets = [(None, edges[0])] + list(zip(edges, edges[1:])) + [(edges[-1], None)]
+        sums, bucket_params = [], []
+        for lower, upper in buckets:
+            conditions = []
+            if lower is not None:
+                conditions.append(f"{column} >= ?")
+                bucket_params.append(lower)
+            if upper is not None:
+                conditions.append(f"{column} < ?")
+                bucket_params.append(upper)
+            sums.append(f"COALESCE(SUM({' AND '.join(conditions)}), 0)")
+
+        sql = f"SELECT {','.join(sums)} FROM docs WHERE {where}"  # noqa: S608
+        counts = connection.execute(sql, [*bucket_params, *params]).fetchone()
+
+        entries = []
+        for (lower, upper), count in zip(buckets, counts, strict=True):
+            entry = {"count": count}
+            if lower is not None:
+                entry["from"] = lower
+            if upper is not None:
+                entry["to"] = upper
+            entries.append(entry)
+        return entries
+
+    def _connect(self) -> tuple[sqlite3.Connection, dict[str, str]]:
+        """Give the connection of this thread, reopening it when the file was replaced."""
+        stat = os.stat(self.path)
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if getattr(self._local, "version", None) != version:
+            if connection := getattr(self._local, "connection", None):
+                connection.close()
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            connection.execute(f"PRAGMA mmap_size={settings.LOCAL_SEARCH_MMAP_SIZE}")
+            self._local.connection = connection
+            self._local.columns = dict(connection.execute("SELECT name, kind FROM columns"))
+            self._local.version = version
+        return self._local.connection, self._local.columns
+
+    def reset(self) -> None:
+        # Connections can't be shared with the parent process.
+        self._local = threading.local()
+
+
+class LocalSearch:
+    """Answer searches on public datasets from a local copy, instead of Azure.
+
+    The copy is an SQLite database that is built from the DSO export,
+    with ``./manage.py build_local_index``. Only the datasets in ``LOCAL_SEARCH_INDEXES``
+    are served locally, and only searches that can be answered exactly like Azure would.
+    """
+
+    def __init__(self):
+        self._indexes: dict[str, LocalIndex] = {}
+        self._lock = threading.Lock()
+
+    def search(self, index: SearchIndex, search_args: dict) -> requests.Response | None:
+        """Give the search response, or None when the search should be sent to Azure."""
+        local_index = self.get_index(index)
+        if local_index is None:
+            return None
+
+        try:
+            result = local_index.search(search_args)
+        except FileNotFoundError:
+            return None
+        except UnsupportedQuery as e:
+            logger.debug("Search on %s is sent to Azure: %s", index.index_name, e)
+            return None
+        except sqlite3.Error as e:
+            logger.warning("Local search on %s failed, using Azure: %s", index.index_name, e)
+            return None
+
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json; odata.metadata=minimal"
+        response.encoding = "utf-8"
+        response._content = orjson.dumps(result)
+        return response
+
+    def get_index(self, index: SearchIndex) -> LocalIndex | None:
+        if not index.public or not any(
+            INDEX_MAPPING.get(name) is index for name in settings.LOCAL_SEARCH_INDEXES
+        ):
+            return None
+
+        path = get_local_index_path(index)
+        local_index = self._indexes.get(index.index_name)
+        if local_index is None or local_index.path != path:
+            with self._lock:
+                local_index = self._indexes[index.index_name] = LocalIndex(path)
+        return local_index
+
+    def reset(self) -> None:
+        for local_index in self._indexes.values():
+            local_index.reset()
+
+
+local_search = LocalSearch()
+os.register_at_fork(after_in_child=local_search.reset)
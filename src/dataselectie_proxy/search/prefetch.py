@@ -0,0 +1,57 @@
+import logging
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Run speculative requests in a small background pool.
+
+    The number of pending tasks is bounded, so a burst of requests doesn't queue
+    more work than the pool can handle. Tasks are dropped instead of waiting.
+    """
+
+    def __init__(self):
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[[], object]) -> bool:
+        """Schedule the function, this tells whether it was accepted."""
+        with self._lock:
+            if self._pending >= settings.SEARCH_PREFETCH_MAX_PENDING:
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.SEARCH_PREFETCH_WORKERS,
+                    thread_name_prefix="dataselectie-prefetch",
+                )
+            self._pending += 1
+
+        self._executor.submit(self._run, func)
+        return True
+
+    def _run(self, func: Callable[[], object]) -> None:
+        try:
+            func()
+        except Exception as e:  # noqa: BLE001
+            # The request is speculative, the user will retry it when it's needed.
+            logger.warning("Prefetch failed: %s", e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _reset(self) -> None:
+        # Threads don't survive a fork, the child process starts its own pool.
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+
+prefetcher = Prefetcher()
+os.register_at_fork(after_in_child=prefetcher._reset)
@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import orjson
+import requests
+from django.conf import settings
+from rest_framework.exceptions import APIException
+
+from dataselectie_proxy.search.indexes import INDEX_MAPPING, SearchIndex
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_TYPES = {"Edm.Int32", "Edm.Int64", "Edm.Double", "Edm.Single", "Edm.Decimal"}
+DATE_TYPES = {"Edm.DateTimeOffset"}
+BOOLEAN_TYPES = {"Edm.Boolean"}
+GEO_TYPES = {"Edm.GeographyPoint"}
+
+
+@dataclass
+class FieldDefinition:
+    """The definition of a single field in the Azure index schema."""
+
+    name: str
+    type: str
+    filterable: bool = False
+    sortable: bool = False
+    facetable: bool = False
+    retrievable: bool = True
+
+    @classmethod
+    def from_azure(cls, data: dict) -> "FieldDefinition":
+        is_collection = data["type"].startswith("Collection(")
+        return cls(
+            name=data["name"],
+            type=data["type"],
+            # Collections need any() / all() lambda expressions, which are not supported.
+            filterable=bool(data.get("filterable")) and not is_collection,
+            sortable=bool(data.get("sortable")),
+            facetable=bool(data.get("facetable")),
+            retrievable=data.get("retrievable", True) is not False,
+        )
+
+
+@dataclass
+class IndexSchema:
+    """The field definitions of an Azure index, used to validate requests locally."""
+
+    fields: dict[str, FieldDefinition]
+
+    @classmethod
+    def from_azure(cls, data: dict) -> "IndexSchema":
+        """Parse the index definition, as returned by the Azure Search REST API."""
+        fields = [FieldDefinition.from_azure(field) for field in data["fields"]]
+        return cls(fields={field.name: field for field in fields})
+
+    def fields_of_type(self, types: set[str]) -> set[str]:
+        return {name for name, field in self.fields.items() if field.type in types}
+
+    def retrievable_fields(self) -> set[str]:
+        return {name for name, field in self.fields.items() if field.retrievable}
+
+
+def load_index_schema(index: SearchIndex) -> IndexSchema | None:
+    """Load the schema from Azure, this gives None when it can't be retrieved."""
+    from dataselectie_proxy.search.clients import get_search_client
+
+    try:
+        client = get_search_client()
+        return IndexSchema.from_azure(client.get_index_definition(index))
+    except (APIException, requests.RequestException) as e:
+        logger.warning("Unable to retrieve schema of %s: %s", index.index_name, e)
+        return None
+
+
+def load_schema_snapshot(index: SearchIndex) -> IndexSchema | None:
+    """Load the local snapshot of the schema, this gives None when there is no snapshot."""
+    try:
+        return IndexSchema.from_azure(orjson.loads(get_snapshot_path(index).read_bytes()))
+    except FileNotFoundError:
+        logger.warning("No schema snapshot for %s, requests are not validated", index.index_name)
+        return None
+
+
+def get_snapshot_path(index: SearchIndex) -> Path:
+    return Path(settings.INDEX_SCHEMA_SNAPSHOT_DIR) / f"{index.index_name}.json"
+
+
+def attach_index_schema(index: SearchIndex, schema: IndexSchema | None) -> None:
+    """Attach the schema to the index, so the field types are known too."""
+    index.schema = schema
+    if schema is not None:
+        index.numeric_fields = index.numeric_fields | schema.fields_of_type(NUMERIC_TYPES)
+        index.date_fields = index.date_fields | schema.fields_of_type(DATE_TYPES)
+        index.boolean_fields = (index.boolean_fields or set()) | schema.fields_of_type(
+            BOOLEAN_TYPES
+        )
+        geo_fields = sorted(
+            name for name in schema.fields_of_type(GEO_TYPES) if schema.fields[name].filterable
+        )
+        if index.geo_field is None and geo_fields:
+            index.geo_field = geo_fields[0]
+
+
+class IndexSchemaLoader:
+    """Load the schemas of all indexes once per process.
+
+    The schemas are loaded from Azure, with the local snapshot as fallback.
+    When a schema can't be retrieved from Azure, a background thread retries it
+    every ``INDEX_SCHEMA_RETRY_INTERVAL`` seconds, so requests never wait for these retries.
+    Requests don't wait for a load by another thread either, they're not validated until it's done.
+    """
+
+    def __init__(self):
+        self._loaded = False
+        # The indexes of which the schema still has to be retrieved from Azure.
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def ensure_loaded(self) -> None:
+        if not settings.INDEX_SCHEMA_VALIDATION:
+            return
+        if not self._loaded:
+            self._load()
+        if self._pending:
+            self._ensure_retrying()
+
+    def retry(self) -> None:
+        """Retrieve the schemas from Azure that couldn't be retrieved before."""
+        for index in INDEX_MAPPING.values():
+            if index.index_name not in self._pending:
+                continue
+            if (schema := load_index_schema(index)) is not None:
+                attach_index_schema(index, schema)
+                self._pending.discard(index.index_name)
+
+    def _load(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            return
+
+        try:
+            if self._loaded:
+                return
+            for index in INDEX_MAPPING.values():
+                schema = load_index_schema(index) if settings.INDEX_SCHEMA_FETCH else None
+                if schema is None:
+                    if settings.INDEX_SCHEMA_FETCH:
+                        self._pending.add(index.index_name)
+                    schema = load_schema_snapshot(index)
+                attach_index_schema(index, schema)
+            self._loaded = True
+        finally:
+            self._lock.release()
+
+    def _ensure_retrying(self) -> None:
+        """Start the retry thread, also in forked worker processes."""
+        if not settings.INDEX_SCHEMA_RETRY_INTERVAL or (
+            self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+        ):
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="index-schemas", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while self._pending:
+            time.sleep(settings.INDEX_SCHEMA_RETRY_INTERVAL)
+            try:
+                self.retry()
+            except Exception:
+                # Never let the retry thread die.
+                logger.exception("Unable to retry loading the index schemas")
+
+
+index_schemas = IndexSchemaLoader()
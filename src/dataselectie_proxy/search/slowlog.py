@@ -0,0 +1,114 @@
+import logging
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+from dataselectie_proxy.search.capture import ODATA_STRING_RE
+from dataselectie_proxy.search.indexes import INDEX_MAPPING, SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Unquoted values that follow a comparison, e.g. numbers, dates and booleans.
+ODATA_VALUE_RE = re.compile(r"(?<= (?:eq|ne|gt|ge|lt|le) )[^\s)']+")
+
+
+def normalize_filter(search_filter: str) -> str:
+    """Replace the values in an OData filter with placeholders, to get the shape of the query."""
+    return ODATA_VALUE_RE.sub("?", ODATA_STRING_RE.sub("'?'", search_filter))
+
+
+class SlowQueryLog:
+    """Log the searches that take longer than the threshold of the index.
+
+    The slowest query shapes (the query without its values) are kept in memory per process,
+    so queries that need changes in the index can be found.
+    """
+
+    def __init__(self):
+        self._queries: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        index: SearchIndex,
+        search_args: dict,
+        duration: float,
+        response: requests.Response | None,
+    ) -> None:
+        """Record the search when it took longer than the threshold."""
+        dataset = self._get_dataset_name(index)
+        threshold = settings.SLOW_QUERY_THRESHOLDS.get(dataset, index.slow_query_threshold)
+        if duration < threshold:
+            return
+
+        shape = {
+            "dataset": dataset,
+            "filter": normalize_filter(search_args.get("filter", "")),
+            "orderby": search_args.get("orderby", ""),
+            "facets": search_args.get("facets", []),
+            "top": search_args.get("top"),
+        }
+        details = {
+            **shape,
+            "skip": search_args.get("skip"),
+            "duration": round(duration, 3),
+            "response_size": len(response.content) if response is not None else 0,
+            "status": response.status_code if response is not None else None,
+        }
+        logger.warning("Slow search on %s took %.3fs", dataset, duration, extra=details)
+        self._add(shape, details)
+
+    def _add(self, shape: dict, details: dict) -> None:
+        key = (
+            shape["dataset"],
+            shape["filter"],
+            shape["orderby"],
+            tuple(shape["facets"]),
+            shape["top"],
+        )
+        with self._lock:
+            query = self._queries.get(key)
+            if query is None:
+                query = self._queries[key] = {**shape, "count": 0, "total_duration": 0.0}
+            query["count"] += 1
+            query["total_duration"] += details["duration"]
+            if details["duration"] >= query.get("max_duration", 0):
+                query.update(
+                    {
+                        "max_duration": details["duration"],
+                        "skip": details["skip"],
+                        "response_size": details["response_size"],
+                        "status": details["status"],
+                    }
+                )
+            query["last_seen"] = time.time()
+
+            # Keep some spare room, so a new shape has a chance to rise into the top.
+            if len(self._queries) > settings.SLOW_QUERY_TOP_SIZE * 2:
+                slowest = sorted(self._queries.items(), key=lambda item: -item[1]["max_duration"])
+                self._queries = dict(slowest[: settings.SLOW_QUERY_TOP_SIZE])
+
+    def top(self) -> list[dict]:
+        """Give the slowest query shapes, the slowest first."""
+        with self._lock:
+            queries = sorted(self._queries.values(), key=lambda query: -query["max_duration"])
+            return [
+                {**query, "total_duration": round(query["total_duration"], 3)}
+                for query in queries[: settings.SLOW_QUERY_TOP_SIZE]
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queries = {}
+
+    def _get_dataset_name(self, index: SearchIndex) -> str:
+        for name, candidate in INDEX_MAPPING.items():
+            if candidate is index:
+                return name
+        return index.index_name
+
+
+slow_queries = SlowQueryLog()
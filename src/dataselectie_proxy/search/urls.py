@@ -3,6 +3,16 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
+    path(
+        "dataselectie/v2/batch",
+        views.ProxyBatchSearchView.as_view(),
+        name="dataselectie-batch",
+    ),
+    path(
+        "dataselectie/v2/admin/slow-queries",
+        views.SlowQueryView.as_view(),
+        name="dataselectie-slow-queries",
+    ),
     path(
         "dataselectie/v2/bag/search/adres",
         views.ProxySearchAddressView.as_view(),
@@ -13,4 +23,19 @@ urlpatterns = [
         views.ProxySearchView.as_view(),
         name="dataselectie-search",
     ),
+    path(
+        "dataselectie/v2/<str:dataset_name>/clusters",
+        views.ProxyClusterView.as_view(),
+        name="dataselectie-clusters",
+    ),
+    path(
+        "dataselectie/v2/<str:dataset_name>/crosstab",
+        views.ProxyCrossTabView.as_view(),
+        name="dataselectie-crosstab",
+    ),
+    path(
+        "dataselectie/v2/<str:dataset_name>/facets/<str:facet>",
+        views.ProxyFacetValuesView.as_view(),
+        name="dataselectie-facet-values",
+    ),
 ]
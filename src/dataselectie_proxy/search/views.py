@@ -1,16 +1,44 @@
+import hashlib
+import logging
+import os
 from datetime import datetime
 
+import orjson
+import requests
 from django.conf import settings
-from django.http import Http404, HttpResponse, StreamingHttpResponse
-from django.utils.http import content_disposition_header
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    QueryDict,
+    StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils.http import content_disposition_header, parse_etags
 from django.utils.timezone import get_current_timezone
+from rest_framework.exceptions import APIException, NotFound, ValidationError
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from dataselectie_proxy.cache import proxy_cache
 from dataselectie_proxy.search import permissions
-from dataselectie_proxy.search.clients import AzureSearchServiceClient, DSOExportClient
+from dataselectie_proxy.search.clients import (
+    TRUE_VALUES,
+    AzureSearchServiceClient,
+    DSOExportClient,
+    get_export_client,
+    get_search_client,
+)
+from dataselectie_proxy.search.concurrency import map_concurrently
+from dataselectie_proxy.search.exceptions import BadGateway
+from dataselectie_proxy.search.export import ExportConverter, get_export_format
+from dataselectie_proxy.search.freshness import index_freshness
 from dataselectie_proxy.search.indexes import INDEX_MAPPING, SearchIndex
+from dataselectie_proxy.search.prefetch import prefetcher
+from dataselectie_proxy.search.slowlog import slow_queries
+
+logger = logging.getLogger(__name__)
 
 
 class ProxySearchView(APIView):
@@ -41,46 +69,205 @@ class ProxySearchView(APIView):
         """Provide the AzureSearchServiceClient. This can be overwritten per view if needed."""
 
         if is_export_client:
-            return DSOExportClient(base_url=settings.DSO_API_BASE_URL)
+            return get_export_client()
 
-        return AzureSearchServiceClient(base_url=settings.AZURE_SEARCH_BASE_URL)
+        return get_search_client()
 
-    def stream(self, response: Response):
+    def stream(self, response: Response, chunk_size: int = 4096):
         try:
-            yield from response.iter_content(chunk_size=4096)
+            yield from response.iter_content(chunk_size=chunk_size)
         finally:
             response.close()
 
-    def get_filename(self, index):
+    def get_filename(self, index, extension: str = "csv"):
         name = index.index_name
         now = datetime.now(tz=get_current_timezone()).isoformat()
 
-        return f"{name}-{now}.csv"
+        return f"{name}-{now}.{extension}"
 
     def get(self, request: Request, *args, **kwargs):
         # Existence of index has already been verified
         index = INDEX_MAPPING[kwargs["dataset_name"]]
 
-        is_export = request.query_params.get("export", False)
-        self.client = self.get_client(is_export_client=is_export)
+        count_only = request.query_params.get("count_only", "").lower() in TRUE_VALUES
+        if count_only or request.method == "HEAD":
+            return self.get_count(request, index, kwargs["dataset_name"])
+
+        if request.query_params.get("export", False):
+            return self.get_export(request, index)
+
+        return self.get_search(request, index, kwargs["dataset_name"])
+
+    def get_search(self, request: Request, index: SearchIndex, dataset_name: str) -> HttpResponse:
+        """Return the search results, or a 304 when the client already has them."""
+        self.client = self.get_client()
+        request_args = self.client.get_request_args(request, index)
+
+        cache_headers = {
+            "ETag": self.get_etag(request_args, index),
+            "Cache-Control": self.get_cache_control(dataset_name, index),
+        }
+        # If-None-Match uses the weak comparison, the GZipMiddleware turns the ETag into W/"...".
+        if_none_match = {
+            etag.removeprefix("W/")
+            for etag in parse_etags(request.headers.get("If-None-Match", ""))
+        }
+        if cache_headers["ETag"] in if_none_match or "*" in if_none_match:
+            return HttpResponseNotModified(headers=cache_headers)
+
+        payload, is_cached = self.fetch_search(request, request_args, index, cache_headers["ETag"])
+        self.prefetch_next_page(request, index, request_args["json"], payload)
+        return HttpResponse(
+            payload["body"],
+            content_type=payload["content_type"],
+            headers={**cache_headers, "X-Cache": "HIT" if is_cached else "MISS"},
+        )
+
+    def fetch_search(
+        self,
+        request: Request,
+        request_args: dict,
+        index: SearchIndex,
+        etag: str,
+        location: str | None = None,
+    ) -> tuple[dict, bool]:
+        """Retrieve the search results from the cache, or from Azure.
+        This returns the response body and whether it was retrieved from the cache.
+        """
+        fetched = False
+
+        def _fetch():
+            nonlocal fetched
+            fetched = True
+            response: Response = self.client.send(request, request_args, index, location=location)
+            return {
+                "content_type": response.headers.get("Content-Type", "application/json"),
+                "body": response.content.decode(),
+            }
+
+        payload = proxy_cache.get_or_set(
+            self.get_search_cache_key(index, etag),
+            _fetch,
+            timeout=settings.SEARCH_CACHE_TIMEOUT,
+        )
+        return payload, not fetched
+
+    def prefetch_next_page(
+        self, request: Request, index: SearchIndex, search_args: dict, payload: dict
+    ) -> None:
+        """Retrieve the next page in the background, and store it in the response cache.
+        Users often continue paging, so their next request can be served from the cache.
+        """
+        if not settings.SEARCH_PREFETCH_ENABLED or not settings.SEARCH_CACHE_TIMEOUT:
+            return
+        if self.client.response_time > settings.SEARCH_PREFETCH_MAX_RESPONSE_TIME:
+            # The search service is busy, don't add speculative load.
+            return
+
+        page_size = search_args["top"]
+        next_page = search_args["skip"] // page_size + 2
+        try:
+            total_count = orjson.loads(payload["body"]).get("@odata.count", 0)
+        except orjson.JSONDecodeError:
+            return
+        if (next_page - 1) * page_size >= total_count:
+            return
+
+        params = request.GET.copy()
+        params["page"] = str(next_page)
+        next_args = self.client.get_search_request_args(params, index)
+        etag = self.get_etag(next_args, index)
+        if proxy_cache.get(self.get_search_cache_key(index, etag)) is not None:
+            return
+
+        location = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+        prefetcher.submit(
+            lambda: self.fetch_search(request, next_args, index, etag, location=location)
+        )
+
+    def get_search_cache_key(self, index: SearchIndex, etag: str) -> str:
+        # The ETag includes the index generation, so it's also a good cache key
+        digest = etag.strip('"')
+        return f"dataselectie-search:{index.index_name}:{digest}"
+
+    def get_export(
+        self, request: Request, index: SearchIndex
+    ) -> StreamingHttpResponse | HttpResponse:
+        """Stream the export of the DSO API."""
+        self.client = self.get_client(is_export_client=True)
+        export_format = get_export_format(request.query_params)
+
+        if settings.EXPORT_OFFLOAD == "x-accel-redirect" and export_format.name == "csv":
+            # Let the front server stream the export, so the worker is available again.
+            response = HttpResponse(
+                headers=self.client.get_offload_headers(
+                    request, index, location=settings.EXPORT_OFFLOAD_LOCATION
+                )
+            )
+            response["Content-Disposition"] = content_disposition_header(
+                as_attachment=True,
+                filename=self.get_filename(index),
+            )
+            # The headers contain the user's token for the front server,
+            # which must never be stored when the response isn't intercepted.
+            response["Cache-Control"] = "private, no-store"
+            return response
 
         response: Response = self.client.call(
             request=request,
             index=index,
-            stream=is_export,
+            stream=True,
         )
 
-        if is_export:
-            filename = self.get_filename(index)
+        if export_format.name == "csv":
             stream_response = StreamingHttpResponse(
                 streaming_content=self.stream(response), headers=response.headers
             )
-            stream_response["Content-Disposition"] = content_disposition_header(
-                as_attachment=True,
-                filename=filename,
+        else:
+            # The converted file is built while the CSV is received.
+            converter = ExportConverter(export_format, index)
+            stream_response = StreamingHttpResponse(
+                streaming_content=converter.convert(self.stream(response, chunk_size=65536)),
+                content_type=export_format.content_type,
             )
-            return stream_response
-        return HttpResponse(response, headers=response.headers)
+
+        stream_response["Content-Disposition"] = content_disposition_header(
+            as_attachment=True,
+            filename=self.get_filename(index, export_format.extension),
+        )
+        return stream_response
+
+    def get_etag(self, request_args: dict, index: SearchIndex) -> str:
+        """Generate a strong ETag, based on the translated query and the index generation.
+
+        The query is the same for everyone that has access to the index,
+        so this can be calculated without retrieving the results.
+        """
+        etag_data = {
+            "index": index.index_name,
+            "version": settings.SEARCH_INDEX_VERSION,
+            "generation": index_freshness.get_generation(index),
+            "query": request_args["json"],
+        }
+        if facet_queries := request_args.get("facet_queries"):
+            etag_data["facet_queries"] = facet_queries
+
+        digest = hashlib.sha256(orjson.dumps(etag_data, option=orjson.OPT_SORT_KEYS))
+        return f'"{digest.hexdigest()[:32]}"'
+
+    def get_cache_control(self, dataset_name: str, index: SearchIndex) -> str:
+        """Tell which party may cache the response, this can be configured per dataset."""
+        return settings.SEARCH_CACHE_CONTROL.get(dataset_name, index.cache_control)
+
+    def get_count(self, request: Request, index: SearchIndex, dataset_name: str) -> HttpResponse:
+        """Only return the number of results, which is also given as header for HEAD requests."""
+        self.client = self.get_client()
+        count = self.client.count(request=request, index=index)
+
+        response = HttpResponse(orjson.dumps({"count": count}), content_type="application/json")
+        response["X-Total-Count"] = count
+        response["Cache-Control"] = self.get_cache_control(dataset_name, index)
+        return response
 
     def get_permissions(self):
         """Collect the DRF permission checks.
@@ -93,6 +280,61 @@ class ProxySearchView(APIView):
         ]
 
 
+class ProxyClusterView(ProxySearchView):
+    """Give the number of results per grid cell, to show the results on a map."""
+
+    def get(self, request: Request, *args, **kwargs):
+        index = INDEX_MAPPING[kwargs["dataset_name"]]
+        self.client = self.get_client()
+        clusters = self.client.get_clusters(index, request.GET)
+
+        response = HttpResponse(orjson.dumps(clusters), content_type="application/json")
+        response["Cache-Control"] = self.get_cache_control(kwargs["dataset_name"], index)
+        return response
+
+
+class ProxyCrossTabView(ProxySearchView):
+    """Count the results for each combination of the values of two facets."""
+
+    def get(self, request: Request, *args, **kwargs):
+        index = INDEX_MAPPING[kwargs["dataset_name"]]
+        self.client = self.get_client()
+        crosstab = self.client.get_crosstab(index, request.GET)
+
+        response = HttpResponse(orjson.dumps(crosstab), content_type="application/json")
+        response["Cache-Control"] = self.get_cache_control(kwargs["dataset_name"], index)
+        return response
+
+
+class ProxyFacetValuesView(ProxySearchView):
+    """Complete the values of a single facet, within the filters of the search."""
+
+    def get(self, request: Request, *args, **kwargs):
+        index = INDEX_MAPPING[kwargs["dataset_name"]]
+        self.client = self.get_client()
+        values = self.client.complete_facet(index, kwargs["facet"], request.GET)
+
+        response = HttpResponse(
+            orjson.dumps({"facet": kwargs["facet"], "values": values}),
+            content_type="application/json",
+        )
+        response["Cache-Control"] = self.get_cache_control(kwargs["dataset_name"], index)
+        return response
+
+
+class SlowQueryView(APIView):
+    """Show the slowest query shapes of this process, for admins only."""
+
+    def get(self, request: Request, *args, **kwargs):
+        return HttpResponse(
+            orjson.dumps({"pid": os.getpid(), "queries": slow_queries.top()}),
+            content_type="application/json",
+        )
+
+    def get_permissions(self):
+        return super().get_permissions() + [permissions.IsUserScope({settings.ADMIN_SCOPE})]
+
+
 class ProxySearchAddressView(APIView):
     client: AzureSearchServiceClient
     index: SearchIndex = INDEX_MAPPING["bag"]
@@ -100,7 +342,7 @@ class ProxySearchAddressView(APIView):
     def get_client(self) -> AzureSearchServiceClient:
         """Provide the AzureSearchServiceClient. This can be overwritten per view if needed."""
 
-        return AzureSearchServiceClient(base_url=settings.AZURE_SEARCH_BASE_URL)
+        return get_search_client()
 
     def get(self, request: Request, *args, **kwargs):
         self.client = self.get_client()
@@ -111,3 +353,88 @@ class ProxySearchAddressView(APIView):
         )
 
         return HttpResponse(response, headers=response.headers)
+
+
+class ProxyBatchSearchView(APIView):
+    """Perform multiple dataset searches in a single request.
+
+    The request body is a list of ``{"dataset": ..., "params": {...}}`` items,
+    where the params are the same as the query parameters of the search endpoint.
+    The searches are executed concurrently, and the results are returned in the same order.
+    Failures are reported per item, so one failing search doesn't fail the whole batch.
+    """
+
+    client: AzureSearchServiceClient
+
+    def get_client(self) -> AzureSearchServiceClient:
+        """Provide the AzureSearchServiceClient. This can be overwritten per view if needed."""
+
+        return get_search_client()
+
+    def post(self, request: Request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError("Expected a list of searches.")
+        if len(items) > settings.BATCH_MAX_SEARCHES:
+            raise ValidationError(f"At most {settings.BATCH_MAX_SEARCHES} searches are allowed.")
+
+        self.client = self.get_client()
+        results = map_concurrently(
+            lambda item: self.search_item(request, item),
+            items,
+            max_workers=settings.BATCH_MAX_WORKERS,
+        )
+
+        return HttpResponse(orjson.dumps({"results": results}), content_type="application/json")
+
+    def search_item(self, request: Request, item) -> dict:
+        """Perform a single search of the batch, translating any errors into a result."""
+        dataset = item.get("dataset") if isinstance(item, dict) else None
+        try:
+            index, params = self.parse_item(item)
+            permissions.IsUserScope(index.needed_scopes).has_permission(request, self)
+
+            if params.get("count_only", "").lower() in TRUE_VALUES:
+                count = self.client.count(request, index, params)
+                return {"dataset": dataset, "status": 200, "data": {"count": count}}
+
+            location = reverse("dataselectie-search", kwargs={"dataset_name": dataset})
+            response = self.client.search(
+                request, index, params, location=f"{location}?{params.urlencode()}"
+            )
+        except APIException as e:
+            return self.get_error_result(dataset, e)
+        except requests.RequestException as e:
+            logger.error("Batch search for %s failed: %s", dataset, e)
+            return self.get_error_result(dataset, BadGateway())
+
+        return {"dataset": dataset, "status": response.status_code, "data": response.json()}
+
+    def get_error_result(self, dataset: str | None, exception: APIException) -> dict:
+        # Same format as the regular DRF exception handler
+        detail = exception.detail
+        return {
+            "dataset": dataset,
+            "status": exception.status_code,
+            "error": detail if isinstance(detail, list | dict) else {"detail": detail},
+        }
+
+    def parse_item(self, item) -> tuple[SearchIndex, QueryDict]:
+        """Validate a batch item, and translate the parameters into a query string."""
+        if not isinstance(item, dict) or not isinstance(item.get("params", {}), dict):
+            raise ValidationError("Expected an object with a 'dataset' and 'params'.")
+
+        try:
+            index = INDEX_MAPPING[item.get("dataset")]
+        except (KeyError, TypeError):
+            raise NotFound("Index not found") from None
+
+        params = QueryDict(mutable=True)
+        for name, value in item.get("params", {}).items():
+            values = value if isinstance(value, list) else [value]
+            params.setlist(name, [str(v) for v in values])
+
+        if "export" in params:
+            raise ValidationError({"export": "Exports are not supported in a batch search."})
+
+        return index, params
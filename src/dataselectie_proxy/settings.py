@@ -3,7 +3,6 @@ from pathlib import Path
 import environ
 from azure.core.credentials import AccessToken
 from corsheaders.defaults import default_headers
-from pythonjsonlogger import jsonlogger
 
 env = environ.Env()
 _USE_SECRET_STORE = Path("/mnt/secrets-store").exists()
@@ -51,6 +50,29 @@ MIDDLEWARE = [
     "authorization_django.authorization_middleware",
 ]
 
+# The search endpoints run without the middleware that's not needed for a JSON API.
+# Empty paths disable this fast path.
+LEAN_MIDDLEWARE_PATHS = env.list("LEAN_MIDDLEWARE_PATHS", default=["/dataselectie/v2/"])
+LEAN_MIDDLEWARE_SKIP = env.list(
+    "LEAN_MIDDLEWARE_SKIP",
+    default=[
+        "whitenoise.middleware.WhiteNoiseMiddleware",
+        "django.middleware.csrf.CsrfViewMiddleware",
+        "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    ],
+)
+
+# Profiling of single requests by admins, see ProfilingMiddleware.
+PROFILING_ENABLED = env.bool("PROFILING_ENABLED", True)
+PROFILING_HEADER = env.str("PROFILING_HEADER", "X-Profile")
+PROFILING_INTERVAL = env.float("PROFILING_INTERVAL", 0.001)
+PROFILING_DIR = env.str("PROFILING_DIR", "/tmp/dataselectie-proxy-profiles")  # noqa: S108
+PROFILING_MAX_FILES = env.int("PROFILING_MAX_FILES", 20)
+
+if PROFILING_ENABLED:
+    # Needs the scopes of the authorization middleware.
+    MIDDLEWARE.append("dataselectie_proxy.profiling.ProfilingMiddleware")
+
 if DEBUG:
     INSTALLED_APPS += [
         "debug_toolbar",
@@ -100,7 +122,26 @@ WSGI_APPLICATION = "dataselectie_proxy.wsgi.application"
 
 ALLOWED_HOSTS = env.list("ALLOWED_HOSTS", default=["*"])
 
-CACHES = {"default": env.cache_url(default="locmemcache://")}
+# By default, the cache is a directory that is shared by all workers of a pod.
+# Use e.g. redis:// or memcache:// to share it between the pods too.
+CACHES = {"default": env.cache_url(default="filecache:///tmp/dataselectie-proxy-cache")}
+if CACHES["default"]["BACKEND"] == "django.core.cache.backends.filebased.FileBasedCache":
+    # Django lists the whole directory on every write, this only checks the size periodically.
+    CACHES["default"]["BACKEND"] = "dataselectie_proxy.cache.SharedFileBasedCache"
+if CACHES["default"]["BACKEND"].endswith(("LocMemCache", "FileBasedCache")):
+    # Django keeps only 300 entries by default, which is too small for the search responses.
+    CACHES["default"].setdefault("OPTIONS", {}).update(
+        {
+            "MAX_ENTRIES": env.int("CACHE_MAX_ENTRIES", 5000),
+            "CULL_FREQUENCY": env.int("CACHE_CULL_FREQUENCY", 4),
+        }
+    )
+
+# In-process cache in front of the shared cache, and the cache alias to use for proxy data.
+PROXY_CACHE_ALIAS = "default"
+PROXY_CACHE_LOCAL_MAXSIZE = env.int("PROXY_CACHE_LOCAL_MAXSIZE", 256)
+PROXY_CACHE_LOCAL_TIMEOUT = env.int("PROXY_CACHE_LOCAL_TIMEOUT", 10)
+PROXY_CACHE_NEGATIVE_TIMEOUT = env.int("PROXY_CACHE_NEGATIVE_TIMEOUT", 10)
 
 DATABASES = {}  # "default": env.db_url(default="django.db.backends.sqlite3:///tmp/db.sqlite3")}
 
@@ -109,34 +150,29 @@ locals().update(env.email_url(default="smtp://"))
 # -- Logging
 
 
-class CustomJsonFormatter(jsonlogger.JsonFormatter):
-    def __init__(self, *args, **kwargs):
-        # Make sure some 'extra' fields are not included:
-        super().__init__(*args, **kwargs)
-        self._skip_fields.update({"request": "request", "taskName": "taskName"})
-
-    def add_fields(self, log_record: dict, record, message_dict: dict):
-        # The 'rename_fields' logic fails when fields are missing, this is easier:
-        super().add_fields(log_record, record, message_dict)
-        # An in-place reordering, sotime/level appear first (easier for docker log scrolling)
-        ordered_dict = {
-            "time": log_record.pop("asctime", record.asctime),
-            "level": log_record.pop("levelname", record.levelname),
-            **log_record,
-        }
-        log_record.clear()
-        log_record.update(ordered_dict)
-
-
 _json_log_formatter = {
-    "()": CustomJsonFormatter,
-    "format": "%(asctime)s $(levelname)s %(name)s %(message)s",  # parsed as a fields list.
+    "()": "dataselectie_proxy.logs.OrjsonFormatter",
 }
 
 DJANGO_LOG_LEVEL = env.str("DJANGO_LOG_LEVEL", "INFO").upper()
 LOG_LEVEL = env.str("LOG_LEVEL", "DEBUG" if DEBUG else "INFO").upper()
 AUDIT_LOG_LEVEL = env.str("AUDIT_LOG_LEVEL", "INFO").upper()
 
+# Records are written by a background thread; when this many are pending, new ones are dropped.
+LOG_QUEUE_SIZE = env.int("LOG_QUEUE_SIZE", 10000)
+
+
+def _queue_handler(*handlers: str, block: bool = False) -> dict:
+    handler_class = "BlockingQueueHandler" if block else "BackgroundQueueHandler"
+    return {
+        "class": f"dataselectie_proxy.logs.{handler_class}",
+        "queue": {"()": "queue.Queue", "maxsize": LOG_QUEUE_SIZE},
+        "listener": "dataselectie_proxy.logs.BackgroundQueueListener",
+        "handlers": list(handlers),
+        "respect_handler_level": True,
+    }
+
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": True,
@@ -163,6 +199,10 @@ LOGGING = {
             "class": "logging.StreamHandler",
             "formatter": "audit_json",
         },
+        # Keep writing the logs out of the request thread:
+        "console_queue": _queue_handler("console"),
+        # Audit records are never dropped, a full queue waits for the writer instead.
+        "audit_queue": _queue_handler("audit_console", block=True),
     },
     "root": {
         "level": DJANGO_LOG_LEVEL,
@@ -170,7 +210,7 @@ LOGGING = {
     },
     "loggers": {
         "django": {
-            "handlers": ["console"],
+            "handlers": ["console_queue"],
             "level": DJANGO_LOG_LEVEL,
             "propagate": False,
         },
@@ -180,17 +220,17 @@ LOGGING = {
             "propagate": False,
         },
         "dataselectie_proxy": {
-            "handlers": ["console"],
+            "handlers": ["console_queue"],
             "level": LOG_LEVEL,
             "propagate": False,
         },
         "dataselectie_proxy.audit": {
-            "handlers": ["audit_console"],
+            "handlers": ["audit_queue"],
             "level": AUDIT_LOG_LEVEL,
             "propagate": False,
         },
         "authorization_django": {
-            "handlers": ["audit_console"],
+            "handlers": ["audit_queue"],
             "level": AUDIT_LOG_LEVEL,
             "propagate": False,
         },
@@ -271,12 +311,7 @@ if CLOUD_ENV.startswith("azure"):
             "logger_provider": audit_logger_provider,
             "formatter": "audit_json",
         }
-        for logger_name, logger_details in LOGGING["loggers"].items():
-            if "audit_console" in logger_details["handlers"]:
-                LOGGING["loggers"][logger_name]["handlers"] = [
-                    "audit_console",
-                    "console",
-                ]
+        LOGGING["handlers"]["audit_queue"] = _queue_handler("audit_console", "console", block=True)
         print("Audit logging has been enabled")
 elif CLOUD_ENV == "local":
     DEV_TOKEN = env.json("ACCESS_TOKEN")
@@ -339,3 +374,94 @@ DATAPUNT_AUTHZ = {
 AZURE_SEARCH_BASE_URL = env.str("AZURE_SEARCH_BASE_URL", None)
 
 DSO_API_BASE_URL = env.str("DSO_API_BASE_URL", None)
+
+# Included in the ETag of search responses, change it to invalidate all ETags.
+SEARCH_INDEX_VERSION = env.str("SEARCH_INDEX_VERSION", "1")
+
+# How often (in seconds) the index statistics are polled to detect reloads, 0 disables it.
+INDEX_FRESHNESS_INTERVAL = env.int("INDEX_FRESHNESS_INTERVAL", 300)
+
+# Override the Cache-Control header per dataset, e.g. {"bag": "public, max-age=600"}
+SEARCH_CACHE_CONTROL = env.json("SEARCH_CACHE_CONTROL", default={})
+
+# How long search responses are cached, 0 disables it.
+SEARCH_CACHE_TIMEOUT = env.int("SEARCH_CACHE_TIMEOUT", 300)
+
+# Prefetch the next page of search results into the cache, with a small background pool.
+# This is skipped when the average search response time (in seconds) is above the maximum.
+SEARCH_PREFETCH_ENABLED = env.bool("SEARCH_PREFETCH_ENABLED", False)
+SEARCH_PREFETCH_WORKERS = env.int("SEARCH_PREFETCH_WORKERS", 2)
+SEARCH_PREFETCH_MAX_PENDING = env.int("SEARCH_PREFETCH_MAX_PENDING", 4)
+SEARCH_PREFETCH_MAX_RESPONSE_TIME = env.float("SEARCH_PREFETCH_MAX_RESPONSE_TIME", 1.0)
+
+# Map clustering: the size of a cell in pixels, the maximum size of the grid,
+# and how many rows of the grid are counted in parallel.
+CLUSTER_CELL_PIXELS = env.int("CLUSTER_CELL_PIXELS", 64)
+CLUSTER_MAX_ROWS = env.int("CLUSTER_MAX_ROWS", 32)
+CLUSTER_MAX_COLUMNS = env.int("CLUSTER_MAX_COLUMNS", 48)
+CLUSTER_MAX_WORKERS = env.int("CLUSTER_MAX_WORKERS", 4)
+
+# Disjunctive facets and cross-tabs: how many facet queries of a request run in parallel,
+# and the maximum number of rows of a cross-tab.
+FACET_MAX_WORKERS = env.int("FACET_MAX_WORKERS", 4)
+CROSSTAB_MAX_ROWS = env.int("CROSSTAB_MAX_ROWS", 50)
+
+# Facet completion: how many values of a facet are kept in memory,
+# and how often the values without filters are refreshed (in seconds).
+FACET_VALUES_MAX = env.int("FACET_VALUES_MAX", 10000)
+FACET_VALUES_REFRESH = env.int("FACET_VALUES_REFRESH", 600)
+
+# Traffic capture for the replay_traffic command: the NDJSON file (empty disables it),
+# the fraction of requests to capture, and the maximum size of the file.
+# With hashing, text values of filters are replaced with a hash keyed by the SECRET_KEY.
+TRAFFIC_CAPTURE_FILE = env.str("TRAFFIC_CAPTURE_FILE", "")
+TRAFFIC_CAPTURE_RATE = env.float("TRAFFIC_CAPTURE_RATE", 0.01)
+TRAFFIC_CAPTURE_MAX_BYTES = env.int("TRAFFIC_CAPTURE_MAX_BYTES", 100 * 1024 * 1024)
+TRAFFIC_CAPTURE_HASH_VALUES = env.bool("TRAFFIC_CAPTURE_HASH_VALUES", True)
+
+# Slow query log: overrides the threshold of the index per dataset (in seconds),
+# and the number of slowest query shapes that are kept by each process.
+SLOW_QUERY_THRESHOLDS = env.json("SLOW_QUERY_THRESHOLDS", default={})
+SLOW_QUERY_TOP_SIZE = env.int("SLOW_QUERY_TOP_SIZE", 50)
+
+# Serve these public datasets from a local copy, built with ./manage.py build_local_index.
+# Searches that the local copy can't answer are still sent to Azure.
+LOCAL_SEARCH_INDEXES = env.list("LOCAL_SEARCH_INDEXES", default=[])
+LOCAL_SEARCH_DIR = env.str("LOCAL_SEARCH_DIR", "/tmp/dataselectie-proxy-local")  # noqa: S108
+LOCAL_SEARCH_MMAP_SIZE = env.int("LOCAL_SEARCH_MMAP_SIZE", 256 * 1024 * 1024)
+
+# Scope that gives access to the admin endpoints, e.g. the slow query log.
+ADMIN_SCOPE = env.str("ADMIN_SCOPE", "DATASELECTIE/ADMIN")
+
+# How long the result of a count-only search is cached.
+COUNT_CACHE_TIMEOUT = env.int("COUNT_CACHE_TIMEOUT", 60)
+
+# Validate filters, sorting, facets and fields against the Azure index schema.
+# The schemas are loaded from Azure, with a local snapshot as fallback.
+# When a schema can't be loaded from Azure, it's retried in the background (interval in seconds).
+INDEX_SCHEMA_VALIDATION = env.bool("INDEX_SCHEMA_VALIDATION", True)
+INDEX_SCHEMA_FETCH = env.bool("INDEX_SCHEMA_FETCH", True)
+INDEX_SCHEMA_SNAPSHOT_DIR = env.str(
+    "INDEX_SCHEMA_SNAPSHOT_DIR", str(SRC_DIR / "dataselectie_proxy/search/schema_snapshots")
+)
+INDEX_SCHEMA_RETRY_INTERVAL = env.int("INDEX_SCHEMA_RETRY_INTERVAL", 60)
+
+# Timeout (in seconds) for retrieving the schema and statistics of an index from Azure.
+INDEX_METADATA_TIMEOUT = env.float("INDEX_METADATA_TIMEOUT", 5.0)
+
+# Warm up each worker process (connections, tokens, schemas) before it handles requests.
+WARMUP_ENABLED = env.bool("WARMUP_ENABLED", not DEBUG)
+WARMUP_TIMEOUT = env.float("WARMUP_TIMEOUT", 5.0)
+
+# Let the front server stream exports, instead of the Python worker.
+# Use "x-accel-redirect" to enable this, which requires an internal location in nginx.
+EXPORT_OFFLOAD = env.str("EXPORT_OFFLOAD", "")
+EXPORT_OFFLOAD_LOCATION = env.str("EXPORT_OFFLOAD_LOCATION", "/internal/dso-export/")
+
+# Number of rows per batch when an export is converted, e.g. the row group size of Parquet.
+# A batch is kept in memory, this is about the size of a few chunks of the CSV stream.
+EXPORT_BATCH_ROWS = env.int("EXPORT_BATCH_ROWS", 2000)
+
+# Batch search: maximum number of searches per request, and how many run in parallel.
+BATCH_MAX_SEARCHES = env.int("BATCH_MAX_SEARCHES", 10)
+BATCH_MAX_WORKERS = env.int("BATCH_MAX_WORKERS", 4)
@@ -0,0 +1,97 @@
+"""Warm-up of worker processes.
+
+After a deploy, scale-out or worker recycle, the first requests of each worker
+would otherwise pay for the DNS lookups, TLS handshakes, fetching the access token
+and the initialization of Django and DRF. This is done once when the worker starts,
+before it accepts requests.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.urls import resolve, reverse
+from rest_framework.settings import api_settings
+
+from dataselectie_proxy.search.clients import get_export_client, get_search_client
+from dataselectie_proxy.search.indexes import INDEX_MAPPING
+from dataselectie_proxy.search.schemas import index_schemas
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up() -> None:
+    """Prepare the current worker process for handling requests."""
+    start = time.monotonic()
+    search_client = get_search_client()
+
+    for client in (search_client, get_export_client()):
+        try:
+            client.preconnect(timeout=settings.WARMUP_TIMEOUT)
+        except requests.RequestException as e:
+            logger.warning("Warm-up: unable to connect to %s: %s", client.base_url, e)
+
+    try:
+        search_client.fetch_token()
+    except Exception as e:  # noqa: BLE001
+        # The credential raises various exceptions, the first request will report them.
+        logger.warning("Warm-up: unable to fetch the search token: %s", e)
+
+    _load_schemas()
+    _exercise_view_stack()
+
+    logger.info("Warm-up finished in %.3fs", time.monotonic() - start)
+
+
+def _load_schemas() -> None:
+    """Load the index schemas, but don't keep the worker waiting longer than the timeout.
+    A load that takes longer continues in the background.
+    """
+
+    def _load():
+        try:
+            index_schemas.ensure_loaded()
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Warm-up: unable to load the index schemas: %s", e)
+
+    thread = threading.Thread(target=_load, name="dataselectie-warmup-schemas", daemon=True)
+    thread.start()
+    thread.join(timeout=settings.WARMUP_TIMEOUT)
+    if thread.is_alive():
+        logger.warning(
+            "Warm-up: the index schemas are still loading after %.1fs", settings.WARMUP_TIMEOUT
+        )
+
+
+def _exercise_view_stack() -> None:
+    """Initialize the lazy parts of Django and DRF, without performing a search."""
+    # Compiles the URL patterns
+    for dataset_name in INDEX_MAPPING:
+        resolve(reverse("dataselectie-search", kwargs={"dataset_name": dataset_name}))
+    resolve(reverse("dataselectie-search-address"))
+
+    # Imports the configured DRF classes
+    for setting in api_settings.defaults:
+        getattr(api_settings, setting)
+
+
+def register_warm_up() -> None:
+    """Run the warm-up in each worker process.
+
+    With uWSGI, the application is loaded in the master process and forked afterwards,
+    unless lazy-apps is used. The warm-up should happen in the worker, as connections
+    can't be shared between processes. Other servers load the application in the worker.
+    """
+    try:
+        import uwsgi
+        from uwsgidecorators import postfork
+    except ImportError:
+        warm_up()
+        return
+
+    if uwsgi.opt.get("lazy-apps") or uwsgi.opt.get("lazy"):
+        warm_up()
+    else:
+        postfork(warm_up)
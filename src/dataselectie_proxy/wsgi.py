@@ -14,3 +14,14 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dataselectie_proxy.settings")
 
 application = get_wsgi_application()
 application = WhiteNoise(application, root=settings.STATIC_ROOT)
+
+if settings.LEAN_MIDDLEWARE_PATHS:
+    from dataselectie_proxy.handlers import with_lean_paths
+
+    # The search endpoints skip the middleware they don't need, and the static files.
+    application = with_lean_paths(application)
+
+if settings.WARMUP_ENABLED:
+    from dataselectie_proxy.warmup import register_warm_up
+
+    register_warm_up()
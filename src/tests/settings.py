@@ -10,6 +10,8 @@ CACHES = {
     }
 }
 
+PROXY_CACHE_LOCAL_MAXSIZE = 0
+
 CSRF_COOKIE_SECURE = False
 SESSION_COOKIE_SECURE = False
 
@@ -53,3 +55,12 @@ STORAGES = {
 # Use different default:
 AZURE_SEARCH_BASE_URL = "https://test.azure-search"
 DSO_API_BASE_URL = "https://dso.api"
+
+# Don't poll Azure in the background
+INDEX_FRESHNESS_INTERVAL = 0
+
+# Schemas are attached explicitly by the tests that need them
+INDEX_SCHEMA_VALIDATION = False
+
+# Don't keep facet values in memory between tests
+FACET_VALUES_REFRESH = 0
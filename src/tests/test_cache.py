@@ -0,0 +1,135 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from dataselectie_proxy.cache import SharedFileBasedCache, TwoTierCache
+
+
+@pytest.fixture()
+def cache_settings(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
+    settings.PROXY_CACHE_LOCAL_MAXSIZE = 2
+    return settings
+
+
+class TestTwoTierCache:
+    """Prove the in-process cache works together with the shared cache."""
+
+    def test_get_set(self, cache_settings):
+        """Prove values are stored in the shared backend, and restored from it"""
+        cache = TwoTierCache()
+        cache.set("json", {"count": 1}, timeout=60)
+        cache.set("bytes", b"\x00raw", timeout=60)
+
+        # Another worker has an empty local cache
+        other = TwoTierCache()
+        assert other.get("json") == {"count": 1}
+        assert other.get("bytes") == b"\x00raw"
+        assert other.get("missing", "default") == "default"
+
+    def test_local_lru(self, cache_settings):
+        """Prove the local cache is bounded, and used before the shared backend"""
+        cache = TwoTierCache()
+        cache.set("a", 1, timeout=60)
+        cache.set("b", 2, timeout=60)
+        cache.get("a")
+        cache.set("c", 3, timeout=60)  # evicts "b", the least recently used
+
+        with patch.object(cache.backend, "get", return_value=None) as backend_get:
+            assert cache.get("a") == 1
+            assert cache.get("c") == 3
+            assert cache.get("b") is None
+            assert backend_get.call_count == 1
+
+    def test_write_deduplicated(self, cache_settings):
+        """Prove unchanged values are not written to the shared backend again"""
+        cache = TwoTierCache()
+        with patch.object(cache.backend, "set") as backend_set:
+            cache.set("a", [1, 2], timeout=60)
+            cache.set("a", [1, 2], timeout=60)
+            assert backend_set.call_count == 1
+
+            cache.set("a", [1, 2, 3], timeout=60)
+            assert backend_set.call_count == 2
+
+    def test_get_or_set_negative(self, cache_settings):
+        """Prove missing values are cached too, so they are only computed once"""
+        cache = TwoTierCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return None
+
+        assert cache.get_or_set("missing", compute, timeout=60) is None
+        assert cache.get_or_set("missing", compute, timeout=60) is None
+        assert len(calls) == 1
+
+        # A timeout of 0 disables caching
+        assert cache.get_or_set("uncached", compute, timeout=60, negative_timeout=0) is None
+        assert cache.get_or_set("uncached", compute, timeout=60, negative_timeout=0) is None
+        assert len(calls) == 3
+
+    def test_get_or_set_single_flight(self, cache_settings):
+        """Prove concurrent misses for a key are computed once, without blocking other keys"""
+        cache = TwoTierCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append("slow")
+            started.set()
+            release.wait(timeout=5)
+            return "slow"
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(cache.get_or_set, "key", slow, timeout=60)
+            started.wait(timeout=5)
+            second = executor.submit(cache.get_or_set, "key", slow, timeout=60)
+
+            # Another key is computed while the first is still in flight.
+            assert cache.get_or_set("other", lambda: "other", timeout=60) == "other"
+
+            release.set()
+            assert first.result(timeout=5) == second.result(timeout=5) == "slow"
+
+        assert calls == ["slow"]
+
+    def test_get_or_set_nested(self, cache_settings):
+        """Prove the computed function can use the cache, also from other threads"""
+        cache = TwoTierCache()
+
+        def outer():
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                inner = executor.submit(cache.get_or_set, "inner", lambda: 1, timeout=60)
+                return inner.result(timeout=5) + cache.get_or_set("outer", lambda: 2, timeout=60)
+
+        assert cache.get_or_set("outer", outer, timeout=60) == 3
+        assert not cache._inflight
+
+
+class TestSharedFileBasedCache:
+    """Prove the file based cache only checks its size periodically."""
+
+    def test_cull_interval(self, tmp_path):
+        """Prove the cache is culled at most once per interval"""
+        cache = SharedFileBasedCache(
+            str(tmp_path), {"OPTIONS": {"MAX_ENTRIES": 2, "CULL_FREQUENCY": 2}}
+        )
+
+        with patch.object(cache, "_list_cache_files", wraps=cache._list_cache_files) as listed:
+            for key in "abcd":
+                cache.set(key, key)
+            assert listed.call_count == 1
+            assert len(cache._list_cache_files()) == 4
+
+            cache._cull_at = 0.0  # the interval has passed
+            cache.set("e", "e")
+            # Half of the 4 entries were removed, before "e" was written.
+            assert len(cache._list_cache_files()) == 3
+            assert cache.get("e") == "e"
@@ -0,0 +1,43 @@
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from dataselectie_proxy.handlers import with_lean_paths
+from dataselectie_proxy.management.commands.benchmark_middleware import FullHandler, LeanHandler
+
+
+def _call(handler, path):
+    environ = RequestFactory().get(path).environ
+    response = handler(environ, lambda status, headers, exc_info=None: None)
+    response.close()
+    return response
+
+
+class TestLeanWSGIHandler:
+    """Prove the search endpoints can skip the middleware they don't need."""
+
+    def test_skipped_middleware(self):
+        """Prove the skipped middleware doesn't run, and the other middleware still does"""
+        full = _call(FullHandler(), "/dataselectie/v2/bag/search")
+        lean = _call(LeanHandler(), "/dataselectie/v2/bag/search")
+
+        assert full["X-Frame-Options"] == "DENY"
+        assert "X-Frame-Options" not in lean
+        assert lean["X-Content-Type-Options"] == "nosniff"
+
+    def test_with_lean_paths(self):
+        """Prove only the configured paths are sent to the lean handler"""
+        calls = []
+
+        def _app(name):
+            return lambda environ, start_response: calls.append((name, environ["PATH_INFO"]))
+
+        application = with_lean_paths(_app("full"), lean_handler=_app("lean"))
+        application({"PATH_INFO": "/dataselectie/v2/bag/search"}, None)
+        application({"PATH_INFO": "/status/health"}, None)
+
+        assert calls == [("lean", "/dataselectie/v2/bag/search"), ("full", "/status/health")]
+
+    def test_benchmark(self, capsys):
+        """Prove the benchmark reports the saved time"""
+        call_command("benchmark_middleware", requests=10, repeat=1)
+        assert "Saved: " in capsys.readouterr().out
@@ -0,0 +1,110 @@
+import logging
+import queue
+
+import orjson
+
+from dataselectie_proxy import settings as project_settings
+from dataselectie_proxy.logs import (
+    BackgroundQueueHandler,
+    BackgroundQueueListener,
+    BlockingQueueHandler,
+    OrjsonFormatter,
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def _make_record(msg, *args, exc_info=None, **extra):
+    record = logging.LogRecord(
+        "dataselectie_proxy.test", logging.INFO, __file__, 1, msg, args, exc_info
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+class TestOrjsonFormatter:
+    """Prove the log records are written as JSON in a fixed field order."""
+
+    def test_format(self):
+        """Prove time/level come first, followed by the static and extra fields"""
+        formatter = OrjsonFormatter(static_fields={"audit": True})
+        record = _make_record("Searched %s", "bag", dataset="bag", request=object())
+
+        data = orjson.loads(formatter.format(record))
+        assert list(data) == ["time", "level", "name", "message", "audit", "dataset"]
+        assert data["level"] == "INFO"
+        assert data["message"] == "Searched bag"
+
+    def test_format_exception(self):
+        """Prove exceptions and values that are not JSON are included"""
+        try:
+            raise ValueError("broken")
+        except ValueError as e:
+            record = _make_record("Failed", exc_info=(type(e), e, e.__traceback__), value={1})
+
+        data = orjson.loads(OrjsonFormatter().format(record))
+        assert "ValueError: broken" in data["exc_info"]
+        assert data["value"] == "{1}"
+
+
+class TestBackgroundQueueHandler:
+    """Prove the log records are written by a background thread."""
+
+    def test_emit(self):
+        """Prove the records reach the target handler with all fields"""
+        target = ListHandler()
+        target.setFormatter(OrjsonFormatter())
+        handler = BackgroundQueueHandler(queue.Queue())
+        handler.listener = BackgroundQueueListener(handler.queue, target)
+
+        args = ["bag"]
+        handler.handle(_make_record("Searched %s", args, dataset="bag"))
+        args.append("changed")
+        handler.stop()
+
+        assert len(target.lines) == 1
+        data = orjson.loads(target.lines[0])
+        assert data["message"] == "Searched ['bag']"
+        assert data["dataset"] == "bag"
+
+    def test_queue_full(self):
+        """Prove records are dropped instead of blocking when the queue is full"""
+        handler = BackgroundQueueHandler(queue.Queue(maxsize=1))
+        handler.handle(_make_record("first"))
+        handler.handle(_make_record("second"))
+
+        assert handler.queue.qsize() == 1
+        assert handler.dropped == 1
+
+    def test_queue_full_blocking(self):
+        """Prove audit records wait for the writer instead of being dropped"""
+        target = ListHandler()
+        target.setFormatter(OrjsonFormatter())
+        handler = BlockingQueueHandler(queue.Queue(maxsize=1))
+        handler.listener = BackgroundQueueListener(handler.queue, target)
+
+        for number in range(20):
+            handler.handle(_make_record(f"record {number}"))
+        handler.stop()
+
+        assert handler.dropped == 0
+        assert len(target.lines) == 20
+
+    def test_audit_queue_blocks(self):
+        """Prove the audit loggers use a queue that doesn't drop records"""
+        for name in ("dataselectie_proxy.audit", "authorization_django"):
+            assert project_settings.LOGGING["loggers"][name]["handlers"] == ["audit_queue"]
+
+        # The handlers as they are built by dictConfig() from the settings.
+        audit_queue = logging.getHandlerByName("audit_queue")
+        assert isinstance(audit_queue, BlockingQueueHandler)
+        assert audit_queue.block
+        assert isinstance(audit_queue.listener, BackgroundQueueListener)
+        assert not logging.getHandlerByName("console_queue").block
@@ -0,0 +1,61 @@
+import time
+
+from django.urls import reverse
+
+from tests.utils import build_jwt_token
+
+SEARCH_URL = "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview"
+
+
+class TestProfilingMiddleware:
+    """Prove requests can be profiled by admins."""
+
+    def test_profile_response(self, api_client, requests_mock, settings):
+        """Prove the folded stacks are returned instead of the response"""
+        settings.PROFILING_INTERVAL = 0.001
+
+        def slow_search(request, context):
+            time.sleep(0.05)
+            return {"@odata.count": 1}
+
+        requests_mock.post(SEARCH_URL, json=slow_search)
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        token = build_jwt_token(["DATASELECTIE/ADMIN"])
+        response = api_client.get(
+            url, headers={"Authorization": f"Bearer {token}", "X-Profile": "response"}
+        )
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/plain"
+        assert response["X-Profile-Status"] == "200"
+        assert "dataselectie_proxy.search.views:ProxySearchView.get" in response.content.decode()
+
+    def test_profile_file(self, api_client, requests_mock, settings, tmp_path):
+        """Prove the profiles are written to a bounded directory"""
+        settings.PROFILING_DIR = str(tmp_path)
+        settings.PROFILING_MAX_FILES = 2
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        token = build_jwt_token(["DATASELECTIE/ADMIN"])
+        for _ in range(3):
+            response = api_client.get(
+                url, headers={"Authorization": f"Bearer {token}", "X-Profile": "1"}
+            )
+            assert response.json() == {"@odata.count": 1}
+
+        assert (tmp_path / response["X-Profile-File"]).exists()
+        assert len(list(tmp_path.iterdir())) == 2
+
+    def test_no_profile_without_scope(self, api_client, requests_mock, settings, tmp_path):
+        """Prove the header is ignored for other users"""
+        settings.PROFILING_DIR = str(tmp_path)
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, headers={"X-Profile": "response"})
+
+        assert response.json() == {"@odata.count": 1}
+        assert "X-Profile-File" not in response
+        assert not list(tmp_path.iterdir())
@@ -0,0 +1,127 @@
+import re
+from datetime import date
+
+import orjson
+from django.core.management import call_command
+from django.urls import reverse
+
+from dataselectie_proxy.search.indexes import INDEX_MAPPING
+from tests.utils import build_jwt_token
+
+SEARCH_URL = "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview"
+
+
+class TestTrafficCapture:
+    """Prove a sample of the requests can be captured and replayed."""
+
+    def test_capture(self, api_client, requests_mock, settings, tmp_path):
+        """Prove the translated requests are written without tokens and personal data"""
+        settings.TRAFFIC_CAPTURE_FILE = str(tmp_path / "capture.ndjson")
+        settings.TRAFFIC_CAPTURE_RATE = 1
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+        token = build_jwt_token(["BRK/RSN"])
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(
+            url,
+            data={"postcode": ["1012AB", "1012AC"], "huisnummer": 10, "page": 2},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        api_client.get(url, data={"count_only": "true"})
+
+        lines = (tmp_path / "capture.ndjson").read_bytes().splitlines()
+        assert len(lines) == 2
+        assert token.encode() not in lines[0]
+        assert b"1012A" not in lines[0]
+
+        record = orjson.loads(lines[0])
+        assert record["method"] == "GET"
+        assert record["path"] == url
+        assert record["params"]["huisnummer"] == ["10"]
+        assert record["params"]["page"] == ["2"]
+        postcodes = record["params"]["postcode"]
+        assert len(postcodes) == 2 and postcodes[0] != postcodes[1]
+        assert record["backend"]["skip"] == 100
+        assert re.fullmatch(
+            r"search.in\(postcode, '[0-9a-f]{16}', '[0-9a-f]{16}'\) and huisnummer eq 10",
+            record["backend"]["filter"],
+        )
+
+    def test_capture_coordinates(self, api_client, requests_mock, settings, tmp_path):
+        """Prove the exact location of the user is not captured"""
+        settings.TRAFFIC_CAPTURE_FILE = str(tmp_path / "capture.ndjson")
+        settings.TRAFFIC_CAPTURE_RATE = 1
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"bbox": "4.88712,52.36021,4.88934,52.36187"})
+
+        line = (tmp_path / "capture.ndjson").read_bytes()
+        assert b"4.887" not in line and b"52.360" not in line
+
+        record = orjson.loads(line)
+        assert record["params"]["bbox"] == ["4.89,52.36,4.89,52.36"]
+        assert record["backend"]["filter"] == (
+            "latitude ge 52.36 and latitude le 52.36 and longitude ge 4.89 and longitude le 4.89"
+        )
+
+    def test_capture_typed_values(
+        self, api_client, requests_mock, settings, tmp_path, monkeypatch
+    ):
+        """Prove numbers and dates are hashed, unless the field holds no personal data"""
+        settings.TRAFFIC_CAPTURE_FILE = str(tmp_path / "capture.ndjson")
+        settings.TRAFFIC_CAPTURE_RATE = 1
+        index = INDEX_MAPPING["bag"]
+        monkeypatch.setattr(index, "capture_plain_fields", set())
+        monkeypatch.setattr(index, "date_fields", {"geboortedatum"})
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"huisnummer": 12345, "geboortedatum": "1980-05-17"})
+
+        line = (tmp_path / "capture.ndjson").read_bytes()
+        assert b"12345" not in line and b"1980-05-17" not in line
+
+        record = orjson.loads(line)
+        huisnummer = record["params"]["huisnummer"][0]
+        assert re.fullmatch(r"[0-9]{1,5}", huisnummer)
+        assert date.fromisoformat(record["params"]["geboortedatum"][0])
+        assert re.fullmatch(
+            rf"huisnummer eq {huisnummer} and geboortedatum eq [0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}",
+            record["backend"]["filter"],
+        )
+
+    def test_capture_disabled(self, api_client, requests_mock, settings, tmp_path):
+        """Prove nothing is written when the request is not sampled"""
+        settings.TRAFFIC_CAPTURE_FILE = str(tmp_path / "capture.ndjson")
+        settings.TRAFFIC_CAPTURE_RATE = 0
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+
+        api_client.get(reverse("dataselectie-search", kwargs={"dataset_name": "bag"}))
+        assert not (tmp_path / "capture.ndjson").exists()
+
+    def test_replay(self, tmp_path, capsys):
+        """Prove the capture is replayed against the stub upstream"""
+        capture_file = tmp_path / "capture.ndjson"
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        capture_file.write_bytes(
+            b"".join(
+                orjson.dumps({"time": i, "method": "GET", "path": url, "params": params}) + b"\n"
+                for i, params in enumerate(
+                    [{"page": ["1"]}, {"page": ["2"]}, {"page": ["1"]}, {"export": ["true"]}]
+                )
+            )
+        )
+
+        call_command(
+            "replay_traffic",
+            str(capture_file),
+            speedup=0,
+            concurrency=1,
+            upstream_latency=0,
+        )
+
+        output = capsys.readouterr().out
+        assert "Replayed 4 requests" in output
+        assert "Status: 200=4" in output
+        assert "Latency: p50=" in output
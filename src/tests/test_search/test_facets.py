@@ -0,0 +1,144 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.urls import reverse
+
+from dataselectie_proxy.search.facets import FacetValues, FacetValueStore, facet_values
+from dataselectie_proxy.search.indexes import INDEX_MAPPING
+
+SEARCH_URL = "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview"
+
+STREETS = [
+    {"value": "Oudezijds Voorburgwal", "count": 512},
+    {"value": "Damrak", "count": 300},
+    {"value": "Oude Hoogstraat", "count": 80},
+    {"value": "oude Looiersstraat", "count": 80},
+    {"value": "Ouderkerkerlaan", "count": 10},
+]
+
+
+class TestFacetValues:
+    """Prove facet values are completed by prefix."""
+
+    def test_match(self):
+        """Prove the most frequent values are returned, case-insensitive"""
+        values = FacetValues.from_azure(STREETS, max_count=100)
+        assert values.complete
+        assert values.match("OUDE", limit=3) == [
+            {"value": "Oudezijds Voorburgwal", "count": 512},
+            {"value": "Oude Hoogstraat", "count": 80},
+            {"value": "oude Looiersstraat", "count": 80},
+        ]
+        assert values.match("", limit=2)[1] == {"value": "Damrak", "count": 300}
+        assert values.match("x", limit=2) == []
+
+    def test_store_loads_per_facet(self, settings):
+        """Prove a slow load of one facet doesn't block the values of another facet"""
+        settings.FACET_VALUES_REFRESH = 60
+        store = FacetValueStore()
+        index = INDEX_MAPPING["bag"]
+        loading = threading.Event()
+        release = threading.Event()
+
+        def _slow_load():
+            loading.set()
+            release.wait(timeout=10)
+            return FacetValues.from_azure(STREETS, max_count=100)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            slow = executor.submit(store.get, index, "openbareruimteNaam", _slow_load)
+            assert loading.wait(timeout=10)
+            try:
+                values = store.get(index, "postcode", lambda: FacetValues.from_azure([], 100))
+                assert values.keys == []
+                assert not slow.done()
+            finally:
+                release.set()
+            assert slow.result(timeout=10).complete
+
+
+class TestProxyFacetValuesView:
+    """Prove the facet values can be completed through the API."""
+
+    @pytest.fixture(autouse=True)
+    def clear_facet_values(self, settings):
+        settings.FACET_VALUES_REFRESH = 60
+        facet_values.clear()
+        yield
+        facet_values.clear()
+
+    def test_complete_from_memory(self, api_client, requests_mock):
+        """Prove the values are retrieved once, and completed from memory"""
+        requests_mock.post(SEARCH_URL, json={"@search.facets": {"openbareruimteNaam": STREETS}})
+
+        url = reverse(
+            "dataselectie-facet-values",
+            kwargs={"dataset_name": "bag", "facet": "openbareruimteNaam"},
+        )
+        response = api_client.get(url, data={"prefix": "oude", "limit": 1})
+        assert response.status_code == 200
+        assert response.json() == {
+            "facet": "openbareruimteNaam",
+            "values": [{"value": "Oudezijds Voorburgwal", "count": 512}],
+        }
+        assert requests_mock.last_request.json() == {
+            "top": 0,
+            "filter": "",
+            "facets": ["openbareruimteNaam,count:10000"],
+        }
+
+        response = api_client.get(url, data={"prefix": "dam"})
+        assert response.json()["values"] == [{"value": "Damrak", "count": 300}]
+        assert requests_mock.call_count == 1
+
+    def test_complete_with_filters(self, api_client, requests_mock, settings):
+        """Prove filters are applied, and missing values are retrieved by prefix"""
+        settings.FACET_VALUES_MAX = 5
+        requests_mock.post(
+            SEARCH_URL,
+            [
+                {"json": {"@search.facets": {"openbareruimteNaam": STREETS}}},
+                {
+                    "json": {
+                        "@search.facets": {"openbareruimteNaam": [{"value": "Oude", "count": 1}]}
+                    }
+                },
+            ],
+        )
+
+        url = reverse(
+            "dataselectie-facet-values",
+            kwargs={"dataset_name": "bag", "facet": "openbareruimteNaam"},
+        )
+        response = api_client.get(
+            url, data={"prefix": "Oude", "gebiedenStadsdeelNaam": "Centrum", "limit": 10}
+        )
+        assert response.status_code == 200
+        assert [value["value"] for value in response.json()["values"]] == [
+            "Oudezijds Voorburgwal",
+            "Oude Hoogstraat",
+            "oude Looiersstraat",
+            "Ouderkerkerlaan",
+            "Oude",
+        ]
+        assert requests_mock.call_count == 2
+        assert requests_mock.last_request.json()["filter"] == (
+            "gebiedenStadsdeelNaam eq 'Centrum' and openbareruimteNaam ge 'Oude'"
+            " and openbareruimteNaam lt 'Oude\uffff'"
+        )
+
+    @pytest.mark.parametrize(
+        ("facet", "params", "status"),
+        [
+            ("identificatie", {}, 404),
+            ("postcode", {"limit": 0}, 400),
+            ("postcode", {"huisnummer": "ten"}, 400),
+        ],
+    )
+    def test_invalid_requests(self, api_client, requests_mock, facet, params, status):
+        """Prove unknown facets and invalid parameters are rejected"""
+        url = reverse("dataselectie-facet-values", kwargs={"dataset_name": "bag", "facet": facet})
+        response = api_client.get(url, data=params)
+        assert response.status_code == status
+        assert not requests_mock.called
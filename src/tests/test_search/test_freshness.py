@@ -0,0 +1,40 @@
+from dataselectie_proxy.search.freshness import IndexFreshnessTracker
+from dataselectie_proxy.search.indexes import INDEX_MAPPING
+
+
+class TestIndexFreshnessTracker:
+    """Prove that reloads of the index are detected."""
+
+    STATS_URL = "/benkagg-adresseerbareobjecten/stats?api-version=2025-08-01-preview"
+
+    def test_generation_changes_on_reload(self, requests_mock):
+        """Prove the generation only changes when the index statistics change"""
+        index = INDEX_MAPPING["bag"]
+        tracker = IndexFreshnessTracker()
+        assert tracker.get_generation(index) == ""
+
+        requests_mock.get(self.STATS_URL, json={"documentCount": 10, "storageSize": 100})
+        tracker.refresh([index])
+        generation = tracker.get_generation(index)
+        assert generation
+        assert requests_mock.last_request.headers["Authorization"].startswith("Bearer ")
+
+        tracker.refresh([index])
+        assert tracker.get_generation(index) == generation
+
+        requests_mock.get(self.STATS_URL, json={"documentCount": 12, "storageSize": 120})
+        tracker.refresh([index])
+        assert tracker.get_generation(index) != generation
+
+    def test_generation_kept_on_errors(self, requests_mock):
+        """Prove the last known generation is kept when Azure can't be reached"""
+        index = INDEX_MAPPING["bag"]
+        tracker = IndexFreshnessTracker()
+
+        requests_mock.get(self.STATS_URL, json={"documentCount": 10, "storageSize": 100})
+        tracker.refresh([index])
+        generation = tracker.get_generation(index)
+
+        requests_mock.get(self.STATS_URL, status_code=503)
+        tracker.refresh([index])
+        assert tracker.get_generation(index) == generation
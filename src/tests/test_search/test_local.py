@@ -0,0 +1,109 @@
+import csv
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from dataselectie_proxy.search.indexes import INDEX_MAPPING
+from dataselectie_proxy.search.local import FilterTranslator, UnsupportedQuery, local_search
+
+SEARCH_URL = "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview"
+
+COLUMNS = {"postcode": "text", "huisnummer": "number", "naam": "text", "datum": "date"}
+
+
+@pytest.mark.parametrize(
+    ("expression", "sql", "params"),
+    [
+        ("postcode eq '1012AB'", '"postcode" = ?', ["1012AB"]),
+        (
+            "search.in(naam, 'A|''s-Graveland', '|') and (huisnummer eq 1 or huisnummer eq 3)",
+            '("naam" IN (?,?) AND (("huisnummer" = ? OR "huisnummer" = ?)))',
+            ["A", "'s-Graveland", 1, 3],
+        ),
+        (
+            "huisnummer ge 1.5 and naam ne null",
+            '("huisnummer" >= ? AND "naam" IS NOT NULL)',
+            [1.5],
+        ),
+        ("not naam ne 'x'", 'NOT "naam" IS NOT ?', ["x"]),
+    ],
+)
+def test_translate_filter(expression, sql, params):
+    """Prove the OData filters are translated into SQL"""
+    assert FilterTranslator(COLUMNS).translate(expression) == (sql, params)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "geo.distance(locatie, geography'POINT(4.9 52.3)') le 0.5",
+        "datum le 2024-01-01T00:00:00+01:00",
+        "onbekend eq 'x'",
+        "postcode eq",
+    ],
+)
+def test_translate_unsupported_filter(expression):
+    """Prove filters that can't be answered locally are detected"""
+    with pytest.raises(UnsupportedQuery):
+        FilterTranslator(COLUMNS).translate(expression)
+
+
+class TestLocalSearch:
+    """Prove public datasets can be searched without Azure."""
+
+    @pytest.fixture()
+    def local_index(self, settings, tmp_path):
+        settings.LOCAL_SEARCH_DIR = str(tmp_path)
+        settings.LOCAL_SEARCH_INDEXES = ["bag"]
+        return self.build(tmp_path, [("1012AB", "1"), ("1012AB", "3"), ("1012AC", "2")])
+
+    def build(self, tmp_path, rows):
+        source = tmp_path / "bag.csv"
+        with source.open("w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["identificatie", "postcode", "huisnummer", "woonplaatsNaam"])
+            writer.writerows((f"0363{i}", *row, "Amsterdam") for i, row in enumerate(rows))
+        call_command("build_local_index", "bag", source=str(source))
+        return tmp_path / "benkagg-adresseerbareobjecten.sqlite3"
+
+    def test_search(self, api_client, requests_mock, local_index):
+        """Prove filters, facets, sorting and paging are answered locally"""
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(
+            url,
+            data={
+                "postcode": ["1012AB", "1012AC"],
+                "huisnummer__gte": 2,
+                "sort": "-huisnummer",
+                "page_size": 1,
+                "fields": "identificatie,huisnummer",
+                "facets": "woonplaatsNaam",
+            },
+        )
+
+        assert response.status_code == 200
+        assert not requests_mock.called
+        data = response.json()
+        assert data["@odata.count"] == 2
+        assert data["@search.facets"] == {"woonplaatsNaam": [{"value": "Amsterdam", "count": 2}]}
+        assert data["value"] == [{"@search.score": 1.0, "identificatie": "03631", "huisnummer": 3}]
+
+    def test_fallback(self, api_client, requests_mock, local_index):
+        """Prove searches that can't be answered locally are sent to Azure"""
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"fields": "postcode,gebiedenBuurtNaam"})
+
+        assert response.json() == {"@odata.count": 1}
+        assert requests_mock.called
+
+    def test_swap(self, tmp_path, local_index):
+        """Prove a rebuilt index is picked up without a restart"""
+        index = INDEX_MAPPING["bag"]
+        search_args = {"count": True, "top": 0, "filter": "postcode eq '1012AB'"}
+        assert local_search.search(index, search_args).json()["@odata.count"] == 2
+
+        self.build(tmp_path, [("1012AB", "1")])
+        assert local_search.search(index, search_args).json()["@odata.count"] == 1
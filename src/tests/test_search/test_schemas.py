@@ -0,0 +1,178 @@
+import dataclasses
+from io import StringIO
+
+import orjson
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from dataselectie_proxy.search import schemas
+from dataselectie_proxy.search.indexes import INDEX_MAPPING
+from dataselectie_proxy.search.schemas import (
+    IndexSchema,
+    IndexSchemaLoader,
+    attach_index_schema,
+    load_index_schema,
+)
+
+BAG_DEFINITION = {
+    "name": "benkagg-adresseerbareobjecten",
+    "fields": [
+        {"name": "identificatie", "type": "Edm.String", "key": True, "filterable": True},
+        {"name": "postcode", "type": "Edm.String", "filterable": True, "facetable": True},
+        {"name": "huisnummer", "type": "Edm.Int32", "filterable": True, "sortable": True},
+        {"name": "woonplaatsNaam", "type": "Edm.String", "filterable": True, "sortable": True},
+        {"name": "isHoofdadres", "type": "Edm.Boolean", "filterable": True},
+        {"name": "tags", "type": "Collection(Edm.String)", "filterable": True},
+        {"name": "intern", "type": "Edm.String", "retrievable": False},
+    ],
+}
+
+SEARCH_URL = "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview"
+DEFINITION_URL = "/benkagg-adresseerbareobjecten?api-version=2025-08-01-preview"
+
+
+@pytest.fixture()
+def bag_schema(monkeypatch):
+    """Attach the schema to a copy of the BAG index"""
+    index = dataclasses.replace(INDEX_MAPPING["bag"], selectable_fields=None, default_fields=None)
+    attach_index_schema(index, IndexSchema.from_azure(BAG_DEFINITION))
+    monkeypatch.setitem(INDEX_MAPPING, "bag", index)
+    return index
+
+
+class TestIndexSchema:
+    """Prove that the index schema is loaded and used for validation."""
+
+    def test_load_from_azure(self, requests_mock):
+        """Prove the schema is loaded from Azure, and attaches the field types to the index"""
+        requests_mock.get(DEFINITION_URL, json=BAG_DEFINITION)
+        index = dataclasses.replace(INDEX_MAPPING["bag"])
+
+        schema = load_index_schema(index)
+        attach_index_schema(index, schema)
+
+        assert requests_mock.last_request.timeout == 5.0
+        assert schema.fields["huisnummer"].sortable
+        assert not schema.fields["tags"].filterable  # collections are not supported
+        assert not schema.fields["intern"].retrievable
+        assert "isHoofdadres" in index.boolean_fields
+        assert "huisnummer" in index.numeric_fields
+
+    def test_load_from_snapshot(self, requests_mock, settings, monkeypatch, tmp_path):
+        """Prove the snapshot is used when Azure can't be reached, and Azure is retried
+        in the background"""
+        settings.INDEX_SCHEMA_VALIDATION = True
+        settings.INDEX_SCHEMA_SNAPSHOT_DIR = str(tmp_path)
+        settings.INDEX_SCHEMA_RETRY_INTERVAL = 0.01
+        snapshot_fields = BAG_DEFINITION["fields"][:3]
+        tmp_path.joinpath("benkagg-adresseerbareobjecten.json").write_bytes(
+            orjson.dumps({"name": "benkagg-adresseerbareobjecten", "fields": snapshot_fields})
+        )
+        index = dataclasses.replace(INDEX_MAPPING["bag"])
+        monkeypatch.setattr(schemas, "INDEX_MAPPING", {"bag": index})
+        requests_mock.get(
+            DEFINITION_URL,
+            [{"status_code": 503}, {"status_code": 503}, {"json": BAG_DEFINITION}],
+        )
+
+        loader = IndexSchemaLoader()
+        loader.ensure_loaded()
+        assert set(index.schema.fields) == {field["name"] for field in snapshot_fields}
+
+        loader._thread.join(timeout=10)
+        assert not loader._thread.is_alive()
+        assert set(index.schema.fields) == {field["name"] for field in BAG_DEFINITION["fields"]}
+        assert requests_mock.call_count == 3
+
+        # Once loaded, requests don't retrieve the schemas again.
+        loader.ensure_loaded()
+        assert requests_mock.call_count == 3
+
+    def test_load_without_snapshot(self, requests_mock, settings, monkeypatch, tmp_path):
+        """Prove requests are not validated when there is no schema at all"""
+        settings.INDEX_SCHEMA_VALIDATION = True
+        settings.INDEX_SCHEMA_SNAPSHOT_DIR = str(tmp_path)
+        settings.INDEX_SCHEMA_RETRY_INTERVAL = 0
+        index = dataclasses.replace(INDEX_MAPPING["bag"])
+        monkeypatch.setattr(schemas, "INDEX_MAPPING", {"bag": index})
+        requests_mock.get(DEFINITION_URL, status_code=503)
+
+        loader = IndexSchemaLoader()
+        loader.ensure_loaded()
+        assert index.schema is None
+
+        requests_mock.get(DEFINITION_URL, json=BAG_DEFINITION)
+        loader.retry()
+        assert index.schema is not None
+
+    def test_snapshot_command(self, requests_mock, settings, tmp_path):
+        """Prove the snapshots are stored with only the field definitions"""
+        settings.INDEX_SCHEMA_SNAPSHOT_DIR = str(tmp_path)
+        requests_mock.get(DEFINITION_URL, json={**BAG_DEFINITION, "scoringProfiles": []})
+
+        call_command("snapshot_index_schemas", "bag", stdout=StringIO())
+
+        snapshot = tmp_path.joinpath("benkagg-adresseerbareobjecten.json")
+        assert orjson.loads(snapshot.read_bytes()) == BAG_DEFINITION
+
+    @pytest.mark.parametrize(
+        ["params", "field"],
+        [
+            ({"unknown": "1"}, "unknown"),
+            ({"tags": "a"}, "tags"),
+            ({"intern": "a"}, "intern"),
+            ({"sort": "-postcode"}, "sort"),
+            ({"fields": "postcode,intern"}, "fields"),
+            ({"postcode__lte": "1000AA"}, "postcode__lte"),
+        ],
+    )
+    def test_invalid_fields_rejected(self, api_client, requests_mock, bag_schema, params, field):
+        """Prove requests that don't match the schema are rejected without calling Azure"""
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data=params)
+
+        assert response.status_code == 400
+        assert list(response.json()) == [field]
+        assert not requests_mock.called
+
+    def test_valid_fields_accepted(self, api_client, requests_mock, bag_schema):
+        """Prove the field types of the schema are used"""
+        requests_mock.post(SEARCH_URL)
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(
+            url,
+            data={
+                "postcode": "1000AA",
+                "isHoofdadres": "1",
+                "huisnummer__gte": "3",
+                "sort": "-huisnummer,woonplaatsNaam",
+                "fields": "postcode,huisnummer",
+            },
+        )
+
+        assert response.status_code == 200
+        last_request = requests_mock.last_request.json()
+        assert last_request["filter"] == (
+            "postcode eq '1000AA' and isHoofdadres eq true and huisnummer ge 3"
+        )
+        assert last_request["orderby"] == "huisnummer desc,woonplaatsNaam"
+        assert last_request["select"] == "postcode,huisnummer"
+
+    def test_all_fields_from_schema(self, api_client, requests_mock, bag_schema):
+        """Prove an index without an allowlist only selects the retrievable fields"""
+        requests_mock.post(SEARCH_URL)
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+
+        api_client.get(url, data={"fields": "*"})
+        select = requests_mock.last_request.json()["select"].split(",")
+        assert set(select) == {field["name"] for field in BAG_DEFINITION["fields"]} - {"intern"}
+
+    def test_invalid_field_names(self, api_client, requests_mock):
+        """Prove field names are always checked, as they're part of the OData expression"""
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(f"{url}?postcode%20eq%20'1'%20or%20postcode=1")
+
+        assert response.status_code == 400
+        assert not requests_mock.called
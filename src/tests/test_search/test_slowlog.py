@@ -0,0 +1,74 @@
+import pytest
+from django.urls import reverse
+
+from dataselectie_proxy.search.slowlog import normalize_filter, slow_queries
+from tests.utils import build_jwt_token
+
+SEARCH_URL = "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview"
+
+
+@pytest.mark.parametrize(
+    ("search_filter", "expected"),
+    [
+        ("", ""),
+        (
+            "postcode eq '1012AB' and huisnummer ge 10 and isHoofdadres eq true",
+            "postcode eq '?' and huisnummer ge ? and isHoofdadres eq ?",
+        ),
+        (
+            "search.in(naam, 'De Ruijter|''s-Graveland', '|') and (nr eq 1 or nr eq 3)",
+            "search.in(naam, '?', '?') and (nr eq ? or nr eq ?)",
+        ),
+        ("datum le 2024-01-01T00:00:00+01:00", "datum le ?"),
+    ],
+)
+def test_normalize_filter(search_filter, expected):
+    """Prove the values are removed from the filter"""
+    assert normalize_filter(search_filter) == expected
+
+
+class TestSlowQueryLog:
+    """Prove slow searches are logged, and the slowest are shown to admins."""
+
+    @pytest.fixture(autouse=True)
+    def clear_slow_queries(self):
+        slow_queries.clear()
+        yield
+        slow_queries.clear()
+
+    def test_slow_queries(self, api_client, requests_mock, settings, caplog):
+        """Prove searches above the threshold are logged and grouped by their shape"""
+        settings.SLOW_QUERY_THRESHOLDS = {"bag": 0}
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"postcode": "1012AB", "sort": "huisnummer", "facets": ""})
+        api_client.get(url, data={"postcode": "1012AC", "sort": "huisnummer", "facets": ""})
+        api_client.get(url, data={"huisnummer": "1", "page": 3})
+
+        messages = [record for record in caplog.records if record.name.endswith("slowlog")]
+        assert len(messages) == 3
+        assert messages[0].filter == "postcode eq '?'"
+        assert messages[0].status == 200
+        assert messages[0].response_size == len(b'{"@odata.count": 1}')
+
+        url = reverse("dataselectie-slow-queries")
+        response = api_client.get(url)
+        assert response.status_code == 403
+
+        token = build_jwt_token(["DATASELECTIE/ADMIN"])
+        response = api_client.get(url, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        queries = response.json()["queries"]
+        assert sorted((query["filter"], query["count"]) for query in queries) == [
+            ("huisnummer eq ?", 1),
+            ("postcode eq '?'", 2),
+        ]
+        assert {query["orderby"] for query in queries} == {"huisnummer", ""}
+
+    def test_fast_queries(self, api_client, requests_mock, caplog):
+        """Prove searches below the threshold are not recorded"""
+        requests_mock.post(SEARCH_URL, json={"@odata.count": 1})
+
+        api_client.get(reverse("dataselectie-search", kwargs={"dataset_name": "bag"}))
+        assert not slow_queries.top()
@@ -1,7 +1,16 @@
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 from django.http import StreamingHttpResponse
 from django.urls import reverse
 
+from dataselectie_proxy.search.indexes import INDEX_MAPPING
+from dataselectie_proxy.search.prefetch import prefetcher
 from tests.utils import build_jwt_token
 
 
@@ -75,6 +84,31 @@ class TestProxyView:
         assert "skip" in requests_mock.last_request.json()
         assert requests_mock.last_request.json()["skip"] == 300
 
+    def test_page_size(self, api_client, requests_mock):
+        """Prove the page size is used for paging"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"page": 3, "page_size": 10})
+        last_request = requests_mock.last_request.json()
+        assert last_request["skip"] == 20
+        assert last_request["top"] == 10
+        assert last_request["filter"] == ""
+
+    @pytest.mark.parametrize(
+        "params", [{"page_size": 0}, {"page_size": 1001}, {"page_size": "ten"}, {"page": 0}]
+    )
+    def test_invalid_page_size(self, api_client, requests_mock, params):
+        """Prove page sizes outside the bounds of the index are rejected"""
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data=params)
+
+        assert response.status_code == 400
+        assert list(response.json()) == list(params)
+        assert not requests_mock.called
+
     def test_sort_parameters(self, api_client, requests_mock):
         """Prove sort parameters are parsed correctly"""
         requests_mock.post(
@@ -112,10 +146,266 @@ class TestProxyView:
         assert (
             requests_mock.last_request.json()["filter"]
             == "postcode eq '1000AA' and woonplaatsNaam eq 'Amsterdam' "
-            "and huisnummer eq '10' and huisnummerToevoeging eq 'A' "
+            "and huisnummer eq 10 and huisnummerToevoeging eq 'A' "
             "and openbareruimteNaam eq '''s-Gravelandse Veer'"
         )
 
+    def test_multi_value_filters(self, api_client, requests_mock):
+        """Prove repeated parameters are combined in search.in(), and commas are kept"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(
+            f"{url}?gebiedenStadsdeelNaam=Centrum&gebiedenStadsdeelNaam=Oost"
+            "&huisnummer=1&huisnummer=3&postcode=1000AA"
+            "&openbareruimteNaam=Plein 40-45, Noord&openbareruimteNaam=Dam"
+        )
+        assert requests_mock.last_request.json()["filter"] == (
+            "search.in(gebiedenStadsdeelNaam, 'Centrum|Oost', '|') "
+            "and (huisnummer eq 1 or huisnummer eq 3) and postcode eq '1000AA' "
+            "and search.in(openbareruimteNaam, 'Plein 40-45, Noord|Dam', '|')"
+        )
+
+    def test_range_filters(self, api_client, requests_mock):
+        """Prove __gte and __lte are translated into OData range expressions"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"huisnummer__gte": "10", "huisnummer__lte": "20.5"})
+        assert (
+            requests_mock.last_request.json()["filter"]
+            == "huisnummer ge 10 and huisnummer le 20.5"
+        )
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"postcode__gte": "1000AA"},
+            {"huisnummer__gt": "10"},
+            {"huisnummer__gte": "tien"},
+            {"huisnummer": "inf"},
+        ],
+    )
+    def test_invalid_range_filters(self, api_client, requests_mock, params):
+        """Prove invalid range filters are rejected without calling Azure"""
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data=params)
+
+        assert response.status_code == 400
+        assert list(response.json()) == list(params)
+        assert not requests_mock.called
+
+    def test_bbox_filter(self, api_client, requests_mock):
+        """Prove the bounding box is applied to the coordinate fields"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"bbox": "4.88,52.36,4.9,52.38", "postcode": "1012AB"})
+        assert requests_mock.last_request.json()["filter"] == (
+            "postcode eq '1012AB' and latitude ge 52.36 and latitude le 52.38 "
+            "and longitude ge 4.88 and longitude le 4.9"
+        )
+
+    def test_geo_filters(self, api_client, requests_mock, monkeypatch):
+        """Prove the spatial functions are used when the index has a geography field"""
+        monkeypatch.setattr(INDEX_MAPPING["bag"], "geo_field", "locatie")
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"bbox": "4.88,52.36,4.9,52.38"})
+        assert requests_mock.last_request.json()["filter"] == (
+            "geo.intersects(locatie, geography'POLYGON((4.88 52.36, 4.9 52.36, "
+            "4.9 52.38, 4.88 52.38, 4.88 52.36))')"
+        )
+
+        api_client.get(url, data={"point": "4.89,52.37", "radius": "250"})
+        assert requests_mock.last_request.json()["filter"] == (
+            "geo.distance(locatie, geography'POINT(4.89 52.37)') le 0.25"
+        )
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"bbox": "4.88,52.36,4.9"},
+            {"bbox": "4.9,52.36,4.88,52.38"},
+            {"bbox": "52.36,4.88,52.38,100"},
+            {"point": "4.89,52.37", "radius": "250"},
+        ],
+    )
+    def test_invalid_geo_filters(self, api_client, requests_mock, params):
+        """Prove invalid coordinates, and radius filters without geography field are rejected"""
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data=params)
+
+        assert response.status_code == 400
+        assert not requests_mock.called
+
+    @pytest.mark.parametrize(
+        ["params", "expected"],
+        [
+            ({}, "identificatie,openbareruimteNaam,huisnummer,huisletter,"),
+            ({"fields": "postcode,huisnummer"}, "postcode,huisnummer"),
+            ({"fields": "*"}, "gebiedenBuurtNaam,gebiedenGgwgebiedNaam,"),
+        ],
+    )
+    def test_fields_select(self, api_client, requests_mock, params, expected):
+        """Prove the fields parameter is translated into the Azure select"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data=params)
+
+        last_request = requests_mock.last_request.json()
+        assert last_request["select"].startswith(expected)
+        # The fields parameter is not a filter
+        assert last_request["filter"] == ""
+
+    def test_all_fields_select(self, api_client, requests_mock, monkeypatch):
+        """Prove all fields are only selected for an index without an allowlist"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+        )
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+
+        api_client.get(url, data={"fields": "*"})
+        select = requests_mock.last_request.json()["select"].split(",")
+        assert set(select) == INDEX_MAPPING["bag"].selectable_fields
+
+        monkeypatch.setattr(INDEX_MAPPING["bag"], "selectable_fields", None)
+        api_client.get(url, data={"fields": "*"})
+        assert "select" not in requests_mock.last_request.json()
+
+    @pytest.mark.parametrize("fields", ["", "postcode,unknown", "postcode eq '1'"])
+    def test_invalid_fields_select(self, api_client, requests_mock, fields):
+        """Prove fields outside the allowlist are rejected without calling Azure"""
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"fields": fields})
+
+        assert response.status_code == 400
+        assert "fields" in response.json()
+        assert not requests_mock.called
+
+    @pytest.mark.parametrize(
+        ["params", "expected"],
+        [
+            ({"facets": ""}, []),
+            (
+                {},
+                [
+                    "gebiedenBuurtNaam,count:1400,sort:value",
+                    "gebiedenGgwgebiedNaam,count:1400,sort:value",
+                    "gebiedenStadsdeelNaam,count:1400,sort:value",
+                    "gebiedenWijkNaam,count:1400,sort:value",
+                    "woonplaatsNaam,count:1400,sort:value",
+                ],
+            ),
+            (
+                {"facets": "postcode:20,woonplaatsNaam", "facet_count": 50},
+                ["postcode,count:20,sort:value", "woonplaatsNaam,count:50,sort:value"],
+            ),
+            (
+                {"facets": "postcode,woonplaatsNaam", "woonplaatsNaam": "Amsterdam"},
+                ["postcode,count:1400,sort:value"],
+            ),
+        ],
+    )
+    def test_facets_selection(self, api_client, requests_mock, params, expected):
+        """Prove the facets and their number of values can be selected"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data=params)
+        last_request = requests_mock.last_request.json()
+        assert last_request["facets"] == expected
+        assert "facets" not in last_request["filter"]
+
+    @pytest.mark.parametrize(
+        "params",
+        [{"facets": "unknown"}, {"facets": "postcode:0"}, {"facet_count": 1401}],
+    )
+    def test_invalid_facets_selection(self, api_client, requests_mock, params):
+        """Prove unknown facets and counts above the limit of the index are rejected"""
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data=params)
+
+        assert response.status_code == 400
+        assert list(response.json()) == list(params)
+        assert not requests_mock.called
+
+    def test_disjunctive_facets(self, api_client, requests_mock):
+        """Prove the facets that are filtered on are counted without their own filter"""
+
+        def _search(request, context):
+            facets = [facet.partition(",")[0] for facet in request.json()["facets"]]
+            return {
+                **self.AZURE_SEARCH_RESPONSE,
+                "value": [],
+                "@search.facets": {facet: [{"value": "Centrum", "count": 3}] for facet in facets},
+            }
+
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=_search,
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        params = {
+            "facets": "postcode,woonplaatsNaam,gebiedenStadsdeelNaam",
+            "woonplaatsNaam": "Amsterdam",
+            "gebiedenStadsdeelNaam": ["Centrum", "West"],
+        }
+        response = api_client.get(url, data={**params, "disjunctive_facets": "true"})
+
+        assert response.status_code == 200
+        assert list(response.json()["@search.facets"]) == [
+            "postcode",
+            "woonplaatsNaam",
+            "gebiedenStadsdeelNaam",
+        ]
+        queries = {
+            query["facets"][0].partition(",")[0]: query
+            for query in (request.json() for request in requests_mock.request_history)
+        }
+        assert queries["postcode"]["filter"] == (
+            "woonplaatsNaam eq 'Amsterdam'"
+            " and search.in(gebiedenStadsdeelNaam, 'Centrum|West', '|')"
+        )
+        assert queries["woonplaatsNaam"] == {
+            "top": 0,
+            "filter": "search.in(gebiedenStadsdeelNaam, 'Centrum|West', '|')",
+            "facets": ["woonplaatsNaam,count:1400,sort:value"],
+        }
+        assert queries["gebiedenStadsdeelNaam"]["filter"] == "woonplaatsNaam eq 'Amsterdam'"
+
+        # The ETag differs from the search without the disjunctive facets.
+        assert api_client.get(url, data=params)["ETag"] != response["ETag"]
+
+    @pytest.mark.parametrize("params", [{}, {"huisnummer": 3}])
+    def test_disjunctive_facets_unfiltered(self, api_client, requests_mock, params):
+        """Prove a single search is done when none of the facets is filtered"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=self.AZURE_SEARCH_RESPONSE,
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={**params, "disjunctive_facets": "true"})
+
+        assert response.status_code == 200
+        assert requests_mock.call_count == 1
+
     @pytest.mark.parametrize("true_value", ["True", "true", "1", "on", "t"])
     def test_boolean_filters(self, api_client, requests_mock, true_value):
         """Prove boolean filters are parsed correctly"""
@@ -147,6 +437,156 @@ class TestProxyView:
         assert "@odata.context" in response.json()
         assert response.json()["@odata.context"] == "http://testserver/dataselectie/v2/bag/search"
 
+    @pytest.mark.parametrize("method", ["get", "head"])
+    def test_count_only(self, api_client, requests_mock, method):
+        """Prove count-only searches skip the documents and facets"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=self.AZURE_SEARCH_RESPONSE,
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        data = {"postcode": "1000AA", "sort": "huisnummer"}
+        if method == "get":
+            data["count_only"] = "true"
+        response = getattr(api_client, method)(url, data=data)
+
+        assert response.status_code == 200
+        assert response["X-Total-Count"] == "13656"
+        if method == "get":
+            assert response.json() == {"count": 13656}
+
+        last_request = requests_mock.last_request.json()
+        assert last_request["top"] == 0
+        assert last_request["count"] is True
+        assert last_request["facets"] == []
+        assert last_request["filter"] == "postcode eq '1000AA'"
+        assert "orderby" not in last_request
+        assert "select" not in last_request
+
+    def test_etag_and_cache_control(self, api_client, requests_mock):
+        """Prove responses have a validator, and a 304 is given without calling Azure"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=self.AZURE_SEARCH_RESPONSE,
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"postcode": "1000AA"})
+        assert response.status_code == 200
+        assert response["Cache-Control"] == "public, max-age=300"
+        etag = response["ETag"]
+
+        # Same query gives the same ETag, a different query doesn't
+        response = api_client.get(
+            url, data={"postcode": "1000AA"}, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+        assert requests_mock.call_count == 1
+
+        response = api_client.get(
+            url, data={"postcode": "1000AB"}, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+        assert requests_mock.call_count == 2
+
+    def test_etag_gzip(self, api_client, requests_mock):
+        """Prove the weak ETag of a compressed response also gives a 304"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json={**self.AZURE_SEARCH_RESPONSE, "value": [{"postcode": "1000AA"}] * 20},
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(
+            url, data={"postcode": "1000AA"}, headers={"Accept-Encoding": "gzip"}
+        )
+        assert response["Content-Encoding"] == "gzip"
+        etag = response["ETag"]
+        assert etag.startswith('W/"')
+
+        response = api_client.get(
+            url,
+            data={"postcode": "1000AA"},
+            headers={"Accept-Encoding": "gzip", "If-None-Match": f'"other", {etag}'},
+        )
+        assert response.status_code == 304
+        assert requests_mock.call_count == 1
+
+    def test_response_cache(self, api_client, requests_mock, settings):
+        """Prove the same search is served from the cache"""
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=self.AZURE_SEARCH_RESPONSE,
+            headers={"content-type": "application/json"},
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"postcode": "1000AA"})
+        assert response["X-Cache"] == "MISS"
+
+        response = api_client.get(url, data={"postcode": "1000AA"})
+        assert response["X-Cache"] == "HIT"
+        assert response["Content-Type"] == "application/json"
+        assert response.json()["@odata.count"] == 13656
+        assert requests_mock.call_count == 1
+
+    def test_prefetch_next_page(self, api_client, requests_mock, settings, monkeypatch):
+        """Prove the next page is prefetched into the cache"""
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        settings.SEARCH_PREFETCH_ENABLED = True
+        monkeypatch.setattr(prefetcher, "submit", lambda func: func() or True)
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=self.AZURE_SEARCH_RESPONSE,
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"postcode": "1000AA", "page_size": 10})
+        assert response["X-Cache"] == "MISS"
+        assert requests_mock.call_count == 2
+        assert requests_mock.last_request.json()["skip"] == 10
+
+        response = api_client.get(url, data={"postcode": "1000AA", "page_size": 10, "page": 2})
+        assert response["X-Cache"] == "HIT"
+        assert "page=2" in response.json()["@odata.context"]
+
+    def test_prefetch_last_page(self, api_client, requests_mock, settings, monkeypatch):
+        """Prove there is no prefetch beyond the last page, or when the service is slow"""
+        settings.SEARCH_PREFETCH_ENABLED = True
+        monkeypatch.setattr(prefetcher, "submit", lambda func: func() or True)
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=self.AZURE_SEARCH_RESPONSE,
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"page_size": 1000, "page": 14})
+        assert requests_mock.call_count == 1
+
+        settings.SEARCH_PREFETCH_MAX_RESPONSE_TIME = -1
+        api_client.get(url, data={"page_size": 10})
+        assert requests_mock.call_count == 2
+
+    def test_cache_control_private(self, api_client, requests_mock, settings):
+        """Prove responses of protected datasets are not cached by shared caches"""
+        requests_mock.post(
+            "/benkagg-brkbasisdataselectie/docs/search?api-version=2025-08-01-preview",
+            json=self.AZURE_SEARCH_RESPONSE,
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "brk"})
+        token = build_jwt_token(["BRK/RSN"])
+        response = api_client.get(url, headers={"Authorization": f"Bearer {token}"})
+        assert response["Cache-Control"] == "private, no-store"
+
+        settings.SEARCH_CACHE_CONTROL = {"brk": "private, max-age=60"}
+        response = api_client.get(url, headers={"Authorization": f"Bearer {token}"})
+        assert response["Cache-Control"] == "private, max-age=60"
+
     def test_search_address(self, api_client, requests_mock):
         """Prove boolean filters are parsed correctly"""
         requests_mock.post(
@@ -155,9 +595,11 @@ class TestProxyView:
 
         url = reverse("dataselectie-search-address")
 
-        api_client.get(url, data={"q": "oude"})
+        api_client.get(url, data={"q": "oude", "page": 2, "page_size": 10})
 
         last_request = requests_mock.last_request.json()
+        assert last_request["skip"] == 10
+        assert last_request["top"] == 10
 
         assert "search" in last_request
         assert last_request["search"] == "oude*"
@@ -190,6 +632,155 @@ class TestProxyView:
 
         assert "authorization" in requests_mock.last_request.headers
 
+    def test_export_offload(self, api_client, requests_mock, settings):
+        """Prove the export can be handed over to the front server"""
+        settings.EXPORT_OFFLOAD = "x-accel-redirect"
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "brk"})
+        token = build_jwt_token(["BRK/RSN"])
+        response = api_client.get(
+            url,
+            data={"export": "true", "stadsdeelNaam": "Centrum"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == 200
+        assert not requests_mock.called
+        assert response["X-Accel-Redirect"] == (
+            "/internal/dso-export/benkagg/brkbasisdataselectie?stadsdeelNaam=Centrum&_format=csv"
+        )
+        assert response["X-Export-Authorization"] == f"Bearer {token}"
+        assert response["Content-Disposition"].startswith("attachment;")
+        assert response["Cache-Control"] == "private, no-store"
+
+    def test_export_offload_disabled(self, api_client, requests_mock, settings):
+        """Prove the user's token is never given back when the export isn't offloaded"""
+        settings.EXPORT_OFFLOAD = ""
+        requests_mock.get("https://dso.api/v1/benkagg/brkbasisdataselectie", text="a,b\n")
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "brk"})
+        token = build_jwt_token(["BRK/RSN"])
+        response = api_client.get(
+            url, data={"export": "true"}, headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == 200
+        assert requests_mock.called
+        assert "X-Export-Authorization" not in response
+        assert "X-Accel-Redirect" not in response
+
+    def test_export_fields(self, api_client, requests_mock):
+        """Prove only the selected columns are exported"""
+        requests_mock.get("https://dso.api/v1/benkagg/adresseerbareobjecten")
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"export": "true", "fields": "postcode,huisnummer"})
+        assert response.status_code == 200
+        assert requests_mock.last_request.qs == {
+            "_format": ["csv"],
+            "_fields": ["postcode,huisnummer"],
+        }
+
+        response = api_client.get(url, data={"export": "true", "fields": "postcode,geheim"})
+        assert response.status_code == 400
+        assert response.json()["fields"] == "Invalid fields: geheim."
+
+    @pytest.mark.parametrize("params", [{}, {"fields": "*"}])
+    def test_export_all_fields(self, api_client, requests_mock, params):
+        """Prove an export of all columns is limited to the allowed columns"""
+        requests_mock.get("https://dso.api/v1/benkagg/adresseerbareobjecten")
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"export": "true", **params})
+
+        assert response.status_code == 200
+        fields = requests_mock.last_request.qs["_fields"][0].split(",")
+        assert fields == [field.lower() for field in INDEX_MAPPING["bag"].export_fields]
+
+    def test_export_scope_fields(self, api_client, requests_mock, monkeypatch):
+        """Prove columns that need an extra scope are only exported with that scope"""
+        monkeypatch.setattr(INDEX_MAPPING["bag"], "export_fields", ["postcode", "huisnummer"])
+        monkeypatch.setattr(INDEX_MAPPING["bag"], "export_scope_fields", {"BRK/RSN": {"postcode"}})
+        requests_mock.get("https://dso.api/v1/benkagg/adresseerbareobjecten")
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        api_client.get(url, data={"export": "true"})
+        assert requests_mock.last_request.qs["_fields"] == ["huisnummer"]
+
+        response = api_client.get(url, data={"export": "true", "fields": "postcode"})
+        assert response.status_code == 403
+
+        token = build_jwt_token(["BRK/RSN"])
+        api_client.get(url, data={"export": "true"}, headers={"Authorization": f"Bearer {token}"})
+        assert requests_mock.last_request.qs["_fields"] == ["postcode,huisnummer"]
+
+    def test_export_ndjson(self, api_client, requests_mock):
+        """Prove the CSV export can be converted into NDJSON"""
+        requests_mock.get(
+            "https://dso.api/v1/benkagg/adresseerbareobjecten?_format=csv",
+            content=b'postcode,huisnummer\r\n1012AB,1\r\n"1012\nAC",\r\n',
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"export": "true", "export_format": "ndjson"})
+
+        assert requests_mock.last_request.qs["_format"] == ["csv"]
+        assert response["Content-Type"] == "application/x-ndjson"
+        assert ".ndjson" in response["Content-Disposition"]
+        lines = b"".join(response.streaming_content).splitlines()
+        assert [orjson.loads(line) for line in lines] == [
+            {"postcode": "1012AB", "huisnummer": 1},
+            {"postcode": "1012\nAC", "huisnummer": None},
+        ]
+
+    def test_export_parquet(self, api_client, requests_mock, settings):
+        """Prove the CSV export can be converted into Parquet, in batches of rows"""
+        settings.EXPORT_BATCH_ROWS = 1
+        requests_mock.get(
+            "https://dso.api/v1/benkagg/adresseerbareobjecten?_format=csv",
+            content=b"postcode,huisnummer\r\n1012AB,1\r\n1012AC,2\r\n",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"export": "true", "export_format": "parquet"})
+
+        parquet_file = pq.ParquetFile(io.BytesIO(b"".join(response.streaming_content)))
+        assert parquet_file.num_row_groups == 2
+        assert parquet_file.read().to_pylist() == [
+            {"postcode": "1012AB", "huisnummer": 1.0},
+            {"postcode": "1012AC", "huisnummer": 2.0},
+        ]
+
+    def test_export_arrow(self, api_client, requests_mock):
+        """Prove the CSV export can be converted into an Arrow IPC stream"""
+        requests_mock.get(
+            "https://dso.api/v1/benkagg/adresseerbareobjecten?_format=csv",
+            content=b"postcode,huisnummer\r\n1012AB,1\r\n1012AC,\r\n",
+        )
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"export": "true", "export_format": "arrow"})
+
+        assert response["Content-Type"] == "application/vnd.apache.arrow.stream"
+        table = pa.ipc.open_stream(b"".join(response.streaming_content)).read_all()
+        assert table.schema.field("huisnummer").type == pa.float64()
+        assert table.to_pylist() == [
+            {"postcode": "1012AB", "huisnummer": 1.0},
+            {"postcode": "1012AC", "huisnummer": None},
+        ]
+
+    def test_export_format_unavailable(self, api_client, monkeypatch):
+        """Prove a format is rejected when it's unknown, or the package is not installed"""
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+        url = reverse("dataselectie-search", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data={"export": "true", "export_format": "parquet"})
+        assert response.status_code == 400
+        assert response.json() == {"export_format": "The parquet format is not available."}
+
+        response = api_client.get(url, data={"export": "true", "export_format": "xlsx"})
+        assert response.status_code == 400
+
     def test_export_streaming_dso_client(self, api_client, requests_mock):
         """Prove export uses a streaming response to the DSO API"""
         requests_mock.get(
@@ -203,3 +794,284 @@ class TestProxyView:
         assert requests_mock.call_count == 1
         assert isinstance(response, StreamingHttpResponse)
         assert response.headers["content-type"] == "text/csv"
+
+
+class TestProxyBatchSearchView:
+    """Prove that multiple searches can be performed in a single request."""
+
+    def test_batch_search(self, api_client, requests_mock):
+        """Prove the searches are translated, and the results are returned in order"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json={"@odata.context": "https://azure/", "value": []},
+        )
+        requests_mock.post(
+            "/benkagg-brkbasisdataselectie/docs/search?api-version=2025-08-01-preview",
+            json={"@odata.context": "https://azure/", "value": []},
+        )
+
+        url = reverse("dataselectie-batch")
+        response = api_client.post(
+            url,
+            data=[
+                {"dataset": "bag", "params": {"postcode": ["1000AA", "1000AB"], "page": 2}},
+                {"dataset": "brk", "params": {}},
+                {"dataset": "non-existent", "params": {}},
+                {"dataset": "bag", "params": {"page_size": 0}},
+            ],
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == [200, 403, 404, 400]
+        assert results[0]["data"]["@odata.context"] == (
+            "http://testserver/dataselectie/v2/bag/search"
+            "?postcode=1000AA&postcode=1000AB&page=2"
+        )
+        assert results[1]["error"]["detail"] == "Required scopes not given."
+
+        # Only the valid and permitted search is sent to Azure
+        assert requests_mock.call_count == 1
+        last_request = requests_mock.last_request.json()
+        assert last_request["filter"] == "search.in(postcode, '1000AA|1000AB', '|')"
+        assert last_request["skip"] == 100
+
+    def test_batch_search_with_scopes(self, api_client, requests_mock):
+        """Prove the scopes are checked per search"""
+        requests_mock.post(
+            "/benkagg-brkbasisdataselectie/docs/search?api-version=2025-08-01-preview",
+            json={"@odata.count": 10, "value": []},
+        )
+
+        token = build_jwt_token(["BRK/RSN"])
+        url = reverse("dataselectie-batch")
+        response = api_client.post(
+            url,
+            data=[
+                {"dataset": "brk", "params": {}},
+                {"dataset": "hr", "params": {}},
+                {"dataset": "brk", "params": {"count_only": True}},
+            ],
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == [200, 403, 200]
+        assert results[2]["data"] == {"count": 10}
+        assert sorted(r.json()["top"] for r in requests_mock.request_history) == [0, 100]
+
+    def test_batch_disjunctive_facets(self, api_client, requests_mock):
+        """Prove disjunctive facets can be requested in a batch, with or without filters"""
+
+        def _search(request, context):
+            facets = [facet.partition(",")[0] for facet in request.json()["facets"]]
+            return {
+                "value": [],
+                "@search.facets": {
+                    facet: [{"value": "Amsterdam", "count": 3}] for facet in facets
+                },
+            }
+
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=_search,
+        )
+
+        url = reverse("dataselectie-batch")
+        response = api_client.post(
+            url,
+            data=[
+                {"dataset": "bag", "params": {"disjunctive_facets": "true"}},
+                {
+                    "dataset": "bag",
+                    "params": {"disjunctive_facets": "true", "woonplaatsNaam": "Amsterdam"},
+                },
+            ],
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == [200, 200]
+
+    @pytest.mark.parametrize(
+        "data", [{}, [], [{"dataset": "bag", "params": {}}] * 11, [{"dataset": "bag"}, "bag"]]
+    )
+    def test_invalid_batch(self, api_client, requests_mock, data):
+        """Prove invalid batches are rejected"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json={"value": []},
+        )
+        url = reverse("dataselectie-batch")
+        response = api_client.post(url, data=data)
+
+        if isinstance(data, list) and len(data) == 2:
+            # Individual items are reported as errors
+            assert response.status_code == 200
+            assert [result["status"] for result in response.json()["results"]] == [200, 400]
+        else:
+            assert response.status_code == 400
+
+
+class TestProxyClusterView:
+    """Prove the results can be clustered for a map."""
+
+    def test_clusters(self, api_client, requests_mock):
+        """Prove each row of the grid is counted with a range facet"""
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json={
+                "@search.facets": {
+                    "longitude": [
+                        {"count": 0, "to": 4.8779297},
+                        {"count": 3, "from": 4.8779297, "to": 4.8834229},
+                        {"count": 0, "from": 4.8834229, "to": 4.888916},
+                        {"count": 2, "from": 4.9053955},
+                    ]
+                }
+            },
+        )
+
+        url = reverse("dataselectie-clusters", kwargs={"dataset_name": "bag"})
+        response = api_client.get(
+            url, data={"bbox": "4.88,52.36,4.9,52.38", "zoom": 14, "postcode": "1012AB"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert requests_mock.call_count == 7
+        assert data["count"] == 7 * 5
+        assert data["cells"][:2] == [
+            {"latitude": 52.3607234, "longitude": 4.8806763, "count": 3},
+            {"latitude": 52.3607234, "longitude": 4.9026489, "count": 2},
+        ]
+
+        first_request = requests_mock.request_history[0].json()
+        assert first_request["top"] == 0
+        assert first_request["facets"] == [
+            "longitude,values:4.8779297|4.8834229|4.888916|4.8944092|4.8999023|4.9053955"
+        ]
+        assert first_request["filter"].startswith("postcode eq '1012AB' and latitude ge ")
+
+    @pytest.mark.parametrize(
+        "params",
+        [{"zoom": 14}, {"bbox": "4.88,52.36,4.9,52.38"}, {"bbox": "4,52,5,53", "zoom": 14}],
+    )
+    def test_invalid_clusters(self, api_client, requests_mock, params):
+        """Prove the viewport is required, and can't have too many cells"""
+        url = reverse("dataselectie-clusters", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data=params)
+
+        assert response.status_code == 400
+        assert not requests_mock.called
+
+    def test_clusters_not_supported(self, api_client):
+        """Prove datasets without coordinates can't be clustered"""
+        url = reverse("dataselectie-clusters", kwargs={"dataset_name": "hr"})
+        token = build_jwt_token(["FP/MDW"])
+        response = api_client.get(
+            url,
+            data={"bbox": "4.88,52.36,4.9,52.38", "zoom": 14},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 404
+
+
+class TestProxyCrossTabView:
+    """Prove the results can be counted for each combination of two facets."""
+
+    def test_crosstab(self, api_client, requests_mock):
+        """Prove the column facet is counted for each value of the row facet"""
+
+        def _search(request, context):
+            search_args = request.json()
+            if "gebiedenStadsdeelNaam eq 'West'" in search_args["filter"]:
+                values = [{"value": "Amsterdam", "count": 4}, {"value": "Weesp", "count": 1}]
+            elif "gebiedenStadsdeelNaam eq" in search_args["filter"]:
+                values = [{"value": "Amsterdam", "count": 7}]
+            else:
+                values = [{"value": "Centrum", "count": 7}, {"value": "West", "count": 5}]
+            facet = search_args["facets"][0].partition(",")[0]
+            return {"@search.facets": {facet: values}}
+
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=_search,
+        )
+
+        url = reverse("dataselectie-crosstab", kwargs={"dataset_name": "bag"})
+        response = api_client.get(
+            url,
+            data={
+                "rows": "gebiedenStadsdeelNaam",
+                "columns": "woonplaatsNaam",
+                "row_count": 2,
+                "postcode": "1012AB",
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "rows": {
+                "field": "gebiedenStadsdeelNaam",
+                "values": ["Centrum", "West"],
+                "totals": [7, 5],
+            },
+            "columns": {"field": "woonplaatsNaam", "values": ["Amsterdam", "Weesp"]},
+            "counts": [[7, 0], [4, 1]],
+        }
+
+        assert requests_mock.call_count == 3
+        queries = [request.json() for request in requests_mock.request_history]
+        assert queries[0] == {
+            "top": 0,
+            "filter": "postcode eq '1012AB'",
+            "facets": ["gebiedenStadsdeelNaam,count:2"],
+        }
+        assert {query["filter"] for query in queries[1:]} == {
+            "postcode eq '1012AB' and gebiedenStadsdeelNaam eq 'Centrum'",
+            "postcode eq '1012AB' and gebiedenStadsdeelNaam eq 'West'",
+        }
+
+    def test_crosstab_cached(self, api_client, requests_mock, settings):
+        """Prove the nested cache lookups of the rows don't block the cached matrix"""
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        requests_mock.post(
+            "/benkagg-adresseerbareobjecten/docs/search?api-version=2025-08-01-preview",
+            json=lambda request, context: {
+                "@search.facets": {
+                    request.json()["facets"][0].partition(",")[0]: [{"value": "Oost", "count": 2}]
+                }
+            },
+        )
+
+        url = reverse("dataselectie-crosstab", kwargs={"dataset_name": "bag"})
+        params = {"rows": "gebiedenStadsdeelNaam", "columns": "woonplaatsNaam", "postcode": "1093"}
+        # A deadlock fails the test with a timeout, instead of waiting for the thread.
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            for _ in range(2):
+                response = executor.submit(api_client.get, url, data=params).result(timeout=10)
+                assert response.status_code == 200
+        finally:
+            executor.shutdown(wait=False)
+
+        assert requests_mock.call_count == 2
+        assert response.json()["counts"] == [[2]]
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"columns": "woonplaatsNaam"},
+            {"rows": "huisnummer", "columns": "woonplaatsNaam"},
+            {"rows": "woonplaatsNaam", "columns": "woonplaatsNaam"},
+            {"rows": "postcode", "columns": "woonplaatsNaam", "row_count": 51},
+        ],
+    )
+    def test_invalid_crosstab(self, api_client, requests_mock, params):
+        """Prove both facets are required, and should be different facets of the index"""
+        url = reverse("dataselectie-crosstab", kwargs={"dataset_name": "bag"})
+        response = api_client.get(url, data=params)
+
+        assert response.status_code == 400
+        assert not requests_mock.called
@@ -0,0 +1,59 @@
+import threading
+import time
+from unittest.mock import patch
+
+import requests
+
+from dataselectie_proxy import warmup
+
+
+class TestWarmUp:
+    """Prove that worker processes are prepared before handling requests."""
+
+    def test_warm_up(self, requests_mock, mock_fetch_token):
+        """Prove connections are opened and the token is fetched"""
+        requests_mock.head("https://test.azure-search", status_code=403)
+        requests_mock.head("https://dso.api", status_code=200)
+
+        warmup.warm_up()
+
+        assert [request.url for request in requests_mock.request_history] == [
+            "https://test.azure-search/",
+            "https://dso.api/",
+        ]
+        assert mock_fetch_token.called
+
+    def test_warm_up_errors(self, requests_mock, mock_fetch_token, caplog):
+        """Prove the worker still starts when the backends can't be reached"""
+        requests_mock.head("https://test.azure-search", exc=requests.ConnectTimeout)
+        requests_mock.head("https://dso.api", exc=requests.ConnectionError)
+        mock_fetch_token.side_effect = ValueError("no credential")
+
+        warmup.warm_up()
+
+        messages = [record.getMessage() for record in caplog.records]
+        assert any("unable to connect to https://dso.api" in message for message in messages)
+        assert any("unable to fetch the search token" in message for message in messages)
+
+    def test_warm_up_slow_schemas(self, requests_mock, mock_fetch_token, settings, caplog):
+        """Prove the worker doesn't wait for a schema load that hangs"""
+        settings.WARMUP_TIMEOUT = 0.05
+        requests_mock.head("https://test.azure-search")
+        requests_mock.head("https://dso.api")
+        release = threading.Event()
+
+        with patch.object(warmup.index_schemas, "ensure_loaded", side_effect=release.wait):
+            start = time.monotonic()
+            warmup.warm_up()
+            assert time.monotonic() - start < 2
+            release.set()
+
+        messages = [record.getMessage() for record in caplog.records]
+        assert any("index schemas are still loading" in message for message in messages)
+
+    def test_register_without_uwsgi(self):
+        """Prove the warm-up runs directly when the application isn't running in uWSGI"""
+        with patch.object(warmup, "warm_up") as mock_warm_up:
+            warmup.register_warm_up()
+
+        assert mock_warm_up.called